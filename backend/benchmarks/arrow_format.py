@@ -0,0 +1,117 @@
+"""Payload size and client decode time of a vehicle export, Arrow IPC stream against JSON
+
+    python -m benchmarks.arrow_format --rows 200000 --repeat 5
+
+Exports one vehicle through the export endpoint, once with export_type=JSON and once with
+Accept: application/vnd.apache.arrow.stream, and loads each body into a pandas DataFrame the
+way a notebook client would: json.loads then DataFrame for JSON, the Arrow stream reader then
+to_pandas for Arrow. Times are the median of --repeat runs. DATABASE_URL defaults to a
+temporary SQLite file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+async def fetch(app, params: dict, headers: dict) -> tuple:
+    """Body of an export request with the seconds it took"""
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        started = time.perf_counter()
+        response = await client.get('/vehicle_data/export', params=params, headers=headers)
+        seconds = time.perf_counter() - started
+        response.raise_for_status()
+        return response.content, seconds
+
+
+def decode_json(body: bytes):
+    import pandas as pd
+
+    return pd.DataFrame(json.loads(body))
+
+
+def decode_arrow(body: bytes):
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(body).read_all().to_pandas()
+
+
+def measure(app, params: dict, headers: dict, decode, repeat: int) -> dict:
+    server_seconds, decode_seconds = [], []
+    for _ in range(repeat):
+        body, seconds = asyncio.run(fetch(app, params, headers))
+        server_seconds.append(seconds)
+        started = time.perf_counter()
+        frame = decode(body)
+        decode_seconds.append(time.perf_counter() - started)
+    return {
+        'rows': len(frame),
+        'bytes': len(body),
+        'request_ms': round(statistics.median(server_seconds) * 1000, 1),
+        'decode_ms': round(statistics.median(decode_seconds) * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='requests per format, the median is reported')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='arrow_bench_')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+    output = os.path.abspath(args.output) if args.output else None
+
+    from fastapi import FastAPI
+    from sqlmodel import Session, SQLModel, select
+
+    import vehicle.service as service
+    from benchmarks.fleet import write_fleet
+    from database import async_engine, engine
+    from vehicle.arrow import ARROW_STREAM
+    from vehicle.model import VehicleList
+    from vehicle.router import router
+
+    engine.echo = False
+    async_engine.echo = False
+    data_path = os.path.join(work_dir, 'data')
+    write_fleet(data_path, 1, args.rows, args.seed)
+    service.DATA_PATH = data_path
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    service.load_data_from_folder()
+    with Session(engine) as session:
+        vehicle_id = session.exec(select(VehicleList.vehicle_id)).first()
+
+    app = FastAPI()
+    app.include_router(router)
+    # Exports are written to ./exports, keep them inside the work directory
+    os.chdir(work_dir)
+    json_result = measure(app, {'vehicle_id': vehicle_id, 'export_type': 'JSON'}, {}, decode_json, args.repeat)
+    arrow_result = measure(
+        app, {'vehicle_id': vehicle_id, 'export_type': 'JSON'}, {'Accept': ARROW_STREAM}, decode_arrow, args.repeat,
+    )
+    results = {'database': engine.dialect.name, 'params': vars(args), 'json': json_result, 'arrow': arrow_result}
+    for name in ('json', 'arrow'):
+        result = results[name]
+        print(f"{name:<6} {result['rows']} rows, {result['bytes'] / 1e6:.1f} MB, "
+              f"request {result['request_ms']}ms, decode {result['decode_ms']}ms")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
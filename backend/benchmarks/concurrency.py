@@ -0,0 +1,168 @@
+"""Throughput of the list endpoint under many parallel clients, async engine against blocking calls
+
+    python -m benchmarks.concurrency --clients 200 --requests 4000 --vehicles 20 --rows 5000
+
+Every client sends list requests back to back through one event loop, as the clients of one
+uvicorn worker would. The async handlers await the queries on the async engine, the blocking
+baseline is the previous handler calling the sync session on the event loop. A few clients
+export whole vehicles meanwhile, the requests that stall behind them show in the p99.
+DATABASE_URL defaults to a temporary SQLite file, point it at a scratch MySQL database to
+measure the production setup. The database is dropped and recreated before the run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Annotated, Any
+
+import numpy as np
+
+
+def percentile_ms(samples: list[float], percentile: float) -> float:
+    return round(float(np.percentile(samples, percentile)) * 1000, 3)
+
+
+def blocking_app():
+    """App serving the list and export endpoints with the sync session on the event loop
+
+    The session is closed inside the handler: with SessionDep the connections are returned
+    by the dependency teardown, which waits for the blocked event loop, and past the pool
+    size every checkout stalls the loop until the pool timeout.
+    """
+    from fastapi import FastAPI, HTTPException, Query
+    from sqlmodel import Session
+
+    from database import engine
+    from vehicle import service
+    from vehicle.schema import FilterExportTypes, FilterVehicles, VehicleListOutputSchema
+
+    app = FastAPI()
+
+    @app.get('/vehicle_data/', response_model=VehicleListOutputSchema)
+    async def get_vehicle_data_list(filter_vehicles: Annotated[FilterVehicles, Query()]) -> Any:
+        with Session(engine) as session:
+            vehicle_record_id = service.get_vehicle_record_id(filter_vehicles.vehicle_id, session)
+            if vehicle_record_id is None:
+                raise HTTPException(status_code=404)
+            return service.get_vehicle_list(filter_vehicles, vehicle_record_id, session)
+
+    @app.get('/vehicle_data/export')
+    async def export_vehicle_data(export_filter: Annotated[FilterExportTypes, Query()]) -> Any:
+        with Session(engine) as session:
+            vehicle_record_id = service.get_vehicle_record_id(export_filter.vehicle_id, session)
+            return service.export_data(export_filter, vehicle_record_id, session)
+
+    return app
+
+
+async def run_clients(app, vehicle_ids: list[str], args) -> dict:
+    """Send args.requests list requests from args.clients clients while args.exporters clients export"""
+    import httpx
+
+    rng = random.Random(args.seed)
+    latencies: list[float] = []
+    remaining = args.requests
+    done = asyncio.Event()
+
+    async def lister(client):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            params = {'vehicle_id': rng.choice(vehicle_ids), 'page': rng.randrange(20), 'limit': 20}
+            started = time.perf_counter()
+            response = await client.get('/vehicle_data/', params=params)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    async def exporter(client):
+        exports = 0
+        while not done.is_set():
+            params = {'vehicle_id': rng.choice(vehicle_ids), 'export_type': 'CSV'}
+            (await client.get('/vehicle_data/export', params=params)).raise_for_status()
+            exports += 1
+        return exports
+
+    transport = httpx.ASGITransport(app=app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', limits=limits, timeout=None) as client:
+        exporters = [asyncio.create_task(exporter(client)) for _ in range(args.exporters)]
+        started = time.perf_counter()
+        await asyncio.gather(*(lister(client) for _ in range(args.clients)))
+        seconds = time.perf_counter() - started
+        done.set()
+        exports = sum(await asyncio.gather(*exporters))
+
+    return {
+        'requests': len(latencies),
+        'seconds': round(seconds, 3),
+        'requests_per_sec': round(len(latencies) / seconds, 1),
+        'p50_ms': percentile_ms(latencies, 50),
+        'p99_ms': percentile_ms(latencies, 99),
+        'max_ms': percentile_ms(latencies, 100),
+        'exports': exports,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--clients', type=int, default=200, help='parallel list clients')
+    parser.add_argument('--requests', type=int, default=4000, help='list requests per mode')
+    parser.add_argument('--exporters', type=int, default=2, help='parallel clients exporting whole vehicles')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='concurrency_bench_')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+    output = os.path.abspath(args.output) if args.output else None
+
+    from fastapi import FastAPI
+    from sqlmodel import Session, SQLModel, select
+
+    import vehicle.service as service
+    from benchmarks.fleet import write_fleet
+    from database import async_engine, engine
+    from vehicle.model import VehicleList
+    from vehicle.router import router
+
+    engine.echo = False
+    async_engine.echo = False
+    data_path = os.path.join(work_dir, 'data')
+    write_fleet(data_path, args.vehicles, args.rows, args.seed)
+    service.DATA_PATH = data_path
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    service.load_data_from_folder()
+    with Session(engine) as session:
+        vehicle_ids = list(session.exec(select(VehicleList.vehicle_id)).all())
+
+    async_app = FastAPI()
+    async_app.include_router(router)
+    # Exports are written to ./exports, keep them inside the work directory
+    os.chdir(work_dir)
+    results = {
+        'database': engine.dialect.name,
+        'params': vars(args),
+        'blocking': asyncio.run(run_clients(blocking_app(), vehicle_ids, args)),
+        'async': asyncio.run(run_clients(async_app, vehicle_ids, args)),
+    }
+    for mode in ('blocking', 'async'):
+        result = results[mode]
+        print(f"{mode:<9} {result['requests_per_sec']} req/sec p50 {result['p50_ms']}ms "
+              f"p99 {result['p99_ms']}ms, {result['exports']} exports")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Synthetic vehicle fleet written in the telemetry CSV schema
+
+Every vehicle alternates between driving and parked stretches like the sample files:
+parked rows have NULL speed and shift_state, a small share of readings drop out at
+random, some rows arrive out of order and some are logged twice.
+
+    python -m benchmarks.fleet /tmp/fleet --vehicles 100 --rows 10000
+"""
+import argparse
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+def make_vehicle_frame(
+    rng: np.random.Generator,
+    rows: int,
+    dropout_rate: float = 0.01,
+    out_of_order_rate: float = 0.01,
+    duplicate_rate: float = 0.005,
+) -> pd.DataFrame:
+    """Telemetry of one vehicle, rows are the readings before duplicates are added"""
+    # Alternate driving and parked stretches of random length
+    lengths = rng.integers(20, 400, rows // 20 + 2)
+    driving = np.repeat(np.arange(len(lengths)) % 2 == 0, lengths)[:rows]
+
+    gaps = np.where(driving, rng.integers(1, 10, rows), rng.integers(10, 600, rows))
+    start = pd.Timestamp('2022-07-12') + pd.Timedelta(seconds=int(rng.integers(0, 86400)))
+    timestamps = start + pd.to_timedelta(np.cumsum(gaps), unit='s')
+
+    speed = np.where(driving, rng.integers(5, 130, rows), 0).astype('float64')
+    odometer = np.round(float(rng.integers(1000, 90000)) + np.cumsum(speed * gaps) / 3600, 1)
+    # Discharge while driving, charge on some parked stretches
+    soc_delta = np.where(driving, -gaps * speed / 40000, np.where(rng.random(rows) < 0.3, gaps / 300, 0))
+    soc = np.clip(np.round(rng.integers(40, 95) + np.cumsum(soc_delta)), 0, 100)
+    elevation = np.round(100 + np.cumsum(rng.normal(0, 0.5, rows)))
+    shift_state = np.where(driving, np.where(rng.random(rows) < 0.02, 'R', 'D'), None).astype(object)
+
+    df = pd.DataFrame({
+        'timestamp': timestamps,
+        'speed': np.where(driving, speed, np.nan),
+        'odometer': odometer,
+        'soc': soc,
+        'elevation': elevation,
+        'shift_state': shift_state,
+    })
+
+    # Sensor dropouts
+    for column in ('speed', 'soc', 'elevation', 'shift_state'):
+        df.loc[rng.random(rows) < dropout_rate, column] = None
+
+    # Swap neighbouring rows so some readings arrive out of order
+    swapped = np.flatnonzero(rng.random(rows - 1) < out_of_order_rate)
+    order = np.arange(rows)
+    order[swapped], order[swapped + 1] = swapped + 1, swapped
+    df = df.iloc[order].reset_index(drop=True)
+
+    # Readings logged twice, right after the original
+    duplicates = df[rng.random(rows) < duplicate_rate]
+    df = pd.concat([df, duplicates]).sort_index(kind='stable')
+
+    df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3]
+    return df
+
+
+def write_fleet(directory: str, vehicles: int, rows: int, seed: int = 0) -> list[str]:
+    """Write one CSV file per vehicle and return their paths"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for _ in range(vehicles):
+        df = make_vehicle_frame(rng, rows)
+        path = os.path.join(directory, f"{uuid.UUID(int=int(rng.integers(0, 2**63)))}.csv")
+        df.to_csv(path, index=False, na_rep='NULL', float_format='%.10g')
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--vehicles', type=int, default=100)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = write_fleet(args.directory, args.vehicles, args.rows, args.seed)
+    print(f"Wrote {len(paths)} files to {args.directory}")
+
+
+if __name__ == '__main__':
+    main()
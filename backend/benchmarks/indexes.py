@@ -0,0 +1,123 @@
+"""Query plans and latency before and after the index migrations
+
+Loads a synthetic fleet, drops the indexes added by migrations 0003 and 0004 to get the
+schema of older databases, then applies those migrations again through the migration runner:
+
+    python -m benchmarks.indexes --vehicles 20 --rows 50000
+
+DATABASE_URL defaults to a temporary SQLite file, point it at a scratch MySQL database to
+see the InnoDB plans.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import delete, func, or_, select, text
+
+
+def explain(connection, statement) -> list[str]:
+    """Plan of a statement in the syntax of the connected database"""
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN' if connection.dialect.name == 'sqlite' else 'EXPLAIN'
+    result = connection.execute(text(f"{prefix} {sql}"))
+    return [' | '.join(str(value) for value in row) for row in result]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20, help='timed executions per query')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='index_bench_')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+
+    from sqlmodel import SQLModel
+
+    import vehicle.service as service
+    from benchmarks.fleet import write_fleet
+    from database import engine
+    from migrations import SchemaMigration, migrate
+    from vehicle.model import VehicleData, VehicleList
+
+    engine.echo = False
+    data_path = os.path.join(work_dir, 'data')
+    write_fleet(data_path, args.vehicles, args.rows)
+    service.DATA_PATH = data_path
+
+    SQLModel.metadata.drop_all(engine)
+    migrate(engine)
+    service.load_data_from_folder()
+
+    with engine.connect() as connection:
+        vehicle_id, record_id = connection.execute(
+            select(VehicleList.vehicle_id, VehicleList.id).order_by(VehicleList.id.desc()).limit(1)
+        ).one()
+        middle = connection.execute(
+            select(VehicleData.timestamp, VehicleData.id)
+            .where(VehicleData.vehicle_list_id == record_id)
+            .order_by(VehicleData.timestamp, VehicleData.id)
+            .offset(args.rows // 2).limit(1)
+        ).one()
+
+    data = VehicleData.__table__
+    queries = {
+        'vehicle_lookup': select(VehicleList.__table__).where(VehicleList.vehicle_id == vehicle_id),
+        'list_first_page': select(data).where(data.c.vehicle_list_id == record_id)
+        .order_by(data.c.timestamp, data.c.id).limit(21),
+        'list_cursor_page': select(data).where(
+            data.c.vehicle_list_id == record_id,
+            data.c.timestamp >= middle.timestamp,
+            or_(data.c.timestamp > middle.timestamp, data.c.id > middle.id),
+        ).order_by(data.c.timestamp, data.c.id).limit(21),
+        'count': select(func.count(data.c.id)).where(data.c.vehicle_list_id == record_id),
+        'export': select(data).where(data.c.vehicle_list_id == record_id),
+    }
+
+    def measure() -> dict:
+        results = {}
+        with engine.connect() as connection:
+            for name, statement in queries.items():
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    connection.execute(statement).all()
+                    samples.append(time.perf_counter() - started)
+                samples.sort()
+                results[name] = {
+                    'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+                    'plan': explain(connection, statement),
+                }
+        return results
+
+    # The schema of a database created before the index migrations
+    index_migrations = ('0003', '0004')
+    with engine.begin() as connection:
+        for index in (VehicleData.__table__.indexes | VehicleList.__table__.indexes):
+            if index.name in ('ix_vehicledata_vehicle_list_id_timestamp_id', 'ix_vehiclelist_vehicle_id'):
+                index.drop(connection)
+        connection.execute(delete(SchemaMigration).where(SchemaMigration.version.in_(index_migrations)))
+    before = measure()
+
+    migrate(engine)
+    after = measure()
+
+    results = {'database': engine.dialect.name, 'params': vars(args), 'queries': {}}
+    for name in queries:
+        results['queries'][name] = {'before': before[name], 'after': after[name]}
+        print(f"{name:<17} {before[name]['p50_ms']:>10.3f}ms -> {after[name]['p50_ms']:>8.3f}ms")
+        print(f"  before: {'; '.join(before[name]['plan'])}")
+        print(f"  after:  {'; '.join(after[name]['plan'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Ingest throughput by number of parser workers
+
+Writes a synthetic fleet and loads it into a fresh database once per worker count:
+
+    python -m benchmarks.ingest_workers --vehicles 300 --rows 2000 --workers 1,2,4,8
+
+DATABASE_URL defaults to a temporary SQLite file, point it at MySQL to measure the real writer.
+"""
+import argparse
+import json
+import os
+import tempfile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=300)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--workers', default='1,2,4,8', help='comma separated worker counts')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='ingest_bench_')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+
+    from sqlmodel import SQLModel
+
+    import vehicle.service as service
+    from benchmarks.fleet import write_fleet
+    from database import engine
+
+    engine.echo = False
+    data_path = os.path.join(work_dir, 'data')
+    write_fleet(data_path, args.vehicles, args.rows)
+    service.DATA_PATH = data_path
+
+    results = []
+    for workers in [int(value) for value in args.workers.split(',')]:
+        SQLModel.metadata.drop_all(engine)
+        SQLModel.metadata.create_all(engine)
+        stats = service.load_data_from_folder(workers=workers)
+        results.append({'workers': workers, **stats.as_dict()})
+        print(f"workers={workers:<3} rows={stats.rows:<9} {stats.seconds:8.2f}s {stats.rows_per_sec:12.0f} rows/sec")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Ingest, list query and export benchmarks on a synthetic fleet
+
+    python -m benchmarks.run_benchmarks --vehicles 50 --rows 20000 --output results.json
+
+DATABASE_URL defaults to a temporary SQLite file, point it at a scratch MySQL database to
+measure the production setup. The database is dropped and recreated before the run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def percentile_ms(samples: list[float], percentile: float) -> float:
+    return round(float(np.percentile(samples, percentile)) * 1000, 3)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=50)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--queries', type=int, default=200, help='list queries to time')
+    parser.add_argument('--exports', type=int, default=3, help='vehicles to export per format')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='vehicle_bench_')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+    output = os.path.abspath(args.output) if args.output else None
+    revision = git_revision()
+
+    from sqlmodel import Session, SQLModel, select
+
+    import vehicle.service as service
+    from benchmarks.fleet import write_fleet
+    from database import engine
+    from vehicle.model import VehicleList
+    from vehicle.schema import ExportTypes, FilterExportTypes, FilterVehicles
+
+    engine.echo = False
+    data_path = os.path.join(work_dir, 'data')
+    started = time.perf_counter()
+    write_fleet(data_path, args.vehicles, args.rows, args.seed)
+    generate_seconds = time.perf_counter() - started
+    service.DATA_PATH = data_path
+
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+
+    # Ingest
+    stats = service.load_data_from_folder(workers=args.workers)
+    print(f"ingest   {stats.rows} rows in {stats.seconds:.2f}s, {stats.rows_per_sec:.0f} rows/sec")
+
+    rng = random.Random(args.seed)
+    with Session(engine) as session:
+        vehicles = session.exec(select(VehicleList.vehicle_id, VehicleList.id)).all()
+
+        # List queries, a mix of first pages, deep pages and time windows
+        samples = []
+        for _ in range(args.queries):
+            vehicle_id, record_id = rng.choice(vehicles)
+            filter_vehicles = FilterVehicles(
+                vehicle_id=vehicle_id, page=rng.choice([0, 0, rng.randrange(args.rows // 20)]), limit=20,
+            )
+            started = time.perf_counter()
+            service.get_vehicle_list(filter_vehicles, record_id, session)
+            samples.append(time.perf_counter() - started)
+        list_results = {
+            'queries': len(samples),
+            'p50_ms': percentile_ms(samples, 50),
+            'p99_ms': percentile_ms(samples, 99),
+            'max_ms': percentile_ms(samples, 100),
+        }
+        print(f"list     p50 {list_results['p50_ms']}ms p99 {list_results['p99_ms']}ms")
+
+        # The deepest page of one vehicle, by OFFSET and by seeking from the previous page's cursor
+        vehicle_id, record_id = vehicles[0]
+        deep_page = max(args.rows // 20 - 1, 1)
+        cursor = service.get_vehicle_list(
+            FilterVehicles(vehicle_id=vehicle_id, page=deep_page - 1, limit=20), record_id, session,
+        )['next_cursor']
+        deep_filters = {
+            'page_0': FilterVehicles(vehicle_id=vehicle_id, limit=20),
+            'offset': FilterVehicles(vehicle_id=vehicle_id, page=deep_page, limit=20),
+            'cursor': FilterVehicles(vehicle_id=vehicle_id, cursor=cursor, limit=20),
+        }
+        deep_results = {'page': deep_page}
+        for name, filter_vehicles in deep_filters.items():
+            samples = []
+            for _ in range(max(args.queries // 10, 5)):
+                started = time.perf_counter()
+                service.get_vehicle_list(filter_vehicles, record_id, session)
+                samples.append(time.perf_counter() - started)
+            deep_results[f'{name}_p50_ms'] = percentile_ms(samples, 50)
+        list_results['deep_page'] = deep_results
+        print(f"page {deep_page:<5} offset {deep_results['offset_p50_ms']}ms cursor {deep_results['cursor_p50_ms']}ms "
+              f"(page 0 {deep_results['page_0_p50_ms']}ms)")
+
+        # Exports are written to ./exports, keep them inside the work directory
+        export_results = {}
+        previous_dir = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            for export_type in ExportTypes:
+                total_bytes = 0
+                seconds = 0.0
+                for vehicle_id, record_id in vehicles[:args.exports]:
+                    export_filter = FilterExportTypes(vehicle_id=vehicle_id, export_type=export_type.value)
+                    started = time.perf_counter()
+                    response = service.export_data(export_filter, record_id, session)
+                    seconds += time.perf_counter() - started
+                    total_bytes += os.path.getsize(response.path)
+                export_results[export_type.value] = {
+                    'files': min(args.exports, len(vehicles)),
+                    'bytes': total_bytes,
+                    'seconds': round(seconds, 3),
+                    'mb_per_sec': round(total_bytes / 2**20 / seconds, 2) if seconds else 0.0,
+                }
+                print(f"export   {export_type.value:<6} {export_results[export_type.value]['mb_per_sec']} MB/sec")
+        finally:
+            os.chdir(previous_dir)
+
+    results = {
+        'run_at': datetime.now(timezone.utc).isoformat(),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'database': engine.dialect.name,
+        'cpus': os.cpu_count(),
+        'params': vars(args),
+        'fleet': {'generate_seconds': round(generate_seconds, 3)},
+        'ingest': stats.as_dict(),
+        'list': list_results,
+        'export': export_results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
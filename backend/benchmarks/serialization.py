@@ -0,0 +1,116 @@
+"""Requests/sec of the list endpoint, orjson from column tuples against validated model instances
+
+    python -m benchmarks.serialization --rows 20000 --requests 1000
+
+Both paths read the same page through the async engine. The model path is the previous
+handler: it selects VehicleData instances and lets FastAPI validate them into
+VehicleListOutputSchema before encoding. The fast path is the list endpoint, encoding the
+fetched tuples with orjson. Requests are sent one at a time, so the rate is the CPU cost of
+a request at the largest page FilterVehicles allows. DATABASE_URL defaults to a temporary
+SQLite file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Annotated, Any
+
+
+def model_app():
+    """App serving the list endpoint with ORM rows validated through the response model"""
+    from fastapi import FastAPI, Query
+    from sqlmodel import select
+
+    from database import AsyncSessionDep
+    from vehicle.async_service import get_vehicle_record_id
+    from vehicle.counts import cached_row_count
+    from vehicle.model import VehicleData
+    from vehicle.schema import FilterVehicles, VehicleListOutputSchema
+
+    app = FastAPI()
+
+    @app.get('/vehicle_data/', response_model=VehicleListOutputSchema)
+    async def get_vehicle_data_list(filter_vehicles: Annotated[FilterVehicles, Query()], session: AsyncSessionDep) -> Any:
+        vehicle_record_id = await get_vehicle_record_id(filter_vehicles.vehicle_id, session)
+        statement = (
+            select(VehicleData).where(VehicleData.vehicle_list_id == vehicle_record_id)
+            .order_by(VehicleData.timestamp, VehicleData.id)
+            .offset(filter_vehicles.page * filter_vehicles.limit).limit(filter_vehicles.limit)
+        )
+        count = await session.run_sync(cached_row_count, vehicle_record_id)
+        return {'count': count, 'data': list((await session.exec(statement)).all())}
+
+    return app
+
+
+async def requests_per_sec(app, vehicle_id: str, limit: int, requests: int) -> float:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        params = {'vehicle_id': vehicle_id, 'limit': limit, 'page': 1}
+        # Warm the caches and the connection pool
+        (await client.get('/vehicle_data/', params=params)).raise_for_status()
+        started = time.perf_counter()
+        for _ in range(requests):
+            (await client.get('/vehicle_data/', params=params)).raise_for_status()
+        return round(requests / (time.perf_counter() - started), 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--limit', type=int, default=20, help='rows per page')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per path')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='serialization_bench_')
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+    output = os.path.abspath(args.output) if args.output else None
+
+    from fastapi import FastAPI
+    from sqlmodel import Session, SQLModel, select
+
+    import vehicle.service as service
+    from benchmarks.fleet import write_fleet
+    from database import async_engine, engine
+    from vehicle.model import VehicleList
+    from vehicle.router import router
+
+    engine.echo = False
+    async_engine.echo = False
+    data_path = os.path.join(work_dir, 'data')
+    write_fleet(data_path, 1, args.rows, args.seed)
+    service.DATA_PATH = data_path
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    service.load_data_from_folder()
+    with Session(engine) as session:
+        vehicle_id = session.exec(select(VehicleList.vehicle_id)).first()
+
+    fast_app = FastAPI()
+    fast_app.include_router(router)
+    apps = {'model': model_app(), 'orjson': fast_app}
+    rates = {name: asyncio.run(requests_per_sec(app, vehicle_id, args.limit, args.requests)) for name, app in apps.items()}
+    results = {
+        'database': engine.dialect.name,
+        'params': vars(args),
+        'requests_per_sec': rates,
+        'speedup': round(rates['orjson'] / rates['model'], 2),
+    }
+    print(f"model {rates['model']} req/sec, orjson {rates['orjson']} req/sec, x{results['speedup']}")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
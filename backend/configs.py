@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 API_BASE = '/api/v1'
@@ -11,6 +12,25 @@ DB_PORT = os.getenv('DB_PORT', '3306')
 DB_USER = os.getenv('DB_USER', 'fastapi_user')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'fastapi_password')
 DB_NAME = os.getenv('DB_NAME', 'vehicle')
+# Full SQLAlchemy URL, overrides the MySQL settings above (e.g. sqlite:///vehicle.db for local runs)
+DATABASE_URL = os.getenv('DATABASE_URL')
+# URL of the async route handlers, the database above through aiomysql/aiosqlite/asyncpg by default
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL')
+# Upper bounds for a single bulk write statement, keep DB_MAX_PACKET_BYTES under max_allowed_packet
+DB_BULK_CHUNK_ROWS = int(os.getenv('DB_BULK_CHUNK_ROWS', '5000'))
+DB_MAX_PACKET_BYTES = int(os.getenv('DB_MAX_PACKET_BYTES', str(16 * 1024 * 1024)))
+# Log every statement, synchronously on the request path
+DB_ECHO = os.getenv('DB_ECHO', 'false').lower() in ('1', 'true', 'yes')
+# Connection pool of each engine, the sync and the async one each hold up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW connections per process, size them against max_connections
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Connections older than this are replaced, keep it under MySQL wait_timeout
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# Test connections with a ping on checkout, dropped connections are replaced instead of failing a request
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
 
 # CORS Origins
 CORS_ORIGINS = [
@@ -22,4 +42,51 @@ CORS_ORIGINS = [
     "http://127.0.0.1:5173",    # Vite default dev server (127.0.0.1)
     "http://127.0.0.1:4173",    # Vite preview server (127.0.0.1)
     "http://127.0.0.1:8080",    # Alternative dev server port (127.0.0.1)
-]
\ No newline at end of file
+]
+
+# Ingest configuration
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '5000'))
+INGEST_CHUNK_ROWS = int(os.getenv('INGEST_CHUNK_ROWS', '50000'))
+INGEST_MEMORY_BUDGET_MB = int(os.getenv('INGEST_MEMORY_BUDGET_MB', '512'))
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '1'))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '8'))
+INGEST_LOCK_PATH = os.getenv('INGEST_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'vehicle-ingest.lock'))
+# Rows parsed and inserted per micro-batch by the streaming HTTP ingest
+INGEST_STREAM_BATCH_ROWS = int(os.getenv('INGEST_STREAM_BATCH_ROWS', '2000'))
+
+# Finished populate jobs kept in memory for status queries
+POPULATE_JOB_HISTORY = int(os.getenv('POPULATE_JOB_HISTORY', '20'))
+
+# API worker processes, uvicorn reads it as the default of --workers
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Watch DATA_PATH and load CSV files as they arrive, uses inotify when watchdog is installed.
+# The API only watches with a single worker, run python -m vehicle.watcher alongside several
+WATCH_ENABLED = os.getenv('WATCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+WATCH_POLLING = os.getenv('WATCH_POLLING', 'false').lower() in ('1', 'true', 'yes')
+WATCH_POLL_SECONDS = float(os.getenv('WATCH_POLL_SECONDS', '1.0'))
+# Seconds a file's size and mtime must stay unchanged before it is loaded
+WATCH_SETTLE_SECONDS = float(os.getenv('WATCH_SETTLE_SECONDS', '2.0'))
+WATCH_BATCH_FILES = int(os.getenv('WATCH_BATCH_FILES', '50'))
+# Longest wait before retrying files whose load failed, the wait doubles with every failure
+WATCH_RETRY_MAX_SECONDS = float(os.getenv('WATCH_RETRY_MAX_SECONDS', '300'))
+
+# Row counts of list queries cached per (vehicle, initial, final), ingest drops a vehicle's entries
+COUNT_CACHE_SIZE = int(os.getenv('COUNT_CACHE_SIZE', '1024'))
+COUNT_CACHE_TTL_SECONDS = float(os.getenv('COUNT_CACHE_TTL_SECONDS', '60'))
+
+# VehicleList ids cached per vehicle_id for the list and export endpoints
+VEHICLE_ID_CACHE_SIZE = int(os.getenv('VEHICLE_ID_CACHE_SIZE', '131072'))
+VEHICLE_ID_CACHE_TTL_SECONDS = float(os.getenv('VEHICLE_ID_CACHE_TTL_SECONDS', '3600'))
+
+# Most buckets one aggregation request may return
+AGGREGATE_MAX_BUCKETS = int(os.getenv('AGGREGATE_MAX_BUCKETS', '10000'))
+# Rows fetched per round trip by the downsampling range scan
+DOWNSAMPLE_SCAN_ROWS = int(os.getenv('DOWNSAMPLE_SCAN_ROWS', '50000'))
+
+# Rows further apart than this end a trip or a parked stretch, and bound how far back ingest re-segments
+SEGMENT_GAP_SECONDS = float(os.getenv('SEGMENT_GAP_SECONDS', '600'))
+# Rows fetched per round trip when segmenting
+SEGMENT_SCAN_ROWS = int(os.getenv('SEGMENT_SCAN_ROWS', '50000'))
+# Rows per record batch of Arrow IPC responses
+ARROW_BATCH_ROWS = int(os.getenv('ARROW_BATCH_ROWS', '65536'))
@@ -1,7 +1,27 @@
-from typing import Annotated
+import threading
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Annotated, Any, Callable, Dict, Iterator, Sequence
 from fastapi import Depends
+from sqlalchemy import Connection, event, insert, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
 from sqlmodel import Field, Session, SQLModel, create_engine, select
-from configs import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+from sqlmodel.ext.asyncio.session import AsyncSession
+from configs import (
+    ASYNC_DATABASE_URL, DATABASE_URL, DB_BULK_CHUNK_ROWS, DB_ECHO, DB_HOST, DB_MAX_OVERFLOW, DB_MAX_PACKET_BYTES, DB_NAME,
+    DB_PASSWORD, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_PORT, DB_USER,
+)
+
+
+BulkRows = Sequence[Mapping[str, Any] | Sequence[Any]]
+# Value written to a conflicting row from the table columns and the incoming values
+UpsertMerge = Callable[[Any, Any], Any]
 
 
 class BaseDataModel(SQLModel):
@@ -37,6 +57,125 @@ class BaseDataModel(SQLModel):
                 session.refresh(item)
             return saved_items
     
+    @classmethod
+    def bulk_insert(cls, rows: BulkRows, columns: Sequence[str] | None = None,
+                    connection: Connection | None = None, chunk_size: int | None = None) -> int:
+        """Insert rows given as dicts or tuples with executemany batches, returns the row count
+
+        No model instances are built and nothing is read back. Without a connection the rows
+        are written in their own transaction.
+        """
+        records = cls._bulk_records(rows, columns)
+        statement = insert(cls.__table__)
+        with cls._bulk_connection(connection) as conn:
+            for chunk in cls._bulk_chunks(records, chunk_size):
+                conn.execute(statement, chunk)
+        return len(records)
+
+    @classmethod
+    def bulk_upsert(cls, rows: BulkRows, update_columns: Sequence[str] | None = None,
+                    conflict_columns: Sequence[str] | None = None, columns: Sequence[str] | None = None,
+                    connection: Connection | None = None, chunk_size: int | None = None,
+                    merge: Mapping[str, UpsertMerge] | None = None) -> int:
+        """Insert rows, updating update_columns of the rows whose key already exists
+
+        MySQL resolves conflicts on any unique key with ON DUPLICATE KEY UPDATE. SQLite and
+        PostgreSQL need the conflict_columns of the unique key, the primary key by default.
+        update_columns defaults to every given column outside the conflict key, they are assigned
+        in order and MySQL shows later assignments the columns updated before them. merge maps a
+        column to a function of the table columns and the incoming values returning the value to
+        write instead of the incoming one, e.g. lambda current, new: current.rows + new.rows.
+        """
+        records = cls._bulk_records(rows, columns)
+        if not records:
+            return 0
+
+        table = cls.__table__
+        conflict_columns = list(conflict_columns or [column.name for column in table.primary_key])
+        if update_columns is None:
+            update_columns = [name for name in records[0] if name not in conflict_columns]
+
+        with cls._bulk_connection(connection) as conn:
+            dialect = conn.dialect.name
+            if dialect == 'mysql':
+                statement = mysql_insert(table)
+                statement = statement.on_duplicate_key_update(
+                    {name: cls._upsert_value(table, statement.inserted, name, merge) for name in update_columns}
+                )
+            elif dialect in ('sqlite', 'postgresql'):
+                statement = (sqlite_insert if dialect == 'sqlite' else postgresql_insert)(table)
+                statement = statement.on_conflict_do_update(
+                    index_elements=conflict_columns,
+                    set_={name: cls._upsert_value(table, statement.excluded, name, merge) for name in update_columns},
+                )
+            else:
+                raise NotImplementedError(f"bulk_upsert is not supported on {dialect}")
+
+            for chunk in cls._bulk_chunks(records, chunk_size):
+                conn.execute(statement, chunk)
+        return len(records)
+
+    @classmethod
+    def bulk_insert_returning_ids(cls, rows: BulkRows, columns: Sequence[str] | None = None,
+                                  connection: Connection | None = None, chunk_size: int | None = None) -> list[int]:
+        """Insert rows and return their primary keys in input order without re-selecting them
+
+        Drivers with executemany RETURNING get the ids from the insert itself. On MySQL every
+        chunk is one multi-row INSERT whose ids run consecutively from LAST_INSERT_ID(), which
+        InnoDB guarantees for a single simple insert.
+        """
+        records = cls._bulk_records(rows, columns)
+        table = cls.__table__
+        ids: list[int] = []
+        with cls._bulk_connection(connection) as conn:
+            returning = conn.dialect.insert_executemany_returning_sort_by_parameter_order
+            for chunk in cls._bulk_chunks(records, chunk_size):
+                if returning:
+                    statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+                    ids.extend(conn.execute(statement, chunk).scalars().all())
+                else:
+                    first_id = conn.execute(insert(table).values(chunk)).lastrowid
+                    ids.extend(range(first_id, first_id + len(chunk)))
+        return ids
+
+    @staticmethod
+    def _upsert_value(table, incoming, name: str, merge: Mapping[str, UpsertMerge] | None):
+        """Value an upsert writes to a conflicting row, the incoming value unless merged"""
+        if merge and name in merge:
+            return merge[name](table.c, incoming)
+        return incoming[name]
+
+    @classmethod
+    def _bulk_records(cls, rows: BulkRows, columns: Sequence[str] | None) -> list[Mapping[str, Any]]:
+        """Turn tuples into dicts keyed by columns, every table column except id by default"""
+        rows = list(rows)
+        if not rows or isinstance(rows[0], Mapping):
+            return rows
+        if columns is None:
+            columns = [column.name for column in cls.__table__.columns if column.name != 'id']
+        return [dict(zip(columns, row)) for row in rows]
+
+    @classmethod
+    def _bulk_chunks(cls, records: list[Mapping[str, Any]], chunk_size: int | None) -> Iterator[list[Mapping[str, Any]]]:
+        """Split records so a chunk stays under the driver packet limit and the chunk size"""
+        if not records:
+            return
+        sample = records[:100]
+        row_bytes = sum(len(repr(value)) + 2 for record in sample for value in record.values()) / len(sample)
+        rows_per_chunk = max(1, min(chunk_size or DB_BULK_CHUNK_ROWS, int(DB_MAX_PACKET_BYTES // max(row_bytes, 1))))
+        for start in range(0, len(records), rows_per_chunk):
+            yield records[start:start + rows_per_chunk]
+
+    @staticmethod
+    @contextmanager
+    def _bulk_connection(connection: Connection | None) -> Iterator[Connection]:
+        """Use the caller's connection, or a new transaction committed on success"""
+        if connection is not None:
+            yield connection
+        else:
+            with engine.begin() as conn:
+                yield conn
+
     @classmethod
     def get_all(cls) -> list['BaseDataModel']:
         """Get all records for this model"""
@@ -45,12 +184,134 @@ class BaseDataModel(SQLModel):
             results = session.exec(statement).all()
             return list(results)
 
-database_url = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4'
+class PoolMetrics:
+    """Checkout waits and connection churn of an engine's pool, reported by /metrics/db
+
+    Waits are timed around every checkout, including the ones served at once, so the mean
+    shows how often requests queue for a connection. Churn counts the connections opened,
+    closed and invalidated since the process started.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waiting = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.opened = 0
+        self.closed = 0
+        self.invalidated = 0
 
-engine = create_engine(database_url, echo=True)
+    def pool_class(self, base: type[Pool]) -> type[Pool]:
+        """Subclass of a pool class timing its checkouts, kept when the engine recreates the pool"""
+        metrics = self
+
+        class MeteredPool(base):
+            def connect(self):
+                with metrics._lock:
+                    metrics.waiting += 1
+                started = time.perf_counter()
+                timed_out = False
+                try:
+                    return super().connect()
+                except PoolTimeout:
+                    timed_out = True
+                    raise
+                finally:
+                    metrics._record_wait(time.perf_counter() - started, timed_out)
+
+        MeteredPool.__name__ = f'Metered{base.__name__}'
+        return MeteredPool
+
+    def _record_wait(self, seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            self.waiting -= 1
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def listen(self, pool: Pool) -> None:
+        """Count the connections a pool opens, closes and invalidates"""
+        def count(name):
+            def listener(*args):
+                with self._lock:
+                    setattr(self, name, getattr(self, name) + 1)
+            return listener
+
+        event.listen(pool, 'connect', count('opened'))
+        event.listen(pool, 'close', count('closed'))
+        event.listen(pool, 'close_detached', count('closed'))
+        event.listen(pool, 'invalidate', count('invalidated'))
+
+    def stats(self, pool: Pool) -> Dict[str, Any]:
+        """Current pool occupancy with the counters, occupancy is None for pools without a queue"""
+        queued = isinstance(pool, QueuePool)
+        with self._lock:
+            return {
+                'pool': type(pool).__name__,
+                'size': pool.size() if queued else None,
+                'checked_out': pool.checkedout() if queued else None,
+                'idle': pool.checkedin() if queued else None,
+                'overflow': max(pool.overflow(), 0) if queued else None,
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_mean': round(self.wait_seconds / self.checkouts, 6) if self.checkouts else 0.0,
+                'wait_seconds_max': round(self.max_wait_seconds, 6),
+                'connections_opened': self.opened,
+                'connections_closed': self.closed,
+                'connections_invalidated': self.invalidated,
+            }
+
+
+def engine_options(url: str, pool_class: type[Pool], metrics: PoolMetrics) -> Dict[str, Any]:
+    """Echo and pool settings of an engine, in-memory SQLite keeps its single connection pool"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        return {'echo': DB_ECHO}
+    return {
+        'echo': DB_ECHO,
+        'poolclass': metrics.pool_class(pool_class),
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+
+database_url = DATABASE_URL or f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4'
+
+pool_metrics = PoolMetrics()
+engine = create_engine(database_url, **engine_options(database_url, QueuePool, pool_metrics))
+pool_metrics.listen(engine.pool)
+
+# Async drivers speaking to the same databases as the sync ones
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_database_url(url: str) -> str:
+    """URL of the same database through the async driver of its dialect"""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
+
+# Engine of the async route handlers, its I/O never blocks the event loop
+async_pool_metrics = PoolMetrics()
+async_url = ASYNC_DATABASE_URL or async_database_url(database_url)
+async_engine = create_async_engine(async_url, **engine_options(async_url, AsyncAdaptedQueuePool, async_pool_metrics))
+async_pool_metrics.listen(async_engine.sync_engine.pool)
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    """Bring the database schema up to date by applying the pending migrations"""
+    from migrations import migrate
+    migrate(engine)
 
 
 def get_session():
@@ -58,4 +319,12 @@ def get_session():
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+SessionDep = Annotated[Session, Depends(get_session)]
+
+
+async def get_async_session():
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
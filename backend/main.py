@@ -1,3 +1,4 @@
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,16 +7,32 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from configs import API_BASE, CORS_ORIGINS
-from database import create_db_and_tables
+from configs import API_BASE, CORS_ORIGINS, WATCH_ENABLED, WEB_CONCURRENCY
+from database import async_engine, create_db_and_tables
+from metrics import router as metrics_router
 from vehicle.router import router as vehicle_router
 
 
+logger = logging.getLogger(__name__)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create Database models on startup
     create_db_and_tables()
+
+    # Load CSV files dropped into the data folder without calling populate, from one process only
+    watcher = None
+    if WATCH_ENABLED and WEB_CONCURRENCY > 1:
+        logger.warning("WATCH_ENABLED is ignored with %d API workers, run python -m vehicle.watcher instead", WEB_CONCURRENCY)
+    elif WATCH_ENABLED:
+        from vehicle.watcher import FolderWatcher
+        watcher = FolderWatcher()
+        watcher.start()
     yield
+    if watcher is not None:
+        watcher.stop(timeout=10)
+    await async_engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -27,9 +44,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Data version of polled responses, count and cursors of list pages sent as Arrow
+    expose_headers=["ETag", "X-Count", "X-Next-Cursor", "X-Prev-Cursor"],
 )
 
 app.include_router(vehicle_router, prefix=API_BASE)
+app.include_router(metrics_router, prefix=API_BASE)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,47 @@
+"""Process metrics of the API, the connection pools of both engines"""
+from typing import Any
+
+from fastapi import APIRouter, status
+from pydantic import BaseModel, Field
+
+from database import async_engine, async_pool_metrics, engine, pool_metrics
+
+
+class PoolStatsSchema(BaseModel):
+    pool: str
+    size: int | None
+    checked_out: int | None
+    idle: int | None
+    overflow: int | None
+    waiting: int
+    checkouts: int
+    timeouts: int
+    wait_seconds_mean: float
+    wait_seconds_max: float
+    connections_opened: int
+    connections_closed: int
+    connections_invalidated: int
+
+class DatabaseMetricsSchema(BaseModel):
+    sync: PoolStatsSchema
+    # async is a keyword
+    async_: PoolStatsSchema = Field(serialization_alias='async')
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get(
+        '/db',
+        response_model=DatabaseMetricsSchema,
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "Occupancy, checkout waits and connection churn of the connection pools"}
+           },
+        )
+def get_db_metrics() -> Any:
+    """Get the connection pool stats of this process's sync and async engines"""
+    return {
+        'sync': pool_metrics.stats(engine.pool),
+        'async_': async_pool_metrics.stats(async_engine.sync_engine.pool),
+    }
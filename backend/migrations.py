@@ -0,0 +1,290 @@
+"""Versioned schema migrations
+
+Every migration runs once per database, in order, and is recorded in the schemamigration
+table. The first one creates the tables missing from the database from the current models,
+so a fresh database gets the whole schema at once and the later migrations only change
+databases created by older versions. Migrations therefore check the schema before changing
+it, which also makes a run that was interrupted safe to repeat.
+
+    python -m migrations           # apply pending migrations
+    python -m migrations --status  # list applied and pending migrations
+"""
+import argparse
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List
+
+from sqlalchemy import (
+    Column, Connection, DateTime, Engine, ForeignKey, Index, Integer, MetaData, Table, delete, func, insert, inspect,
+    literal, select, text, update,
+)
+from sqlalchemy.schema import CreateColumn
+from sqlmodel import Field, SQLModel
+
+# Register every table with the metadata the first migration creates
+import vehicle.model  # noqa: F401
+from vehicle.aggregate import time_bucket
+from vehicle.counts import rebuild_row_counts
+from vehicle.model import DatasetVersion, IngestCheckpoint, VehicleData, VehicleList, VehicleSegment
+from vehicle.rollups import ROLLUPS, rebuild_rollups
+from vehicle.schema import BucketWidth
+from vehicle.segments import rebuild_segments
+from vehicle.versions import VEHICLE_LIST, bump_dataset_version
+
+
+logger = logging.getLogger(__name__)
+
+# Held while migrating so API processes starting together do not migrate at the same time
+MIGRATION_LOCK_NAME = 'vehicle_schema_migrations'
+MIGRATION_LOCK_SECONDS = 300
+
+# Hourly row counts added by migration 0005, replaced by the rollups of migration 0006
+HOURLY_COUNTS = Table(
+    'vehicledatahourlycount', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('bucket', DateTime, nullable=False),
+    Column('rows', Integer, nullable=False),
+    Column('vehicle_list_id', Integer, ForeignKey(VehicleList.__table__.c.id), nullable=False),
+    Index('ix_vehicledatahourlycount_vehicle_list_id_bucket', 'vehicle_list_id', 'bucket', unique=True),
+)
+
+
+class SchemaMigration(SQLModel, table=True):
+    """A migration applied to this database"""
+    version: str = Field(primary_key=True)
+    description: str
+    applied_at: datetime
+
+
+@dataclass
+class Migration:
+    version: str
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def index_names(connection: Connection, table: Table) -> set:
+    return {index['name'] for index in inspect(connection).get_indexes(table.name)}
+
+
+def create_index(connection: Connection, index: Index) -> None:
+    """Create an index unless the database already has one with its name"""
+    if index.name not in index_names(connection, index.table):
+        index.create(connection)
+
+
+def table_index(table: Table, name: str) -> Index:
+    return next(index for index in table.indexes if index.name == name)
+
+
+def _column_definition(connection: Connection, column: Column) -> str:
+    """Column DDL for ALTER TABLE, existing rows get the model default of NOT NULL columns"""
+    definition = str(CreateColumn(column).compile(dialect=connection.dialect))
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if not column.nullable and column.server_default is None and default is not None:
+        literal_default = literal(default).compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+        definition += f" DEFAULT {literal_default}"
+    return definition
+
+
+def add_missing_columns(connection: Connection) -> None:
+    """Add the model columns missing from tables created by older versions, with their indexes"""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        added = [column for column in table.columns if column.name not in existing]
+        for column in added:
+            logger.info("Adding column %s.%s", table.name, column.name)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_definition(connection, column)}"))
+        for index in table.indexes:
+            if any(column in added for column in index.columns):
+                create_index(connection, index)
+
+
+def alter_column_types(connection: Connection, columns: List[Column]) -> None:
+    """Change existing columns to the type of their model, SQLite stores any value its affinity allows"""
+    dialect = connection.dialect
+    if dialect.name == 'sqlite':
+        return
+    for column in columns:
+        logger.info("Changing column %s.%s to %s", column.table.name, column.name, column.type.compile(dialect=dialect))
+        if dialect.name == 'mysql':
+            connection.execute(text(f"ALTER TABLE {column.table.name} MODIFY COLUMN {_column_definition(connection, column)}"))
+        else:
+            name = dialect.identifier_preparer.quote(column.name)
+            connection.execute(text(
+                f"ALTER TABLE {column.table.name} ALTER COLUMN {name} TYPE {column.type.compile(dialect=dialect)}"
+            ))
+
+
+def create_tables(connection: Connection) -> None:
+    SQLModel.metadata.create_all(connection)
+
+
+def add_vehicle_time_index(connection: Connection) -> None:
+    create_index(connection, table_index(VehicleData.__table__, 'ix_vehicledata_vehicle_list_id_timestamp_id'))
+
+
+def make_vehicle_id_unique(connection: Connection) -> None:
+    """Merge vehicles registered twice into the first one, then index vehicle_id as unique"""
+    vehicles = VehicleList.__table__
+    duplicates = connection.execute(
+        select(vehicles.c.vehicle_id, func.min(vehicles.c.id))
+        .group_by(vehicles.c.vehicle_id)
+        .having(func.count() > 1)
+    ).all()
+    referencing = [
+        foreign_key.parent
+        for table in SQLModel.metadata.sorted_tables
+        for foreign_key in table.foreign_keys
+        if foreign_key.column is vehicles.c.id
+    ]
+    for vehicle_id, kept_id in duplicates:
+        merged_ids = select(vehicles.c.id).where(vehicles.c.vehicle_id == vehicle_id, vehicles.c.id != kept_id)
+        merged_ids = [row_id for row_id, in connection.execute(merged_ids)]
+        logger.warning("Merging duplicate vehicles %s of %s into %s", merged_ids, vehicle_id, kept_id)
+        for column in referencing:
+            connection.execute(update(column.table).where(column.in_(merged_ids)).values({column.name: kept_id}))
+        connection.execute(delete(vehicles).where(vehicles.c.id.in_(merged_ids)))
+
+    create_index(connection, table_index(vehicles, 'ix_vehiclelist_vehicle_id'))
+
+
+def add_row_counts(connection: Connection) -> None:
+    """Add the per vehicle and hourly row counts kept by ingest, filled from the existing rows"""
+    HOURLY_COUNTS.create(connection, checkfirst=True)
+    add_missing_columns(connection)
+    rebuild_row_counts(connection)
+    data = VehicleData.__table__
+    bucket = time_bucket(data.c.timestamp, BucketWidth.HOUR, connection.dialect.name)
+    connection.execute(delete(HOURLY_COUNTS))
+    connection.execute(insert(HOURLY_COUNTS).from_select(
+        ['vehicle_list_id', 'bucket', 'rows'],
+        select(data.c.vehicle_list_id, bucket, func.count(data.c.id)).group_by(data.c.vehicle_list_id, bucket),
+    ))
+
+
+def add_rollups(connection: Connection) -> None:
+    """Create the rollup tables filled from the existing rows, they replace the hourly row counts"""
+    for model in ROLLUPS.values():
+        model.__table__.create(connection, checkfirst=True)
+    connection.execute(text("DROP TABLE IF EXISTS vehicledatahourlycount"))
+    rebuild_rollups(connection)
+
+
+def add_segments(connection: Connection) -> None:
+    """Create the trip and charging session table, segmented from the existing rows"""
+    VehicleSegment.__table__.create(connection, checkfirst=True)
+    rebuild_segments(connection)
+
+
+def add_data_versions(connection: Connection) -> None:
+    """Add the data versions of the vehicles and the vehicle list served as ETags"""
+    DatasetVersion.__table__.create(connection, checkfirst=True)
+    add_missing_columns(connection)
+    bump_dataset_version(connection, VEHICLE_LIST)
+
+
+def widen_checkpoint_offsets(connection: Connection) -> None:
+    """Make the byte offsets and sizes of ingest checkpoints 64 bit"""
+    checkpoints = IngestCheckpoint.__table__
+    alter_column_types(connection, [checkpoints.c.byte_offset, checkpoints.c.file_size])
+
+
+def widen_checkpoint_mtimes(connection: Connection) -> None:
+    """Store the file mtimes of ingest checkpoints in double precision"""
+    alter_column_types(connection, [IngestCheckpoint.__table__.c.file_mtime])
+
+
+def widen_checkpoint_validation_state(connection: Connection) -> None:
+    """Store the validation state of ingest checkpoints at the precision of the parsed rows"""
+    checkpoints = IngestCheckpoint.__table__
+    alter_column_types(connection, [checkpoints.c.max_odometer, checkpoints.c.last_timestamp])
+
+
+MIGRATIONS: List[Migration] = [
+    Migration('0001', "Create tables", create_tables),
+    Migration('0002', "Add the columns introduced since the tables were created", add_missing_columns),
+    Migration('0003', "Index vehicledata by (vehicle_list_id, timestamp, id)", add_vehicle_time_index),
+    Migration('0004', "Unique index on vehiclelist.vehicle_id", make_vehicle_id_unique),
+    Migration('0005', "Row counts per vehicle and per hour for the list queries", add_row_counts),
+    Migration('0006', "Minute, hour and day rollups of the telemetry", add_rollups),
+    Migration('0007', "Trips and charging sessions", add_segments),
+    Migration('0008', "Data versions for conditional requests", add_data_versions),
+    Migration('0009', "64 bit ingest checkpoint offsets and file sizes", widen_checkpoint_offsets),
+    Migration('0010', "Double precision ingest checkpoint file mtimes", widen_checkpoint_mtimes),
+    Migration('0011', "Full precision ingest checkpoint validation state", widen_checkpoint_validation_state),
+]
+
+
+@contextmanager
+def migration_lock(connection: Connection) -> Iterator[None]:
+    """Serialise migrations across processes where the database offers a named lock"""
+    if connection.dialect.name != 'mysql':
+        yield
+        return
+    acquired = connection.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"), {'name': MIGRATION_LOCK_NAME, 'timeout': MIGRATION_LOCK_SECONDS},
+    ).scalar()
+    if not acquired:
+        raise RuntimeError("Timed out waiting for another process to finish migrating")
+    try:
+        yield
+    finally:
+        connection.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': MIGRATION_LOCK_NAME})
+
+
+def applied_versions(connection: Connection) -> set:
+    SchemaMigration.__table__.create(connection, checkfirst=True)
+    return set(connection.execute(select(SchemaMigration.__table__.c.version)).scalars())
+
+
+def migrate(engine: Engine, migrations: List[Migration] = MIGRATIONS) -> List[str]:
+    """Apply the pending migrations in order, returns the versions applied"""
+    applied = []
+    with engine.connect() as lock_connection, migration_lock(lock_connection):
+        with engine.begin() as connection:
+            done = applied_versions(connection)
+        for migration in migrations:
+            if migration.version in done:
+                continue
+            logger.info("Applying migration %s: %s", migration.version, migration.description)
+            # MySQL commits DDL implicitly, the version row is written with the last statement
+            with engine.begin() as connection:
+                migration.upgrade(connection)
+                connection.execute(SchemaMigration.__table__.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.now(timezone.utc).replace(tzinfo=None),
+                ))
+            applied.append(migration.version)
+    return applied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--status', action='store_true', help='list migrations without applying them')
+    args = parser.parse_args()
+
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.status:
+        with engine.begin() as connection:
+            done = applied_versions(connection)
+        for migration in MIGRATIONS:
+            state = 'applied' if migration.version in done else 'pending'
+            print(f"{migration.version}  {state:<8} {migration.description}")
+        return
+
+    applied = migrate(engine)
+    print(f"Applied {len(applied)} migrations" + (f": {', '.join(applied)}" if applied else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Time bucket aggregation of telemetry for charts
+
+Buckets lying wholly inside the requested range are read from the coarsest rollup table whose
+buckets tile them, the partial buckets at the edges of the range are computed by the database
+with a GROUP BY over the (vehicle_list_id, timestamp) index range of the vehicle. Either way
+only one row per bucket reaches Python.
+"""
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Float, cast, func, literal_column
+from sqlmodel import Session, select
+
+from configs import AGGREGATE_MAX_BUCKETS
+from vehicle.model import VehicleData
+from vehicle.rollups import ROLLUPS, ceil_bucket, floor_bucket, naive_utc, rollup_for
+from vehicle.schema import AggregateMetric, BucketWidth, FilterAggregate
+
+
+# Bucket start per width in the syntax of each database
+MYSQL_FORMATS = {
+    BucketWidth.MINUTE: '%Y-%m-%d %H:%i:00',
+    BucketWidth.HOUR: '%Y-%m-%d %H:00:00',
+    BucketWidth.DAY: '%Y-%m-%d 00:00:00',
+}
+POSTGRESQL_UNITS = {BucketWidth.MINUTE: 'minute', BucketWidth.HOUR: 'hour', BucketWidth.DAY: 'day'}
+# Length of the 'YYYY-MM-DD HH:MM' prefix of SQLite timestamps kept per width, and the rest of a bucket start
+SQLITE_PREFIXES = {
+    BucketWidth.MINUTE: (16, ':00.000000'),
+    BucketWidth.HOUR: (13, ':00:00.000000'),
+    BucketWidth.DAY: (10, ' 00:00:00.000000'),
+}
+
+# SQL aggregate and column of every metric. Ingest rejects odometer readings that go backwards,
+# so the last reading of a bucket is its highest one.
+METRICS: Dict[AggregateMetric, Tuple[Callable, str]] = {
+    AggregateMetric.AVG_SPEED: (func.avg, 'speed'),
+    AggregateMetric.MIN_SPEED: (func.min, 'speed'),
+    AggregateMetric.MAX_SPEED: (func.max, 'speed'),
+    AggregateMetric.AVG_SOC: (func.avg, 'soc'),
+    AggregateMetric.MIN_SOC: (func.min, 'soc'),
+    AggregateMetric.MAX_SOC: (func.max, 'soc'),
+    AggregateMetric.AVG_ELEVATION: (func.avg, 'elevation'),
+    AggregateMetric.MIN_ELEVATION: (func.min, 'elevation'),
+    AggregateMetric.MAX_ELEVATION: (func.max, 'elevation'),
+    AggregateMetric.LAST_ODOMETER: (func.max, 'odometer'),
+}
+# The same over rollup rows, averages divide the summed sums by the summed counts
+ROLLUP_METRICS: Dict[AggregateMetric, Tuple[Callable, str]] = {
+    AggregateMetric.MIN_SPEED: (func.min, 'speed_min'),
+    AggregateMetric.MAX_SPEED: (func.max, 'speed_max'),
+    AggregateMetric.MIN_SOC: (func.min, 'soc_min'),
+    AggregateMetric.MAX_SOC: (func.max, 'soc_max'),
+    AggregateMetric.MIN_ELEVATION: (func.min, 'elevation_min'),
+    AggregateMetric.MAX_ELEVATION: (func.max, 'elevation_max'),
+    AggregateMetric.LAST_ODOMETER: (func.max, 'odometer_last'),
+}
+
+
+class TooManyBuckets(ValueError):
+    """Raised when an aggregation would return more than AGGREGATE_MAX_BUCKETS buckets"""
+
+
+def time_bucket(column, width: BucketWidth, dialect: str):
+    """SQL expression truncating a datetime column to the start of its bucket"""
+    if dialect == 'mysql':
+        return func.date_format(column, MYSQL_FORMATS[width])
+    if dialect == 'postgresql':
+        # A literal, GROUP BY matches the select expression only without bound parameters
+        return func.date_trunc(literal_column(f"'{POSTGRESQL_UNITS[width]}'"), column)
+    # SQLite stores datetimes as ISO text, a prefix of it is cheaper than strftime. Buckets keep
+    # the full layout SQLAlchemy stores so they compare with bound values.
+    length, rest = SQLITE_PREFIXES[width]
+    return func.substr(column, 1, length).concat(rest)
+
+
+def epoch_seconds(column, dialect: str):
+    """SQL expression of a datetime column as float seconds since 1970-01-01, read as naive UTC"""
+    if dialect == 'mysql':
+        return func.timestampdiff(literal_column('MICROSECOND'), '1970-01-01 00:00:00', column) / 1e6
+    if dialect == 'postgresql':
+        return func.extract('epoch', column)
+    # Whole seconds from strftime, the microseconds from the '.ffffff' part of the stored text
+    return func.strftime('%s', column) + cast(literal_column("'0'").concat(func.substr(column, 20, 7)), Float)
+
+
+def _bucket_start(value) -> datetime:
+    """Bucket start as returned by the database, text on SQLite and MySQL"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _raw_buckets(session: Session, vehicle_record_id: int, width: BucketWidth, metrics: List[AggregateMetric],
+                 start: Optional[datetime], end: Optional[datetime], include_end: bool = True) -> list:
+    """Buckets computed from the rows with start <= timestamp <= end, or < end"""
+    bucket = time_bucket(VehicleData.timestamp, width, session.get_bind().dialect.name)
+    columns = [bucket.label('bucket'), func.count(VehicleData.id).label('rows')]
+    for metric in metrics:
+        aggregate, column = METRICS[metric]
+        columns.append(aggregate(getattr(VehicleData, column)).label(metric.value))
+
+    statement = select(*columns).where(VehicleData.vehicle_list_id == vehicle_record_id)
+    if start is not None:
+        statement = statement.where(VehicleData.timestamp >= start)
+    if end is not None:
+        statement = statement.where(VehicleData.timestamp <= end if include_end else VehicleData.timestamp < end)
+    statement = statement.group_by(bucket).order_by(bucket).limit(AGGREGATE_MAX_BUCKETS + 1)
+    return session.exec(statement).all()
+
+
+def _rollup_buckets(session: Session, vehicle_record_id: int, width: BucketWidth, metrics: List[AggregateMetric],
+                    start: Optional[datetime], end: Optional[datetime]) -> list:
+    """Buckets with start <= bucket < end read from the rollups"""
+    rollup = ROLLUPS[rollup_for(width)]
+    bucket = time_bucket(rollup.bucket, width, session.get_bind().dialect.name)
+    columns = [bucket.label('bucket'), func.sum(rollup.rows).label('rows')]
+    for metric in metrics:
+        if metric in ROLLUP_METRICS:
+            aggregate, column = ROLLUP_METRICS[metric]
+            columns.append(aggregate(getattr(rollup, column)).label(metric.value))
+        else:
+            metric_column = METRICS[metric][1]
+            columns.append((
+                func.sum(getattr(rollup, f'{metric_column}_sum'))
+                / func.nullif(func.sum(getattr(rollup, f'{metric_column}_count')), 0)
+            ).label(metric.value))
+
+    statement = select(*columns).where(rollup.vehicle_list_id == vehicle_record_id)
+    if start is not None:
+        statement = statement.where(rollup.bucket >= start)
+    if end is not None:
+        statement = statement.where(rollup.bucket < end)
+    statement = statement.group_by(bucket).order_by(bucket).limit(AGGREGATE_MAX_BUCKETS + 1)
+    return session.exec(statement).all()
+
+
+def aggregate_metrics(filter_aggregate: FilterAggregate) -> List[AggregateMetric]:
+    """The requested metrics once each, only those over the requested fields when fields are given"""
+    metrics = list(dict.fromkeys(filter_aggregate.metrics))
+    if filter_aggregate.fields:
+        fields = {field.value for field in filter_aggregate.fields}
+        metrics = [metric for metric in metrics if METRICS[metric][1] in fields]
+    return metrics
+
+
+def aggregate_vehicle_data(filter_aggregate: FilterAggregate, vehicle_record_id: int, session: Session) -> List[dict]:
+    """One row per bucket with its row count and the requested metrics, in time order"""
+    metrics = aggregate_metrics(filter_aggregate)
+    width = filter_aggregate.bucket
+    initial, final = naive_utc(filter_aggregate.initial), naive_utc(filter_aggregate.final)
+
+    # Whole buckets of the range come from the rollups, the partial ones at its edges from the rows
+    first_whole = ceil_bucket(initial, width) if initial else None
+    end_whole = floor_bucket(final, width) if final else None
+    if first_whole is not None and end_whole is not None and first_whole >= end_whole:
+        rows = _raw_buckets(session, vehicle_record_id, width, metrics, initial, final)
+    else:
+        rows = []
+        if initial and initial < first_whole:
+            rows += _raw_buckets(session, vehicle_record_id, width, metrics, initial, first_whole, include_end=False)
+        rows += _rollup_buckets(session, vehicle_record_id, width, metrics, first_whole, end_whole)
+        if final:
+            rows += _raw_buckets(session, vehicle_record_id, width, metrics, end_whole, final)
+    if len(rows) > AGGREGATE_MAX_BUCKETS:
+        raise TooManyBuckets(
+            f"The range spans more than {AGGREGATE_MAX_BUCKETS} buckets, narrow it or use a wider bucket"
+        )
+
+    results = []
+    for row in rows:
+        result = row._asdict()
+        result['bucket'] = _bucket_start(result['bucket'])
+        result['rows'] = int(result['rows'])
+        for metric in metrics:
+            if metric.value.startswith('avg_') and result[metric.value] is not None:
+                result[metric.value] = float(result[metric.value])
+        results.append(result)
+    return results
@@ -0,0 +1,152 @@
+"""Apache Arrow IPC stream responses of the read and export endpoints
+
+Clients asking for ARROW_STREAM in their Accept header get the rows as Arrow record batches of
+ARROW_BATCH_ROWS rows, built column by column from the fetched tuples and written to the
+response as each batch is encoded, so pandas, Polars or pyarrow load them without parsing
+JSON. Exports fetch their rows one batch at a time while the response is sent. Column types
+follow the VehicleData columns.
+"""
+import io
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional, responses stay JSON without it
+    pa = None
+
+from configs import ARROW_BATCH_ROWS
+from vehicle.model import VehicleData
+
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+# Media ranges of the Accept header matching a JSON response
+JSON_RANGES = ('application/json', 'application/*', '*/*')
+
+
+class NotAcceptable(ValueError):
+    """Raised when a client accepts only Arrow and pyarrow is not installed"""
+
+
+def accepted_ranges(accept: str) -> Dict[str, float]:
+    """Quality of every media range of an Accept header"""
+    ranges = {}
+    for media_range in accept.split(','):
+        media_type, *params = [part.strip() for part in media_range.split(';')]
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ranges[media_type.lower()] = max(quality, ranges.get(media_type.lower(), 0.0))
+    return ranges
+
+
+def wants_arrow(accept: Optional[str]) -> bool:
+    """Whether an Accept header prefers the Arrow stream to JSON
+
+    Arrow has to be listed explicitly, browsers sending */* keep getting JSON. Raises
+    NotAcceptable when Arrow is preferred but cannot be written and JSON is not accepted.
+    """
+    if not accept:
+        return False
+    ranges = accepted_ranges(accept)
+    arrow_quality = ranges.get(ARROW_STREAM, 0.0)
+    json_quality = max(ranges.get(media_range, 0.0) for media_range in JSON_RANGES)
+    if arrow_quality <= 0 or arrow_quality < json_quality:
+        return False
+    if pa is None:
+        if json_quality <= 0:
+            raise NotAcceptable(f"{ARROW_STREAM} responses need pyarrow installed on the server")
+        return False
+    return True
+
+
+def arrow_schema(names: Sequence[str]):
+    """Arrow schema of some VehicleData columns, every field nullable"""
+    types = {int: pa.int64(), float: pa.float64(), str: pa.string(), datetime: pa.timestamp('us')}
+    columns = VehicleData.__table__.c
+    # Decorated types such as the AutoString of str fields tell their Python type through impl
+    return pa.schema([
+        pa.field(name, types[getattr(columns[name].type, 'impl', columns[name].type).python_type]) for name in names
+    ])
+
+
+def record_batch(schema, rows: Sequence[Sequence]):
+    """Record batch of the leading len(schema) columns of the rows"""
+    columns = zip(*rows)
+    arrays = [pa.array(values, type=field.type) for field, values in zip(schema, columns)]
+    return pa.record_batch(arrays, schema=schema)
+
+
+def record_batches(names: Sequence[str], rows: List[Sequence], batch_rows: int) -> Iterator:
+    """Record batches of the leading len(names) columns of the rows"""
+    schema = arrow_schema(names)
+    for start in range(0, len(rows), batch_rows):
+        yield record_batch(schema, rows[start:start + batch_rows])
+
+
+class _StreamWriter:
+    """Arrow IPC stream writer handing out the bytes written since the last call"""
+
+    def __init__(self, names: Sequence[str]):
+        self.schema = arrow_schema(names)
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def flush(self) -> bytes:
+        chunk = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return chunk
+
+    def write(self, rows: Sequence[Sequence]) -> bytes:
+        self._writer.write_batch(record_batch(self.schema, rows))
+        return self.flush()
+
+    def close(self) -> bytes:
+        # End of stream marker written on close
+        self._writer.close()
+        return self.flush()
+
+
+def arrow_stream(names: Sequence[str], rows: List[Sequence], batch_rows: int) -> Iterator[bytes]:
+    """Arrow IPC stream of the rows, the schema message first and then one chunk per record batch"""
+    writer = _StreamWriter(names)
+    yield writer.flush()
+    for start in range(0, len(rows), batch_rows):
+        yield writer.write(rows[start:start + batch_rows])
+    yield writer.close()
+
+
+async def arrow_partition_stream(names: Sequence[str], partitions: AsyncIterator[Sequence[Sequence]]) -> AsyncIterator[bytes]:
+    """Arrow IPC stream with one record batch per partition of rows, encoded in the threadpool"""
+    writer = _StreamWriter(names)
+    yield writer.flush()
+    async for rows in partitions:
+        yield await run_in_threadpool(writer.write, rows)
+    yield writer.close()
+
+
+def arrow_response(names: Sequence[str], rows: List[Sequence], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """Response streaming the rows as Arrow, encoded in the threadpool as the client reads"""
+    return StreamingResponse(arrow_stream(names, rows, ARROW_BATCH_ROWS), media_type=ARROW_STREAM, headers=headers)
+
+
+def arrow_partition_response(names: Sequence[str], partitions: Callable[[int], AsyncIterator[Sequence[Sequence]]],
+                             headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """Response streaming rows as Arrow while they are fetched
+
+    partitions is called with ARROW_BATCH_ROWS and yields the rows in partitions of at most that
+    many, each is written as a record batch before the next one is fetched.
+    """
+    stream = arrow_partition_stream(names, partitions(ARROW_BATCH_ROWS))
+    return StreamingResponse(stream, media_type=ARROW_STREAM, headers=headers)
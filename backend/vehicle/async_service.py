@@ -0,0 +1,136 @@
+"""Read paths of the async route handlers on the async engine
+
+Queries are awaited on an AsyncSession, so a slow query or a long export leaves the event loop
+free for other requests. The queries and responses are the ones of vehicle.service. Code with
+no async version, the cached row counts, runs through AsyncSession.run_sync on the same
+connection, and writing export files runs in the threadpool. List pages are encoded by orjson
+from the fetched tuples, or as Arrow streams by vehicle.arrow.
+"""
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from vehicle.arrow import arrow_partition_response, arrow_response
+from vehicle.cache import vehicle_id_cache
+from vehicle.counts import cached_row_count
+from vehicle.model import DatasetVersion, VehicleData, VehicleList
+from vehicle.schema import FilterExportTypes, FilterVehicles
+from vehicle.service import export_statement, list_fields, vehicle_list_page, vehicle_list_statement, write_export
+
+
+async def get_vehicle_record_id(vehicle_id: str, session: AsyncSession) -> Optional[int]:
+    """Get the VehicleList id of a vehicle, None when it is unknown, found ids are cached"""
+    vehicle_record_id = vehicle_id_cache.get(vehicle_id)
+    if vehicle_record_id is None:
+        result = await session.exec(select(VehicleList.id).where(VehicleList.vehicle_id == vehicle_id))
+        vehicle_record_id = result.first()
+        if vehicle_record_id is not None:
+            vehicle_id_cache.put(vehicle_id, vehicle_record_id)
+    return vehicle_record_id
+
+
+async def get_vehicle_data_version(vehicle_record_id: int, session: AsyncSession) -> Tuple[int, Optional[datetime]]:
+    """Data version of a vehicle with the time it was bumped, a primary key lookup on VehicleList"""
+    statement = select(VehicleList.data_version, VehicleList.data_modified_at).where(VehicleList.id == vehicle_record_id)
+    row = (await session.exec(statement)).first()
+    return (row.data_version, row.data_modified_at) if row else (0, None)
+
+
+async def get_dataset_version(name: str, session: AsyncSession) -> Tuple[int, Optional[datetime]]:
+    """Version of a dataset with the time it was bumped, 0 when it never was"""
+    statement = select(DatasetVersion.version, DatasetVersion.modified_at).where(DatasetVersion.name == name)
+    row = (await session.exec(statement)).first()
+    return (row.version, row.modified_at) if row else (0, None)
+
+
+async def get_all_vehicle_ids(session: AsyncSession) -> List[VehicleList]:
+    """Get all vehicle IDs from the VehicleList table"""
+    result = await session.exec(select(VehicleList))
+    return list(result.all())
+
+
+async def get_a_vehicle(id: int, session: AsyncSession) -> Optional[VehicleData]:
+    """Get a vehicle data by ID from VehicleData table"""
+    return await session.get(VehicleData, id)
+
+
+async def read_vehicle_list(filter_vehicles: FilterVehicles, vehicle_record_id: int, session: AsyncSession,
+                            data_version: Optional[int] = None) -> dict:
+    """Page of vehicle.service.get_vehicle_list with its rows as column tuples
+
+    The list_fields columns lead each tuple, followed by the id and timestamp read for the
+    cursors when they were not requested. data_version is the version the response is sent
+    under, the count is only taken from the cache entries of that version.
+    """
+    statement, direction = vehicle_list_statement(filter_vehicles, vehicle_record_id)
+
+    count = await session.run_sync(
+        cached_row_count, vehicle_record_id, filter_vehicles.initial or None, filter_vehicles.final or None,
+        data_version,
+    )
+    results = list((await session.exec(statement)).all())
+    return vehicle_list_page(filter_vehicles, results, direction, count)
+
+
+async def get_vehicle_list(filter_vehicles: FilterVehicles, vehicle_record_id: int, session: AsyncSession,
+                           headers: Optional[Dict[str, str]] = None,
+                           data_version: Optional[int] = None) -> ORJSONResponse:
+    """Get a page of a vehicle's rows as vehicle.service.get_vehicle_list does, encoded by orjson
+
+    The rows are column tuples straight from the driver, the response is encoded from them
+    without validating every row into VehicleListOutputSchema again. Rows keep the requested
+    fields only, the id and timestamp read for the cursors are dropped when not requested.
+    headers, such as the validators of data_version, are sent with the response.
+    """
+    page = await read_vehicle_list(filter_vehicles, vehicle_record_id, session, data_version)
+    # The requested fields lead the selected columns, zip stops before the cursor columns
+    names = list_fields(filter_vehicles)
+    page['data'] = [dict(zip(names, row)) for row in page['data']]
+    return ORJSONResponse(page, headers=headers)
+
+
+async def get_vehicle_list_arrow(filter_vehicles: FilterVehicles, vehicle_record_id: int, session: AsyncSession,
+                                 headers: Optional[Dict[str, str]] = None,
+                                 data_version: Optional[int] = None) -> StreamingResponse:
+    """Get a page of a vehicle's rows as an Arrow stream
+
+    The count and cursors of the page are sent in the X-Count, X-Next-Cursor and X-Prev-Cursor
+    headers.
+    """
+    page = await read_vehicle_list(filter_vehicles, vehicle_record_id, session, data_version)
+    headers = {**(headers or {}), 'X-Count': str(page['count'])}
+    if page['next_cursor']:
+        headers['X-Next-Cursor'] = page['next_cursor']
+    if page['prev_cursor']:
+        headers['X-Prev-Cursor'] = page['prev_cursor']
+    return arrow_response(list_fields(filter_vehicles), page['data'], headers)
+
+
+async def export_data(export_filter: FilterExportTypes, vehicle_record_id: int, session: AsyncSession) -> FileResponse:
+    """Export a vehicle's rows, read as plain rows of the requested fields without building model instances"""
+    connection = await session.connection()
+    result = await connection.execute(export_statement(export_filter, vehicle_record_id))
+    data_list = [dict(row) for row in result.mappings()]
+    return await run_in_threadpool(write_export, export_filter, data_list)
+
+
+async def export_data_arrow(export_filter: FilterExportTypes, vehicle_record_id: int, session: AsyncSession) -> StreamingResponse:
+    """Export a vehicle's rows as an Arrow stream instead of an export_type file
+
+    The rows are fetched a record batch at a time while the response is sent, on a connection of
+    their own since the session is closed once the handler returns.
+    """
+    statement = export_statement(export_filter, vehicle_record_id)
+    engine = session.bind
+
+    async def partitions(batch_rows: int) -> AsyncIterator[Sequence]:
+        async with engine.connect() as connection:
+            result = await connection.stream(statement)
+            async for partition in result.partitions(batch_rows):
+                yield partition
+
+    return arrow_partition_response(list(statement.selected_columns.keys()), partitions)
@@ -0,0 +1,141 @@
+"""Fleet queries answering many vehicles with a handful of statements
+
+The latest rows of every vehicle come from one UNION ALL of per vehicle index seeks, each
+branch reads only the rows it returns from the (vehicle_list_id, timestamp, id) index. The
+summaries of every vehicle are grouped by vehicle in one statement per part of the range:
+whole days, hours and minutes from the rollups and the seconds left at the edges from the rows.
+"""
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, union_all
+from sqlmodel import Session, select
+
+from vehicle.aggregate import METRICS
+from vehicle.model import VehicleData
+from vehicle.rollups import ROLLUPS, covering_rollups, naive_utc
+from vehicle.schema import AggregateMetric, BucketWidth, FilterBatch
+
+# Vehicles per UNION ALL statement, SQLite caps a compound select at 500 terms
+UNION_VEHICLES = 200
+
+DATA_COLUMNS = ('id', 'timestamp', 'speed', 'odometer', 'soc', 'elevation', 'shift_state')
+
+# Parts of a summary are merged by adding them up or keeping their extreme, averages add up
+# their sums and counts and odometer readings only grow
+MERGE_PARTS = {'sum': lambda a, b: a + b, 'min': min, 'max': max}
+METRIC_MERGES = {'avg': 'sum', 'min': 'min', 'max': 'max', 'last': 'max'}
+
+
+def _merge(metric: AggregateMetric) -> str:
+    return METRIC_MERGES[metric.value.split('_', 1)[0]]
+
+
+def latest_rows(session: Session, vehicle_record_ids: List[int], filter_batch: FilterBatch) -> Dict[int, List[dict]]:
+    """Latest filter_batch.latest rows of every vehicle in the range, newest first"""
+    limit = filter_batch.latest
+    initial, final = naive_utc(filter_batch.initial), naive_utc(filter_batch.final)
+    columns = [getattr(VehicleData, name) for name in DATA_COLUMNS] + [VehicleData.vehicle_list_id]
+    rows: Dict[int, List[dict]] = {vehicle_record_id: [] for vehicle_record_id in vehicle_record_ids}
+    if not limit:
+        return rows
+    for start in range(0, len(vehicle_record_ids), UNION_VEHICLES):
+        branches = []
+        for vehicle_record_id in vehicle_record_ids[start:start + UNION_VEHICLES]:
+            branch = select(*columns).where(VehicleData.vehicle_list_id == vehicle_record_id)
+            if initial:
+                branch = branch.where(VehicleData.timestamp >= initial)
+            if final:
+                branch = branch.where(VehicleData.timestamp <= final)
+            # Wrapped, SQLite rejects ORDER BY and LIMIT on the terms of a compound select
+            branch = branch.order_by(VehicleData.timestamp.desc(), VehicleData.id.desc()).limit(limit).subquery()
+            branches.append(select(branch))
+        statement = union_all(*branches) if len(branches) > 1 else branches[0]
+        for row in session.connection().execute(statement).mappings():
+            rows[row['vehicle_list_id']].append({name: row[name] for name in DATA_COLUMNS})
+    # UNION ALL does not keep the order of its terms
+    for vehicle_rows in rows.values():
+        vehicle_rows.sort(key=lambda row: (row['timestamp'], row['id']), reverse=True)
+    return rows
+
+
+def _part_columns(width: Optional[BucketWidth], metrics: List[AggregateMetric]) -> list:
+    """Aggregates of one part of the range labelled <name>__<how parts merge>, from a rollup or the rows"""
+    rollup = ROLLUPS[width] if width is not None else None
+    columns = [(func.count(VehicleData.id) if rollup is None else func.sum(rollup.rows)).label('rows__sum')]
+    for metric in metrics:
+        how, name = _merge(metric), METRICS[metric][1]
+        if rollup is None:
+            column = getattr(VehicleData, name)
+            if how == 'sum':
+                columns += [func.sum(column).label(f'{metric.value}__sum'), func.count(column).label(f'{metric.value}_count__sum')]
+            else:
+                columns.append(getattr(func, how)(column).label(f'{metric.value}__{how}'))
+        elif how == 'sum':
+            columns += [
+                func.sum(getattr(rollup, f'{name}_sum')).label(f'{metric.value}__sum'),
+                func.sum(getattr(rollup, f'{name}_count')).label(f'{metric.value}_count__sum'),
+            ]
+        else:
+            source = 'last' if metric == AggregateMetric.LAST_ODOMETER else how
+            columns.append(getattr(func, how)(getattr(rollup, f'{name}_{source}')).label(f'{metric.value}__{how}'))
+    return columns
+
+
+def summaries(session: Session, vehicle_record_ids: List[int], filter_batch: FilterBatch) -> Dict[int, dict]:
+    """Row count and metrics of every vehicle over the range"""
+    metrics = list(dict.fromkeys(filter_batch.metrics))
+    initial, final = naive_utc(filter_batch.initial), naive_utc(filter_batch.final)
+    # Timestamps have microsecond precision, final is inclusive
+    end = final + timedelta(microseconds=1) if final else None
+
+    parts: Dict[int, dict] = {vehicle_record_id: {} for vehicle_record_id in vehicle_record_ids}
+    for width, start, stop in covering_rollups(initial, end):
+        model = VehicleData if width is None else ROLLUPS[width]
+        key = VehicleData.timestamp if width is None else model.bucket
+        statement = select(model.vehicle_list_id, *_part_columns(width, metrics)).where(
+            model.vehicle_list_id.in_(vehicle_record_ids)
+        )
+        if start is not None:
+            statement = statement.where(key >= start)
+        if stop is not None:
+            statement = statement.where(key < stop)
+        for row in session.exec(statement.group_by(model.vehicle_list_id)).all():
+            merged = parts[row[0]]
+            for label, value in row._asdict().items():
+                if label == 'vehicle_list_id' or value is None:
+                    continue
+                how = label.rsplit('__', 1)[1]
+                merged[label] = value if merged.get(label) is None else MERGE_PARTS[how](merged[label], value)
+
+    results = {}
+    for vehicle_record_id, merged in parts.items():
+        summary = {'rows': int(merged.get('rows__sum', 0))}
+        for metric in metrics:
+            value = merged.get(f'{metric.value}__{_merge(metric)}')
+            if metric.value.startswith('avg_'):
+                count = merged.get(f'{metric.value}_count__sum')
+                value = float(value) / float(count) if count else None
+            summary[metric.value] = value
+        results[vehicle_record_id] = summary
+    return results
+
+
+def get_vehicle_batch(filter_batch: FilterBatch, vehicle_record_ids: Dict[str, int], session: Session) -> dict:
+    """Latest rows and summary of every known vehicle in request order, with the unknown vehicle ids"""
+    record_ids = list(vehicle_record_ids.values())
+    rows = latest_rows(session, record_ids, filter_batch)
+    vehicle_summaries: Dict[int, Optional[dict]] = (
+        summaries(session, record_ids, filter_batch) if filter_batch.summary and record_ids else {}
+    )
+    return {
+        'vehicles': [
+            {
+                'vehicle_id': vehicle_id,
+                'summary': vehicle_summaries.get(vehicle_record_id),
+                'data': rows[vehicle_record_id],
+            }
+            for vehicle_id, vehicle_record_id in vehicle_record_ids.items()
+        ],
+        'missing': [vehicle_id for vehicle_id in dict.fromkeys(filter_batch.vehicle_ids) if vehicle_id not in vehicle_record_ids],
+    }
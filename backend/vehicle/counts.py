@@ -0,0 +1,152 @@
+"""Row counts of the vehicle list queries answered from counters maintained at ingest
+
+COUNT(*) over a vehicle walks its whole index range, which dominates the list query once a
+vehicle holds millions of rows. Ingest keeps a total per vehicle and the hourly rollups in the
+same transaction as the rows, so an unbounded count is a primary key lookup and a time window
+sums the row counts of its whole hours and only counts the rows of the partial hours at its edges.
+
+Counts are cached by (vehicle_list_id, initial, final, data_version). The ingest write path
+drops the entries of a vehicle once its rows are committed, the TTL bounds how long other
+processes serve a count from before an ingest they did not see. Versioned responses pass the
+data version they read, a count cached at another version is never served under their ETag.
+"""
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Connection, func, update
+from sqlmodel import Session, select
+
+from configs import COUNT_CACHE_SIZE, COUNT_CACHE_TTL_SECONDS
+from vehicle.cache import TTLCache
+from vehicle.model import VehicleData, VehicleDataRollupHour, VehicleList
+from vehicle.rollups import ceil_bucket, floor_bucket, naive_utc
+from vehicle.schema import BucketWidth
+from vehicle.versions import utc_now
+
+
+CountKey = Tuple[int, Optional[datetime], Optional[datetime], Optional[int]]
+
+
+def record_row_counts(connection: Connection, vehicle_list_id: int, rows: int) -> None:
+    """Add inserted rows to the total of a vehicle and bump its data version, in the inserting transaction"""
+    if not rows:
+        return
+    vehicles = VehicleList.__table__
+    connection.execute(
+        update(vehicles)
+        .where(vehicles.c.id == vehicle_list_id)
+        .values(
+            row_count=vehicles.c.row_count + rows,
+            data_version=vehicles.c.data_version + 1,
+            data_modified_at=utc_now(),
+        )
+    )
+
+
+def rebuild_row_counts(connection: Connection, vehicle_list_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute the total of some or every vehicle from its rows
+
+    The rows may have been written outside ingest, so the data versions are bumped as well.
+    """
+    data = VehicleData.__table__
+    vehicles = VehicleList.__table__
+    statement = update(vehicles).values(
+        row_count=select(func.count(data.c.id)).where(data.c.vehicle_list_id == vehicles.c.id).scalar_subquery(),
+        data_version=vehicles.c.data_version + 1,
+        data_modified_at=utc_now(),
+    )
+    if vehicle_list_ids is not None:
+        statement = statement.where(vehicles.c.id.in_(list(vehicle_list_ids)))
+    connection.execute(statement)
+
+
+def _count_range(session: Session, vehicle_list_id: int, start: Optional[datetime], end: datetime,
+                 include_end: bool = True) -> int:
+    """COUNT of the rows between two timestamps, used for spans of at most a few hours"""
+    statement = select(func.count(VehicleData.id)).where(VehicleData.vehicle_list_id == vehicle_list_id)
+    if start is not None:
+        statement = statement.where(VehicleData.timestamp >= start)
+    statement = statement.where(VehicleData.timestamp <= end if include_end else VehicleData.timestamp < end)
+    return session.exec(statement).one()
+
+
+def count_rows(session: Session, vehicle_list_id: int, initial: Optional[datetime] = None,
+               final: Optional[datetime] = None) -> int:
+    """Rows of a vehicle with initial <= timestamp <= final, from the counters kept by ingest"""
+    initial, final = naive_utc(initial), naive_utc(final)
+    if initial is None and final is None:
+        count = session.exec(select(VehicleList.row_count).where(VehicleList.id == vehicle_list_id)).first()
+        return count or 0
+
+    # Whole hours inside the window come from the hourly rollups
+    first_hour = ceil_bucket(initial, BucketWidth.HOUR) if initial is not None else None
+    end_hour = floor_bucket(final, BucketWidth.HOUR) if final is not None else None
+    if first_hour is not None and end_hour is not None and first_hour >= end_hour:
+        return _count_range(session, vehicle_list_id, initial, final)
+
+    hourly = select(func.coalesce(func.sum(VehicleDataRollupHour.rows), 0)).where(
+        VehicleDataRollupHour.vehicle_list_id == vehicle_list_id
+    )
+    if first_hour is not None:
+        hourly = hourly.where(VehicleDataRollupHour.bucket >= first_hour)
+    if end_hour is not None:
+        hourly = hourly.where(VehicleDataRollupHour.bucket < end_hour)
+    count = int(session.exec(hourly).one())
+
+    # Partial hours at the edges are counted from the rows
+    if initial is not None and initial < first_hour:
+        count += _count_range(session, vehicle_list_id, initial, first_hour, include_end=False)
+    if final is not None:
+        count += _count_range(session, vehicle_list_id, end_hour, final)
+    return count
+
+
+class CountCache(TTLCache[CountKey, int]):
+    """TTL LRU of row counts keyed by (vehicle_list_id, initial, final, data_version)
+
+    Every invalidation bumps the generation of the vehicle, a count computed before it is not
+    stored afterwards so a reader racing an ingest cannot put back the old count.
+    """
+
+    def __init__(self, max_entries: int = COUNT_CACHE_SIZE, ttl_seconds: float = COUNT_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__(max_entries, ttl_seconds, clock)
+        self._generations: Dict[int, int] = {}
+
+    def generation(self, vehicle_list_id: int) -> int:
+        with self._lock:
+            return self._generations.get(vehicle_list_id, 0)
+
+    def put(self, key: CountKey, count: int, generation: int) -> None:
+        """Store a count computed when the vehicle was at generation"""
+        with self._lock:
+            if self._generations.get(key[0], 0) == generation:
+                self._store(key, count)
+
+    def invalidate(self, vehicle_list_id: int) -> None:
+        """Drop the counts of a vehicle, called once new rows of it are committed"""
+        with self._lock:
+            self._generations[vehicle_list_id] = self._generations.get(vehicle_list_id, 0) + 1
+        self.invalidate_where(lambda key: key[0] == vehicle_list_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generations.clear()
+        super().clear()
+
+
+count_cache = CountCache()
+
+
+def cached_row_count(session: Session, vehicle_list_id: int, initial: Optional[datetime] = None,
+                     final: Optional[datetime] = None, data_version: Optional[int] = None,
+                     cache: CountCache = count_cache) -> int:
+    """count_rows served from the count cache, from the entries of data_version when given"""
+    key = (vehicle_list_id, initial, final, data_version)
+    count = cache.get(key)
+    if count is None:
+        generation = cache.generation(vehicle_list_id)
+        count = count_rows(session, vehicle_list_id, initial, final)
+        cache.put(key, count, generation)
+    return count
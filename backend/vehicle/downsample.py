@@ -0,0 +1,115 @@
+"""Downsampling of long telemetry series to the points a chart can draw
+
+The series is read with one streamed range scan that hands the rows over in partitions of
+DOWNSAMPLE_SCAN_ROWS, each turned into float arrays at once. Timestamps are selected as epoch
+seconds so no datetime object is built per row.
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from configs import DOWNSAMPLE_SCAN_ROWS
+from vehicle.aggregate import epoch_seconds
+from vehicle.model import VehicleData
+from vehicle.schema import DownsampleAlgorithm, DownsampleMetric, FilterDownsample
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices kept by Largest-Triangle-Three-Buckets, x sorted ascending
+
+    The first and last points are kept, the others are split into points - 2 buckets. Each
+    bucket keeps the point forming the largest triangle with the point kept before it and the
+    average of the next bucket.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    # Average of every bucket, the last point is the one after the last bucket
+    counts = np.diff(edges)
+    next_x = np.append(np.add.reduceat(x[:-1], edges[:-1])[1:] / counts[1:], x[-1])
+    next_y = np.append(np.add.reduceat(y[:-1], edges[:-1])[1:] / counts[1:], y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Twice the triangle area, the constant factor does not change the argmax
+        area = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def _first_per_segment(positions: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    """First of the positions in each segment, positions sorted ascending"""
+    owners = segments[positions]
+    return positions[np.concatenate(([True], owners[1:] != owners[:-1]))]
+
+
+def minmax(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of the lowest and highest point of points // 2 equal time buckets, x sorted ascending"""
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+
+    buckets = max(points // 2, 1)
+    width = (x[-1] - x[0]) / buckets or 1.0
+    bucket_ids = np.minimum(((x - x[0]) / width).astype(np.int64), buckets - 1)
+    starts = np.flatnonzero(np.concatenate(([True], bucket_ids[1:] != bucket_ids[:-1])))
+    segments = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+
+    lowest = _first_per_segment(np.flatnonzero(y == np.minimum.reduceat(y, starts)[segments]), segments)
+    highest = _first_per_segment(np.flatnonzero(y == np.maximum.reduceat(y, starts)[segments]), segments)
+    return np.union1d(lowest, highest)
+
+
+DOWNSAMPLERS = {
+    DownsampleAlgorithm.LTTB: lttb,
+    DownsampleAlgorithm.MINMAX: minmax,
+}
+
+
+def load_series(session: Session, vehicle_record_id: int, metric: DownsampleMetric,
+                initial: Optional[datetime] = None, final: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Epoch seconds and values of a metric in time order, rows without a value are skipped"""
+    column = getattr(VehicleData, metric.value)
+    statement = select(
+        epoch_seconds(VehicleData.timestamp, session.get_bind().dialect.name), column,
+    ).where(VehicleData.vehicle_list_id == vehicle_record_id, column.is_not(None))
+    if initial:
+        statement = statement.where(VehicleData.timestamp >= initial)
+    if final:
+        statement = statement.where(VehicleData.timestamp <= final)
+    statement = statement.order_by(VehicleData.timestamp, VehicleData.id)
+
+    # Core rows on the session's connection, numpy reads plain tuples far faster than Row objects
+    result = session.connection().execution_options(yield_per=DOWNSAMPLE_SCAN_ROWS).execute(statement)
+    parts = [np.array([tuple(row) for row in partition], dtype=np.float64) for partition in result.partitions()]
+    if not parts:
+        return np.empty(0), np.empty(0)
+    series = np.concatenate(parts)
+    return series[:, 0], series[:, 1]
+
+
+def downsample_vehicle_data(filter_downsample: FilterDownsample, vehicle_record_id: int, session: Session) -> dict:
+    """Points of a metric reduced with the requested algorithm, with the counts before and after"""
+    x, y = load_series(session, vehicle_record_id, filter_downsample.metric, filter_downsample.initial, filter_downsample.final)
+    selected = DOWNSAMPLERS[filter_downsample.algorithm](x, y, filter_downsample.points)
+
+    timestamps = np.round(x[selected] * 1e6).astype(np.int64).astype('datetime64[us]').tolist()
+    return {
+        'metric': filter_downsample.metric,
+        'algorithm': filter_downsample.algorithm,
+        'points_requested': filter_downsample.points,
+        'points': len(selected),
+        'rows_scanned': len(x),
+        'data': [{'timestamp': timestamp, 'value': value} for timestamp, value in zip(timestamps, y[selected].tolist())],
+    }
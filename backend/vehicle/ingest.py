@@ -0,0 +1,578 @@
+import gc
+import hashlib
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Connection, update
+
+try:
+    import fcntl
+except ImportError:  # Windows, the in-process lock still applies
+    fcntl = None
+
+from configs import INGEST_BATCH_SIZE, INGEST_CHUNK_ROWS, INGEST_LOCK_PATH, INGEST_MEMORY_BUDGET_MB, INGEST_QUEUE_SIZE
+from vehicle.counts import record_row_counts
+from vehicle.model import IngestCheckpoint, VehicleData, VehicleDataQuarantine
+from vehicle.rollups import METRIC_COLUMNS, chunk_rollups, columns_rollups, record_rollups
+from vehicle.schema import BucketWidth, RejectReason
+from vehicle.segments import update_segments
+
+
+logger = logging.getLogger(__name__)
+
+# Column layout of the telemetry CSV files
+INT_COLUMNS = ('speed', 'soc', 'elevation')
+FLOAT_COLUMNS = ('odometer',)
+STRING_COLUMNS = ('shift_state',)
+DATA_COLUMNS = ('timestamp',) + INT_COLUMNS + FLOAT_COLUMNS + STRING_COLUMNS
+
+# Reject reasons in rule order, rows store the reason of the first rule they break
+REJECT_REASONS = tuple(RejectReason)
+
+# Sentinels used by the vehicle loggers for missing values
+NULL_TOKENS = ('NULL', 'null', '')
+
+# Smallest chunk read by the streaming ingest, used to probe the per-row memory cost
+MIN_CHUNK_ROWS = 1000
+# Length of the file head hashed to tell appended files from rewritten ones
+HASH_BYTES = 64 * 1024
+# Ratio between the DataFrame footprint of a chunk and the python columns and row dicts built from it
+ROW_OVERHEAD_FACTOR = 6
+
+# Serialises ingest runs within this process, the lock file serialises them across processes
+_ingest_thread_lock = threading.Lock()
+
+
+class IngestCancelled(Exception):
+    """Raised when an ingest run stops because it was cancelled"""
+
+
+class StreamIngestError(ValueError):
+    """Raised when a streamed upload cannot be parsed, after rows_committed rows were stored"""
+
+    def __init__(self, message: str, rows_committed: int):
+        super().__init__(message)
+        self.rows_committed = rows_committed
+
+
+@dataclass
+class IngestStats:
+    """Counters collected while ingesting vehicle data"""
+    files: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    peak_rss_bytes: int = 0
+    files_rewritten: int = 0
+    rows_rejected: int = 0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'files': self.files,
+            'rows': self.rows,
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+            'peak_rss_mb': round(self.peak_rss_bytes / (1024 * 1024), 1),
+            'files_rewritten': self.files_rewritten,
+            'rows_rejected': self.rows_rejected,
+        }
+
+
+@contextmanager
+def ingest_lock() -> Iterator[None]:
+    """Hold the ingest lock so two loads never work on the same files at once"""
+    with _ingest_thread_lock:
+        with open(INGEST_LOCK_PATH, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+def _nullify(series: pd.Series) -> pd.Series:
+    """Turn the NULL sentinels of text columns into NaN"""
+    if series.dtype == object:
+        return series.mask(series.isin(NULL_TOKENS))
+    return series
+
+
+def _timestamp_index(series: pd.Series) -> pd.DatetimeIndex:
+    """Parse a timestamp column once, normalising timezone aware values to naive UTC"""
+    timestamps = pd.DatetimeIndex(pd.to_datetime(series, format='ISO8601'))
+    if timestamps.hasnans:
+        raise ValueError("Rows without a timestamp cannot be ingested")
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_convert('UTC').tz_localize(None)
+    return timestamps
+
+
+def _number_array(series: pd.Series) -> np.ndarray:
+    """Parse a numeric column to float64 with NaN for missing values"""
+    return pd.to_numeric(_nullify(series)).astype('float64').to_numpy()
+
+
+def _number_list(numbers: np.ndarray, as_int: bool) -> list:
+    """Convert parsed numbers to python numbers with None for missing values"""
+    missing = np.isnan(numbers)
+    if as_int:
+        values = np.trunc(np.where(missing, 0, numbers)).astype(np.int64).astype(object)
+    else:
+        values = numbers.astype(object)
+    values[missing] = None
+    return values.tolist()
+
+
+def _string_array(series: pd.Series) -> np.ndarray:
+    """Parse a text column to python strings with None for missing values"""
+    series = _nullify(series)
+    return series.astype('string').astype(object).where(series.notna(), None).to_numpy()
+
+
+def _parse_frame(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Parse every telemetry column of a raw DataFrame into an array"""
+    arrays = {'timestamp': _timestamp_index(df['timestamp']).to_numpy()}
+    for name in INT_COLUMNS + FLOAT_COLUMNS:
+        arrays[name] = _number_array(df[name])
+    for name in STRING_COLUMNS:
+        arrays[name] = _string_array(df[name])
+    return arrays
+
+
+def _to_columns(arrays: Dict[str, np.ndarray], vehicle_list_id: int, rows: Optional[np.ndarray] = None) -> Dict[str, list]:
+    """Convert parsed arrays, or the selected rows of them, to insert ready column lists"""
+    if rows is not None:
+        arrays = {name: values[rows] for name, values in arrays.items()}
+    columns = {'timestamp': pd.DatetimeIndex(arrays['timestamp']).to_pydatetime().tolist()}
+    for name in INT_COLUMNS:
+        columns[name] = _number_list(arrays[name], as_int=True)
+    for name in FLOAT_COLUMNS:
+        columns[name] = _number_list(arrays[name], as_int=False)
+    for name in STRING_COLUMNS:
+        columns[name] = arrays[name].tolist()
+    columns['vehicle_list_id'] = [vehicle_list_id] * len(columns['timestamp'])
+    return columns
+
+
+def normalise_frame(df: pd.DataFrame, vehicle_list_id: int) -> Dict[str, list]:
+    """Convert a raw telemetry DataFrame into insert ready column lists in one column-wise pass"""
+    return _to_columns(_parse_frame(df), vehicle_list_id)
+
+
+class FileValidation:
+    """Quality rules applied to the rows of one file, chunk by chunk
+
+    Every rule is a vectorised mask over the parsed columns and a row is rejected with the
+    first rule it breaks. Missing values never break a rule. The highest odometer and latest
+    timestamp accepted so far are carried from chunk to chunk, and through the checkpoint
+    from run to run, so the odometer and duplicate rules hold across chunk boundaries.
+    Odometer readings are compared in timestamp order, a row that merely arrives late is
+    not rejected.
+    """
+
+    def __init__(self, max_odometer: Optional[float] = None, last_timestamp: Optional[datetime] = None):
+        self.max_odometer = max_odometer
+        self.last_timestamp = last_timestamp
+        self.rejected: Counter = Counter()
+
+    def reject_codes(self, arrays: Dict[str, np.ndarray]) -> np.ndarray:
+        """Index into REJECT_REASONS plus one for every row, 0 for accepted rows"""
+        speed, odometer, soc = arrays['speed'], arrays['odometer'], arrays['soc']
+        timestamps = arrays['timestamp'].astype('datetime64[ns]')
+        codes = np.zeros(len(timestamps), dtype=np.int8)
+
+        def reject(mask: np.ndarray, reason: RejectReason) -> None:
+            codes[(codes == 0) & mask] = REJECT_REASONS.index(reason) + 1
+
+        with np.errstate(invalid='ignore'):
+            reject(speed < 0, RejectReason.NEGATIVE_SPEED)
+            reject(odometer < 0, RejectReason.NEGATIVE_ODOMETER)
+            reject((soc < 0) | (soc > 100), RejectReason.SOC_OUT_OF_RANGE)
+
+        # Repeated timestamps, within the chunk or of the last row accepted before it
+        accepted = np.flatnonzero(codes == 0)
+        duplicates = np.zeros(len(timestamps), dtype=bool)
+        duplicates[accepted] = pd.Index(timestamps[accepted]).duplicated()
+        if self.last_timestamp is not None:
+            duplicates |= timestamps == np.datetime64(self.last_timestamp, 'ns')
+        reject(duplicates, RejectReason.DUPLICATE_TIMESTAMP)
+
+        # Odometer below the highest reading before it in time
+        order = np.argsort(timestamps, kind='stable')
+        readings = np.where((codes == 0) & ~np.isnan(odometer), odometer, -np.inf)[order]
+        carried = -np.inf if self.max_odometer is None else self.max_odometer
+        previous_max = np.maximum.accumulate(np.concatenate(([carried], readings)))[:-1]
+        backwards = np.zeros(len(timestamps), dtype=bool)
+        backwards[order] = (readings < previous_max) & (readings > -np.inf)
+        reject(backwards, RejectReason.ODOMETER_BACKWARDS)
+
+        # Carry the accepted maxima to the next chunk
+        accepted = codes == 0
+        if accepted.any():
+            last_timestamp = pd.Timestamp(timestamps[accepted].max()).to_pydatetime()
+            if self.last_timestamp is None or last_timestamp > self.last_timestamp:
+                self.last_timestamp = last_timestamp
+            odometer_max = np.nanmax(odometer[accepted], initial=-np.inf)
+            if np.isfinite(odometer_max) and (self.max_odometer is None or odometer_max > self.max_odometer):
+                self.max_odometer = float(odometer_max)
+        return codes
+
+
+@dataclass
+class ParsedChunk:
+    """Insert ready rows of a chunk, the rows rejected by validation and the carried validation state
+
+    rollups holds the rollup rows of the accepted rows per width, they are worked out from the
+    columns when missing.
+    """
+    columns: Dict[str, list]
+    rejected: Dict[str, list] = field(default_factory=dict)
+    max_odometer: Optional[float] = None
+    last_timestamp: Optional[datetime] = None
+    rollups: Optional[Dict[BucketWidth, List[dict]]] = None
+
+    @property
+    def rows_rejected(self) -> int:
+        return len(self.rejected.get('reason', ()))
+
+    @property
+    def vehicle_list_id(self) -> Optional[int]:
+        """Vehicle of the accepted rows, None when the chunk has none"""
+        vehicle_list_ids = self.columns.get('vehicle_list_id')
+        return vehicle_list_ids[0] if vehicle_list_ids else None
+
+
+def validate_frame(df: pd.DataFrame, vehicle_list_id: int, validation: FileValidation) -> ParsedChunk:
+    """Normalise a raw telemetry DataFrame and split off the rows that break a quality rule"""
+    arrays = _parse_frame(df)
+    codes = validation.reject_codes(arrays)
+    rejected_rows = np.flatnonzero(codes)
+    if not len(rejected_rows):
+        columns, rejected = _to_columns(arrays, vehicle_list_id), {}
+        rollups = chunk_rollups(arrays['timestamp'], {name: arrays[name] for name in METRIC_COLUMNS})
+    else:
+        columns = _to_columns(arrays, vehicle_list_id, np.flatnonzero(codes == 0))
+        rejected = _to_columns(arrays, vehicle_list_id, rejected_rows)
+        reasons = np.array([reason.value for reason in REJECT_REASONS], dtype=object)[codes[rejected_rows] - 1]
+        rejected['reason'] = reasons.tolist()
+        validation.rejected.update(rejected['reason'])
+        accepted = codes == 0
+        rollups = chunk_rollups(arrays['timestamp'][accepted], {name: arrays[name][accepted] for name in METRIC_COLUMNS})
+    return ParsedChunk(columns, rejected, validation.max_odometer, validation.last_timestamp, rollups)
+
+
+def to_records(columns: Dict[str, list]) -> List[dict]:
+    """Zip column lists into the row dicts expected by an executemany call"""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def insert_vehicle_data(connection: Connection, columns: Dict[str, list], batch_size: int = INGEST_BATCH_SIZE) -> int:
+    """Insert normalised rows with batched Core INSERT ... VALUES statements, returns the row count"""
+    return VehicleData.bulk_insert(to_records(columns), connection=connection, chunk_size=batch_size)
+
+
+def insert_chunk(connection: Connection, chunk: ParsedChunk, checkpoint_id: Optional[int] = None,
+                 batch_size: int = INGEST_BATCH_SIZE) -> int:
+    """Insert the accepted rows of a chunk and quarantine the rejected ones, returns the accepted row count
+
+    The row count, the rollups and the segments of the vehicle are advanced in the same transaction.
+    """
+    if chunk.rejected:
+        records = to_records(chunk.rejected)
+        for record in records:
+            record['checkpoint_id'] = checkpoint_id
+        VehicleDataQuarantine.bulk_insert(records, connection=connection, chunk_size=batch_size)
+    rows = insert_vehicle_data(connection, chunk.columns, batch_size)
+    if rows:
+        record_row_counts(connection, chunk.vehicle_list_id, rows)
+        rollups = chunk.rollups if chunk.rollups is not None else columns_rollups(chunk.columns)
+        record_rollups(connection, chunk.vehicle_list_id, rollups)
+        update_segments(connection, chunk.vehicle_list_id, min(chunk.columns['timestamp']))
+    return rows
+
+
+async def iter_line_batches(chunks: AsyncIterator[bytes], batch_lines: int, header: bool = False) -> AsyncIterator[List[bytes]]:
+    """Split a streamed body into batches of complete, non-empty lines without buffering it whole
+
+    With header set, the first line is yielded alone before the batches.
+    """
+    pending = b''
+    lines: List[bytes] = []
+    async for chunk in chunks:
+        *complete, pending = (pending + chunk).split(b'\n')
+        lines.extend(line for line in complete if line.strip())
+        if header and lines:
+            yield [lines.pop(0)]
+            header = False
+        while len(lines) >= batch_lines:
+            yield lines[:batch_lines]
+            lines = lines[batch_lines:]
+    if pending.strip():
+        lines.append(pending)
+    if lines:
+        yield lines
+
+
+def parse_csv_lines(header: bytes, lines: List[bytes]) -> pd.DataFrame:
+    """Parse a batch of CSV lines that share a header"""
+    df = pd.read_csv(io.BytesIO(header + b'\n' + b'\n'.join(lines)))
+    return df.reindex(columns=DATA_COLUMNS)
+
+
+def parse_ndjson_lines(lines: List[bytes]) -> pd.DataFrame:
+    """Parse a batch of NDJSON objects, keys missing from an object are read as missing values"""
+    df = pd.read_json(io.BytesIO(b'\n'.join(lines)), lines=True, dtype=False, convert_dates=False)
+    return df.reindex(columns=DATA_COLUMNS)
+
+
+def log_stats(stats: IngestStats) -> None:
+    """Report ingest throughput"""
+    logger.info(
+        "Ingested %d rows from %d files in %.2fs (%.0f rows/sec)",
+        stats.rows, stats.files, stats.seconds, stats.rows_per_sec,
+    )
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryBudget:
+    """Sizes streaming ingest chunks so the resident memory of the process stays under a budget"""
+
+    def __init__(self, budget_mb: int = INGEST_MEMORY_BUDGET_MB, max_rows: int = INGEST_CHUNK_ROWS):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.max_rows = max(max_rows, 1)
+        self.bytes_per_row: Optional[float] = None
+        self.peak_rss_bytes = 0
+
+    def observe(self, df: pd.DataFrame) -> None:
+        """Record the memory cost of a chunk that has just been read"""
+        if len(df):
+            per_row = df.memory_usage(deep=True).sum() / len(df) * ROW_OVERHEAD_FACTOR
+            self.bytes_per_row = max(self.bytes_per_row or 0.0, per_row)
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.peak_rss_bytes = max(self.peak_rss_bytes, rss)
+
+    def next_chunk_rows(self) -> int:
+        """Number of rows the next chunk may hold without exceeding the budget"""
+        if self.bytes_per_row is None:
+            return min(self.max_rows, MIN_CHUNK_ROWS)
+
+        rss = current_rss_bytes()
+        if rss is not None and rss > self.budget_bytes:
+            gc.collect()
+            rss = current_rss_bytes()
+            if rss is not None and rss > self.budget_bytes:
+                logger.warning("Ingest RSS %d MB is above the %d MB budget", rss // (1024 * 1024), self.budget_bytes // (1024 * 1024))
+
+        # Without /proc assume half of the budget is already in use
+        headroom = self.budget_bytes - rss if rss is not None else self.budget_bytes // 2
+        rows = int(headroom // self.bytes_per_row)
+        return max(min(self.max_rows, rows), min(self.max_rows, MIN_CHUNK_ROWS))
+
+
+def iter_csv_chunks(path: str, start_offset: int, budget: MemoryBudget) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """Read a CSV file in chunks sized by the memory budget, starting at a byte offset
+
+    Yields each chunk together with the byte offset right after its last line, which is
+    the position to resume from once the chunk has been committed. A last line without a
+    newline is still being written, it is left for the next run.
+    """
+    with open(path, 'rb') as csv_file:
+        header = csv_file.readline()
+        if not header.endswith(b'\n'):
+            return
+        if start_offset > csv_file.tell():
+            csv_file.seek(start_offset)
+
+        while True:
+            lines = list(itertools.islice(csv_file, budget.next_chunk_rows()))
+            end_offset = csv_file.tell()
+            if lines and not lines[-1].endswith(b'\n'):
+                end_offset -= len(lines.pop())
+            if not lines:
+                return
+            df = pd.read_csv(io.BytesIO(header + b''.join(lines)))
+            del lines
+            budget.observe(df)
+            yield df, end_offset
+
+
+def commit_chunk(connection: Connection, checkpoint_id: int, chunk: ParsedChunk, end_offset: int) -> int:
+    """Insert a chunk and advance its file checkpoint in the same transaction, returns the accepted row count"""
+    rows = insert_chunk(connection, chunk, checkpoint_id)
+    checkpoints = IngestCheckpoint.__table__
+    connection.execute(
+        update(checkpoints)
+        .where(checkpoints.c.id == checkpoint_id)
+        .values(
+            byte_offset=end_offset,
+            rows_committed=checkpoints.c.rows_committed + rows,
+            rows_rejected=checkpoints.c.rows_rejected + chunk.rows_rejected,
+            max_odometer=chunk.max_odometer,
+            last_timestamp=chunk.last_timestamp,
+        )
+    )
+    return rows
+
+
+def file_head_hash(path: str, length: int) -> str:
+    """SHA-256 of the first length bytes of a file"""
+    with open(path, 'rb') as head:
+        return hashlib.sha256(head.read(length)).hexdigest()
+
+
+def record_file_manifest(connection: Connection, checkpoint_id: int, path: str) -> None:
+    """Store the size, mtime and head hash of a file whose rows have all been committed"""
+    stat = os.stat(path)
+    hashed_bytes = min(stat.st_size, HASH_BYTES)
+    checkpoints = IngestCheckpoint.__table__
+    connection.execute(
+        update(checkpoints)
+        .where(checkpoints.c.id == checkpoint_id)
+        .values(
+            file_size=stat.st_size,
+            file_mtime=stat.st_mtime,
+            content_hash=file_head_hash(path, hashed_bytes),
+            hashed_bytes=hashed_bytes,
+        )
+    )
+
+
+@dataclass
+class FileTask:
+    """A CSV file to ingest, starting from its checkpoint"""
+    path: str
+    checkpoint_id: int
+    vehicle_list_id: int
+    start_offset: int = 0
+    max_odometer: Optional[float] = None
+    last_timestamp: Optional[datetime] = None
+
+    def validation(self) -> FileValidation:
+        """Validation state resumed from the checkpoint"""
+        return FileValidation(self.max_odometer, self.last_timestamp)
+
+
+# Chunk queue and cancel flag shared with the parser processes, set by init_parser_worker
+_chunk_queue = None
+_cancel_event = None
+
+
+def init_parser_worker(chunk_queue, cancel_event) -> None:
+    global _chunk_queue, _cancel_event
+    _chunk_queue = chunk_queue
+    _cancel_event = cancel_event
+
+
+def parse_file_worker(task: FileTask, budget_mb: int) -> None:
+    """Parse and normalise one file in a worker process, feeding its chunks to the writer queue
+
+    A final None chunk marks the end of the file with a success flag, the peak RSS and the
+    rejected rows per reason. It is sent even when parsing fails or is cancelled so the
+    writer never waits on a dead file.
+    """
+    budget = MemoryBudget(budget_mb=budget_mb)
+    validation = task.validation()
+    parsed = False
+    try:
+        for df, end_offset in iter_csv_chunks(task.path, task.start_offset, budget):
+            if _cancel_event.is_set():
+                return
+            chunk = validate_frame(df, task.vehicle_list_id, validation)
+            del df
+            _chunk_queue.put((task.checkpoint_id, chunk, end_offset))
+        parsed = True
+    finally:
+        _chunk_queue.put((task.checkpoint_id, None, (parsed, budget.peak_rss_bytes, validation.rejected)))
+
+
+def run_parallel_ingest(
+    tasks: List[FileTask],
+    write_chunk: Callable[[int, ParsedChunk, int], int],
+    finish_file: Callable[[FileTask, Counter], None],
+    workers: int,
+    stats: IngestStats,
+    cancel: Optional[threading.Event] = None,
+    progress: Optional[Callable[[], None]] = None,
+) -> None:
+    """Parse files in a process pool and write every parsed chunk from this process
+
+    Worker processes only read and normalise CSV chunks. They hand them over through a
+    bounded queue, so at most INGEST_QUEUE_SIZE parsed chunks wait in memory, and the
+    calling process is the single database writer. finish_file is called for every file
+    that was parsed completely, with its rejected rows per reason, and progress after every
+    written chunk. Setting cancel stops the workers at their next chunk and raises
+    IngestCancelled once they have drained.
+    """
+    context = multiprocessing.get_context()
+    chunk_queue = context.Queue(maxsize=INGEST_QUEUE_SIZE)
+    worker_cancel = context.Event()
+    # Parsers and the writer share the memory budget
+    budget_mb = max(INGEST_MEMORY_BUDGET_MB // (workers + 1), 1)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_parser_worker, initargs=(chunk_queue, worker_cancel)) as executor:
+        tasks_by_checkpoint = {task.checkpoint_id: task for task in tasks}
+        futures = [executor.submit(parse_file_worker, task, budget_mb) for task in tasks]
+        pending = len(tasks)
+        while pending:
+            if cancel is not None and cancel.is_set() and not worker_cancel.is_set():
+                # Files not started yet never send an end marker
+                worker_cancel.set()
+                pending -= sum(future.cancel() for future in futures)
+                continue
+
+            try:
+                checkpoint_id, chunk, payload = chunk_queue.get(timeout=1)
+            except queue.Empty:
+                # A crashed worker never sends its end marker
+                if all(future.done() for future in futures):
+                    break
+                continue
+
+            if chunk is None:
+                parsed, peak_rss_bytes, rejected = payload
+                pending -= 1
+                stats.peak_rss_bytes = max(stats.peak_rss_bytes, peak_rss_bytes)
+                if parsed:
+                    finish_file(tasks_by_checkpoint[checkpoint_id], rejected)
+                    stats.files += 1
+                continue
+
+            # Chunks still queued when the run is cancelled are dropped, their checkpoint is not advanced
+            if worker_cancel.is_set():
+                continue
+            stats.rows += write_chunk(checkpoint_id, chunk, payload)
+            stats.rows_rejected += chunk.rows_rejected
+            if progress is not None:
+                progress()
+
+        if worker_cancel.is_set():
+            raise IngestCancelled()
+
+        # Re-raise the first parse failure once the other files are written
+        for future in futures:
+            future.result()
@@ -0,0 +1,126 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from configs import POPULATE_JOB_HISTORY
+from vehicle.ingest import IngestCancelled, IngestStats
+from vehicle.schema import PopulateJobStatus
+from vehicle.service import load_data_from_folder
+
+
+logger = logging.getLogger(__name__)
+
+
+ACTIVE_STATUSES = (PopulateJobStatus.PENDING, PopulateJobStatus.RUNNING)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class PopulateJob:
+    """A populate run executed in the background"""
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: PopulateJobStatus = PopulateJobStatus.PENDING
+    created_at: datetime = field(default_factory=_now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    stats: IngestStats = field(default_factory=IngestStats)
+    errors: List[str] = field(default_factory=list)
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'files_done': self.stats.files,
+            'rows_inserted': self.stats.rows,
+            'rows_per_sec': round(self.stats.rows_per_sec, 1),
+            'seconds': round(self.stats.seconds, 3),
+            'files_rewritten': self.stats.files_rewritten,
+            'rows_rejected': self.stats.rows_rejected,
+            'errors': list(self.errors),
+        }
+
+
+class PopulateJobManager:
+    """Runs populate jobs one at a time on a background thread
+
+    Submitting while a job is pending or running returns that job instead of queueing a
+    second load of the same files.
+    """
+
+    def __init__(self, history: int = POPULATE_JOB_HISTORY):
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, PopulateJob]" = OrderedDict()
+        self._history = history
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='populate')
+
+    def submit(self) -> Tuple[PopulateJob, bool]:
+        """Start a populate job, returns the job and whether it was newly created"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status in ACTIVE_STATUSES:
+                    return job, False
+
+            job = PopulateJob()
+            self._jobs[job.id] = job
+            self._trim()
+        self._executor.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[PopulateJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[PopulateJob]:
+        """Ask a job to stop after its current chunk"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == PopulateJobStatus.PENDING:
+                job.status = PopulateJobStatus.CANCELLED
+                job.finished_at = _now()
+            job.cancel_event.set()
+            return job
+
+    def _trim(self) -> None:
+        """Forget the oldest finished jobs beyond the history size"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in finished[:max(len(finished) - self._history, 0)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: PopulateJob) -> None:
+        if job.cancel_event.is_set():
+            return
+
+        job.status = PopulateJobStatus.RUNNING
+        job.started_at = _now()
+
+        def progress(stats: IngestStats) -> None:
+            job.stats = stats
+
+        try:
+            job.stats = load_data_from_folder(progress=progress, cancel=job.cancel_event)
+            job.status = PopulateJobStatus.COMPLETED
+        except IngestCancelled:
+            job.status = PopulateJobStatus.CANCELLED
+        except Exception as error:
+            logger.exception("Populate job %s failed", job.id)
+            job.errors.append(f"{type(error).__name__}: {error}")
+            job.status = PopulateJobStatus.FAILED
+        finally:
+            job.finished_at = _now()
+
+
+populate_jobs = PopulateJobManager()
@@ -1,14 +1,26 @@
 from datetime import datetime
 
+from sqlalchemy import BigInteger, Column, DateTime, Double, Index
+from sqlalchemy.dialects import mysql
 from sqlmodel import Field
 from database import BaseDataModel
 
 
 class VehicleList(BaseDataModel, table=True):
-    vehicle_id : str
+    vehicle_id : str = Field(index=True, unique=True)
+    # Telemetry rows of the vehicle, kept up to date by ingest in the same transaction as the rows
+    row_count : int = Field(default=0, ge=0)
+    # Bumped with row_count, the ETag and Last-Modified of the vehicle's list pages
+    data_version : int = Field(default=0, ge=0)
+    data_modified_at : datetime | None = Field(default=None)
 
 
 class VehicleData(BaseDataModel, table=True):
+    # Serves the per-vehicle time range scans, counts and keyset pages
+    __table_args__ = (
+        Index('ix_vehicledata_vehicle_list_id_timestamp_id', 'vehicle_list_id', 'timestamp', 'id'),
+    )
+
     timestamp : datetime = Field(index=True)
     speed : int | None = Field(default=None, ge=0)
     odometer : float | None = Field(default=None, ge=0)
@@ -18,3 +30,140 @@ class VehicleData(BaseDataModel, table=True):
 
     # Foreign key to VehicleList
     vehicle_list_id: int = Field(foreign_key="vehiclelist.id")
+
+
+class VehicleDataRollup(BaseDataModel):
+    """Summary of a vehicle's telemetry within the bucket starting at bucket, maintained by ingest
+
+    Each metric keeps the count of its non-empty values with their min, max and sum, and its
+    latest value with the timestamp it was read at.
+    """
+    bucket : datetime
+    rows : int = Field(default=0, ge=0)
+    speed_count : int = Field(default=0, ge=0)
+    speed_min : float | None = Field(default=None)
+    speed_max : float | None = Field(default=None)
+    speed_sum : float = Field(default=0)
+    speed_last : float | None = Field(default=None)
+    speed_last_at : datetime | None = Field(default=None)
+    soc_count : int = Field(default=0, ge=0)
+    soc_min : float | None = Field(default=None)
+    soc_max : float | None = Field(default=None)
+    soc_sum : float = Field(default=0)
+    soc_last : float | None = Field(default=None)
+    soc_last_at : datetime | None = Field(default=None)
+    elevation_count : int = Field(default=0, ge=0)
+    elevation_min : float | None = Field(default=None)
+    elevation_max : float | None = Field(default=None)
+    elevation_sum : float = Field(default=0)
+    elevation_last : float | None = Field(default=None)
+    elevation_last_at : datetime | None = Field(default=None)
+    odometer_count : int = Field(default=0, ge=0)
+    odometer_min : float | None = Field(default=None)
+    odometer_max : float | None = Field(default=None)
+    odometer_sum : float = Field(default=0)
+    odometer_last : float | None = Field(default=None)
+    odometer_last_at : datetime | None = Field(default=None)
+
+    vehicle_list_id: int = Field(foreign_key="vehiclelist.id")
+
+
+class VehicleDataRollupMinute(VehicleDataRollup, table=True):
+    __table_args__ = (
+        Index('ix_vehicledatarollupminute_vehicle_list_id_bucket', 'vehicle_list_id', 'bucket', unique=True),
+    )
+
+
+class VehicleDataRollupHour(VehicleDataRollup, table=True):
+    __table_args__ = (
+        Index('ix_vehicledatarolluphour_vehicle_list_id_bucket', 'vehicle_list_id', 'bucket', unique=True),
+    )
+
+
+class VehicleDataRollupDay(VehicleDataRollup, table=True):
+    __table_args__ = (
+        Index('ix_vehicledatarollupday_vehicle_list_id_bucket', 'vehicle_list_id', 'bucket', unique=True),
+    )
+
+
+class IngestCheckpoint(BaseDataModel, table=True):
+    """Ingest manifest entry of a CSV file
+
+    byte_offset, rows_committed and rows_rejected advance with every committed chunk. The file size, mtime
+    and the hash of its first hashed_bytes bytes are recorded once the file has been read, so
+    unchanged files are skipped from a stat call and rewritten files are told apart from appends.
+    """
+    file_name : str = Field(index=True)
+    # 64 bit so files over 2 GiB do not overflow INTEGER columns
+    byte_offset : int = Field(default=0, ge=0, sa_column=Column(BigInteger, nullable=False, default=0))
+    rows_committed : int = Field(default=0, ge=0)
+    file_size : int | None = Field(default=None, sa_column=Column(BigInteger))
+    # Double precision so a stored st_mtime compares equal to the next stat of the file
+    file_mtime : float | None = Field(default=None, sa_column=Column(Double))
+    content_hash : str | None = Field(default=None)
+    hashed_bytes : int = Field(default=0, ge=0)
+    # Validation state carried across runs and the rows sent to quarantine, kept at the precision
+    # of the parsed rows it is compared with: double odometers and microsecond timestamps
+    rows_rejected : int = Field(default=0, ge=0)
+    max_odometer : float | None = Field(default=None, sa_column=Column(Double))
+    last_timestamp : datetime | None = Field(
+        default=None, sa_column=Column(DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')),
+    )
+
+    # Foreign key to VehicleList
+    vehicle_list_id: int = Field(foreign_key="vehiclelist.id")
+
+
+class VehicleDataQuarantine(BaseDataModel, table=True):
+    """A telemetry row rejected by ingest validation, kept with the reason it was rejected
+
+    checkpoint_id points at the file the row was read from, it is empty for streamed rows.
+    """
+    timestamp : datetime
+    speed : int | None = Field(default=None)
+    odometer : float | None = Field(default=None)
+    soc : int | None = Field(default=None)
+    elevation : int | None = Field(default=None)
+    shift_state : str | None = Field(default=None)
+    reason : str = Field(index=True)
+
+    vehicle_list_id: int = Field(foreign_key="vehiclelist.id")
+    checkpoint_id: int | None = Field(default=None, foreign_key="ingestcheckpoint.id", index=True)
+
+
+class VehicleSegment(BaseDataModel, table=True):
+    """A trip or charging session of a vehicle, derived from its rows and maintained by ingest
+
+    soc_used is soc_start - soc_end, negative for the charge added by a charging session.
+    """
+    __table_args__ = (
+        # Serves the listings of a vehicle's trips or sessions by time
+        Index('ix_vehiclesegment_vehicle_list_id_kind_start', 'vehicle_list_id', 'kind', 'start'),
+        # Serves finding the segments an ingest may extend
+        Index('ix_vehiclesegment_vehicle_list_id_end', 'vehicle_list_id', 'end'),
+    )
+
+    kind : str
+    start : datetime
+    end : datetime
+    rows : int = Field(default=0, ge=0)
+    odometer_start : float | None = Field(default=None)
+    odometer_end : float | None = Field(default=None)
+    distance : float | None = Field(default=None)
+    soc_start : int | None = Field(default=None)
+    soc_end : int | None = Field(default=None)
+    soc_used : int | None = Field(default=None)
+    max_speed : int | None = Field(default=None)
+
+    vehicle_list_id: int = Field(foreign_key="vehiclelist.id")
+
+
+class DatasetVersion(BaseDataModel, table=True):
+    """Change counter of a dataset other than a vehicle's rows, such as the vehicle list
+
+    version is bumped in the transaction changing the dataset, it is the ETag of the responses
+    serving it and modified_at their Last-Modified.
+    """
+    name : str = Field(index=True, unique=True)
+    version : int = Field(default=0, ge=0)
+    modified_at : datetime
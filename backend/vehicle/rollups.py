@@ -0,0 +1,290 @@
+"""Rollups of telemetry per vehicle at minute, hour and day granularity
+
+Each rollup row holds the row count of a bucket and, per metric, the count, min, max and sum of
+its values and its latest value. Ingest folds every chunk into the three rollup tables in the
+transaction that inserts its rows, so aggregate reads of whole buckets never scan the rows.
+Merging a chunk into a stored bucket is an upsert: counts and sums add up, min and max keep
+the extreme and last keeps the value read latest, so chunks can arrive in any order.
+
+    python -m vehicle.rollups                # rebuild the rollups and row counts of every vehicle
+    python -m vehicle.rollups --vehicle-id a # rebuild those of one vehicle
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Connection, and_, case, delete, or_, select
+
+from vehicle.model import (
+    VehicleData,
+    VehicleDataRollup,
+    VehicleDataRollupDay,
+    VehicleDataRollupHour,
+    VehicleDataRollupMinute,
+    VehicleList,
+)
+from vehicle.schema import BucketWidth
+
+
+logger = logging.getLogger(__name__)
+
+METRIC_COLUMNS = ('speed', 'soc', 'elevation', 'odometer')
+
+# Rollup table and bucket length of every width, finest first
+ROLLUPS: Dict[BucketWidth, Type[VehicleDataRollup]] = {
+    BucketWidth.MINUTE: VehicleDataRollupMinute,
+    BucketWidth.HOUR: VehicleDataRollupHour,
+    BucketWidth.DAY: VehicleDataRollupDay,
+}
+BUCKET_SPANS: Dict[BucketWidth, timedelta] = {
+    BucketWidth.MINUTE: timedelta(minutes=1),
+    BucketWidth.HOUR: timedelta(hours=1),
+    BucketWidth.DAY: timedelta(days=1),
+}
+NUMPY_UNITS = {BucketWidth.MINUTE: 'datetime64[m]', BucketWidth.HOUR: 'datetime64[h]', BucketWidth.DAY: 'datetime64[D]'}
+
+# Width of the rollup covering a part of a time range, None for rows, with its bounds
+RangePart = Tuple[Optional[BucketWidth], Optional[datetime], Optional[datetime]]
+
+# Rows read per page when rebuilding
+REBUILD_PAGE_ROWS = 100_000
+
+
+def rollup_for(width: BucketWidth) -> BucketWidth:
+    """Coarsest rollup whose buckets tile buckets of the given width"""
+    span = BUCKET_SPANS[width]
+    return max((rollup for rollup in ROLLUPS if span % BUCKET_SPANS[rollup] == timedelta(0)), key=BUCKET_SPANS.get)
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """A datetime as the naive UTC the rows are stored in, timezone aware values are converted as ingest does"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def floor_bucket(value: datetime, width: BucketWidth) -> datetime:
+    """Start of the bucket holding a datetime"""
+    span = BUCKET_SPANS[width]
+    return datetime.min + (value - datetime.min) // span * span
+
+
+def ceil_bucket(value: datetime, width: BucketWidth) -> datetime:
+    """Start of the first bucket starting at or after a datetime"""
+    floor = floor_bucket(value, width)
+    return floor if floor == value else floor + BUCKET_SPANS[width]
+
+
+def covering_rollups(start: Optional[datetime], end: Optional[datetime],
+                     widths: Sequence[BucketWidth] = tuple(reversed(ROLLUPS))) -> List[RangePart]:
+    """Split start <= timestamp < end into ranges of whole rollup buckets, coarsest first, and of rows
+
+    Each part is (width, start, end) with width None for the rows left at the edges, None bounds
+    are open. Parts are returned in time order.
+    """
+    if not widths:
+        return [(None, start, end)] if start is None or end is None or start < end else []
+    width, finer = widths[0], widths[1:]
+    first = ceil_bucket(start, width) if start is not None else None
+    last = floor_bucket(end, width) if end is not None else None
+    if first is not None and last is not None and first >= last:
+        return covering_rollups(start, end, finer)
+    parts = covering_rollups(start, first, finer) if start is not None and start < first else []
+    parts.append((width, first, last))
+    if end is not None and last < end:
+        parts += covering_rollups(last, end, finer)
+    return parts
+
+
+def _finest(timestamps: np.ndarray, metrics: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Minute rollups of rows, indexed by bucket start"""
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = timestamps[order].astype('datetime64[us]')
+    frame = pd.DataFrame({'at': timestamps})
+    for name in METRIC_COLUMNS:
+        frame[name] = np.asarray(metrics[name], dtype=np.float64)[order]
+        frame[f'{name}_at'] = frame['at'].where(frame[name].notna())
+    grouped = frame.groupby(timestamps.astype(NUMPY_UNITS[BucketWidth.MINUTE]), sort=True)
+
+    rollups = pd.DataFrame({'rows': grouped.size()})
+    for name in METRIC_COLUMNS:
+        values = grouped[name]
+        rollups[f'{name}_count'] = values.count()
+        rollups[f'{name}_min'] = values.min()
+        rollups[f'{name}_max'] = values.max()
+        rollups[f'{name}_sum'] = values.sum()
+        # Rows are in time order, the last value of a bucket is its latest
+        rollups[f'{name}_last'] = values.last()
+        rollups[f'{name}_last_at'] = grouped[f'{name}_at'].max()
+    return rollups
+
+
+def _coarsen(rollups: pd.DataFrame, width: BucketWidth) -> pd.DataFrame:
+    """Rollups of a wider bucket from those of the finer buckets it contains, in time order"""
+    grouped = rollups.groupby(rollups.index.to_numpy().astype(NUMPY_UNITS[width]), sort=True)
+    coarse = pd.DataFrame({'rows': grouped['rows'].sum()})
+    for name in METRIC_COLUMNS:
+        coarse[f'{name}_count'] = grouped[f'{name}_count'].sum()
+        coarse[f'{name}_min'] = grouped[f'{name}_min'].min()
+        coarse[f'{name}_max'] = grouped[f'{name}_max'].max()
+        coarse[f'{name}_sum'] = grouped[f'{name}_sum'].sum()
+        coarse[f'{name}_last'] = grouped[f'{name}_last'].last()
+        coarse[f'{name}_last_at'] = grouped[f'{name}_last_at'].max()
+    return coarse
+
+
+def _records(rollups: pd.DataFrame) -> List[dict]:
+    """Insert ready rows with plain python values, NaN and NaT as None"""
+    columns = {'bucket': rollups.index.to_numpy().astype('datetime64[us]').tolist()}
+    for name, values in rollups.items():
+        if name.endswith('_at'):
+            columns[name] = values.to_numpy(dtype='datetime64[us]').tolist()
+        elif name == 'rows' or name.endswith('_count'):
+            columns[name] = values.to_numpy(dtype=np.int64).tolist()
+        else:
+            columns[name] = [None if value != value else value for value in values.to_numpy(dtype=np.float64).tolist()]
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def chunk_rollups(timestamps: np.ndarray, metrics: Dict[str, np.ndarray]) -> Dict[BucketWidth, List[dict]]:
+    """Rollup rows of every width for a set of rows, metrics hold floats with NaN where missing"""
+    if not len(timestamps):
+        return {width: [] for width in ROLLUPS}
+    minutes = _finest(np.asarray(timestamps), metrics)
+    return {
+        BucketWidth.MINUTE: _records(minutes),
+        BucketWidth.HOUR: _records(_coarsen(minutes, BucketWidth.HOUR)),
+        BucketWidth.DAY: _records(_coarsen(minutes, BucketWidth.DAY)),
+    }
+
+
+def columns_rollups(columns: Dict[str, list]) -> Dict[BucketWidth, List[dict]]:
+    """chunk_rollups of insert ready column lists"""
+    return chunk_rollups(
+        np.array(columns['timestamp'], dtype='datetime64[us]'),
+        {name: np.array(columns[name], dtype=np.float64) for name in METRIC_COLUMNS},
+    )
+
+
+def _merge_min(current, incoming, name: str):
+    return case(
+        (incoming[name].is_(None), current[name]),
+        (or_(current[name].is_(None), incoming[name] < current[name]), incoming[name]),
+        else_=current[name],
+    )
+
+
+def _merge_max(current, incoming, name: str):
+    return case(
+        (incoming[name].is_(None), current[name]),
+        (or_(current[name].is_(None), incoming[name] > current[name]), incoming[name]),
+        else_=current[name],
+    )
+
+
+def _merge_last(current, incoming, name: str, at: str):
+    """Incoming value when it was read at or after the stored one, a later insert wins a tie"""
+    return case(
+        (and_(incoming[at].is_not(None), or_(current[at].is_(None), incoming[at] >= current[at])), incoming[name]),
+        else_=current[name],
+    )
+
+
+def _merge_rules() -> dict:
+    rules = {'rows': lambda current, incoming: current.rows + incoming.rows}
+    for metric in METRIC_COLUMNS:
+        for column in (f'{metric}_count', f'{metric}_sum'):
+            rules[column] = lambda current, incoming, column=column: current[column] + incoming[column]
+        rules[f'{metric}_min'] = lambda current, incoming, column=f'{metric}_min': _merge_min(current, incoming, column)
+        rules[f'{metric}_max'] = lambda current, incoming, column=f'{metric}_max': _merge_max(current, incoming, column)
+        # Both read the stored _last_at, MySQL assigns _last before _last_at in model order
+        rules[f'{metric}_last'] = lambda current, incoming, metric=metric: _merge_last(
+            current, incoming, f'{metric}_last', f'{metric}_last_at')
+        rules[f'{metric}_last_at'] = lambda current, incoming, metric=metric: _merge_last(
+            current, incoming, f'{metric}_last_at', f'{metric}_last_at')
+    return rules
+
+
+MERGE_RULES = _merge_rules()
+UPDATE_COLUMNS = [
+    column.name for column in VehicleDataRollupMinute.__table__.columns
+    if column.name not in ('id', 'vehicle_list_id', 'bucket')
+]
+
+
+def record_rollups(connection: Connection, vehicle_list_id: int, rollups: Dict[BucketWidth, List[dict]]) -> None:
+    """Merge the rollups of inserted rows into the stored ones, in the inserting transaction"""
+    for width, model in ROLLUPS.items():
+        records = rollups.get(width)
+        if not records:
+            continue
+        # Buckets in time order so concurrent writers lock them in the same order
+        model.bulk_upsert(
+            [dict(record, vehicle_list_id=vehicle_list_id) for record in records],
+            update_columns=UPDATE_COLUMNS,
+            conflict_columns=['vehicle_list_id', 'bucket'],
+            merge=MERGE_RULES,
+            connection=connection,
+        )
+
+
+def rebuild_rollups(connection: Connection, vehicle_list_ids: Optional[Iterable[int]] = None,
+                    page_rows: int = REBUILD_PAGE_ROWS) -> int:
+    """Regenerate the rollups of some or every vehicle from their rows, returns the rows read"""
+    data = VehicleData.__table__
+    vehicle_list_ids = None if vehicle_list_ids is None else list(vehicle_list_ids)
+    for model in ROLLUPS.values():
+        statement = delete(model.__table__)
+        if vehicle_list_ids is not None:
+            statement = statement.where(model.__table__.c.vehicle_list_id.in_(vehicle_list_ids))
+        connection.execute(statement)
+
+    # Keyset pages by id, rows of a vehicle arriving on a later page merge like a later chunk
+    columns = [data.c.id, data.c.vehicle_list_id, data.c.timestamp] + [data.c[name] for name in METRIC_COLUMNS]
+    last_id, rows_read = 0, 0
+    while True:
+        statement = select(*columns).where(data.c.id > last_id)
+        if vehicle_list_ids is not None:
+            statement = statement.where(data.c.vehicle_list_id.in_(vehicle_list_ids))
+        page = connection.execute(statement.order_by(data.c.id).limit(page_rows)).all()
+        if not page:
+            return rows_read
+        frame = pd.DataFrame([tuple(row) for row in page], columns=[column.name for column in columns])
+        for vehicle_list_id, rows in frame.groupby('vehicle_list_id', sort=True):
+            record_rollups(connection, int(vehicle_list_id), chunk_rollups(
+                rows['timestamp'].to_numpy(dtype='datetime64[us]'),
+                {name: rows[name].to_numpy(dtype=np.float64, na_value=np.nan) for name in METRIC_COLUMNS},
+            ))
+        last_id = int(frame['id'].iloc[-1])
+        rows_read += len(page)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the telemetry rollups and row counts from the stored rows")
+    parser.add_argument('--vehicle-id', action='append', help='vehicle to rebuild, repeat for several, every vehicle by default')
+    args = parser.parse_args()
+
+    from database import engine
+    from vehicle.counts import count_cache, rebuild_row_counts
+    from vehicle.ingest import ingest_lock
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    with ingest_lock(), engine.begin() as connection:
+        vehicle_list_ids = None
+        if args.vehicle_id:
+            vehicles = VehicleList.__table__
+            vehicle_list_ids = connection.execute(
+                select(vehicles.c.id).where(vehicles.c.vehicle_id.in_(args.vehicle_id))
+            ).scalars().all()
+        rows = rebuild_rollups(connection, vehicle_list_ids)
+        rebuild_row_counts(connection, vehicle_list_ids)
+    count_cache.clear()
+    logger.info("Rebuilt the rollups from %s rows", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,185 @@
 from typing import Annotated, Any, List
-from fastapi import APIRouter, HTTPException, Query, status
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, status
 from fastapi.responses import FileResponse
-from sqlmodel import select
 
-from database import SessionDep
-from vehicle.model import VehicleList
-from vehicle.schema import FilterExportTypes, FilterVehicles, VehicleDataSchema, VehicleListOutputSchema
-from vehicle.service import export_data, get_a_vehicle, get_all_vehicle_ids, get_vehicle_list, load_data_from_folder
+from database import AsyncSessionDep, SessionDep
+from vehicle import async_service
+from vehicle.aggregate import TooManyBuckets, aggregate_metrics, aggregate_vehicle_data
+from vehicle.arrow import ARROW_STREAM, NotAcceptable, wants_arrow
+from vehicle.batch import get_vehicle_batch
+from vehicle.ingest import StreamIngestError
+from vehicle.jobs import populate_jobs
+from vehicle.cache import vehicle_id_cache
+from vehicle.counts import count_cache
+from vehicle.downsample import downsample_vehicle_data
+from vehicle.segments import list_segments
+from vehicle.versions import VEHICLE_LIST, not_modified, version_headers
+from vehicle.schema import (
+    AggregateOutputSchema,
+    BatchOutputSchema,
+    CachesSchema,
+    DownsampleOutputSchema,
+    FileQualitySchema,
+    FilterAggregate,
+    FilterBatch,
+    FilterDownsample,
+    FilterExportTypes,
+    FilterSegments,
+    FilterVehicles,
+    PopulateJobSchema,
+    SegmentListSchema,
+    StreamFormat,
+    StreamIngestSchema,
+    VehicleDataSchema,
+    VehicleListOutputSchema,
+)
+from vehicle.async_service import (
+    export_data,
+    export_data_arrow,
+    get_a_vehicle,
+    get_all_vehicle_ids,
+    get_dataset_version,
+    get_vehicle_data_version,
+    get_vehicle_list,
+    get_vehicle_list_arrow,
+)
+from vehicle.service import (
+    InvalidCursor,
+    get_quality_reports,
+    get_vehicle_record_id,
+    get_vehicle_record_ids,
+    ingest_stream,
+)
 
 
 # Create router with prefix for all vehicle_data routes
 router = APIRouter(prefix="/vehicle_data", tags=["vehicle_data"])
 
 
-@router.post('/populate', status_code=status.HTTP_201_CREATED)
+@router.post(
+        '/populate',
+        response_model=PopulateJobSchema,
+        status_code=status.HTTP_202_ACCEPTED,
+        responses={
+               202: {"description": "Populate job started, or the job already running"}
+           },
+        )
 def populate_data() -> Any:
-    """Populate data to databse from files"""
-    load_data_from_folder()
+    """Start a background job that populates data to databse from files"""
+    job, _ = populate_jobs.submit()
+    return job.as_dict()
+
+
+@router.get(
+        '/populate/{job_id}',
+        response_model=PopulateJobSchema,
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "Populate job progress"},
+               404: {"description": "Populate job not found"}
+           },
+        )
+def get_populate_job(job_id: str) -> Any:
+    """Get the progress of a populate job"""
+    job = populate_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Populate job not found")
+    return job.as_dict()
+
+
+@router.delete(
+        '/populate/{job_id}',
+        response_model=PopulateJobSchema,
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "Populate job cancellation requested"},
+               404: {"description": "Populate job not found"}
+           },
+        )
+def cancel_populate_job(job_id: str) -> Any:
+    """Cancel a populate job, it stops after the chunk being written"""
+    job = populate_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Populate job not found")
+    return job.as_dict()
+
+
+@router.get(
+        '/quality',
+        response_model=List[FileQualitySchema],
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "Committed and quarantined rows of every loaded file"}
+           },
+        )
+def get_quality_report(session: SessionDep) -> Any:
+    """Get the ingest quality report of every loaded file"""
+    return get_quality_reports(session)
+
+
+@router.get(
+        '/cache',
+        response_model=CachesSchema,
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "Size, hits and misses of the in-process caches"}
+           },
+        )
+def get_cache_stats() -> Any:
+    """Get the stats of this process's vehicle id and row count caches"""
+    return {'vehicle_ids': vehicle_id_cache.stats(), 'row_counts': count_cache.stats()}
+
+
+@router.post(
+        '/batch',
+        response_model=BatchOutputSchema,
+        response_model_exclude_unset=True,
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "Latest rows and summary of every known vehicle, unknown ones listed as missing"}
+           },
+        )
+def get_vehicle_data_batch(filter_batch: FilterBatch, session: SessionDep) -> Any:
+    """Get the latest rows and a summary of many vehicles over one time range"""
+    vehicle_record_ids = get_vehicle_record_ids(filter_batch.vehicle_ids, session)
+    return get_vehicle_batch(filter_batch, vehicle_record_ids, session)
+
+
+STREAM_MEDIA_TYPES = {
+    'text/csv': StreamFormat.CSV,
+    'application/x-ndjson': StreamFormat.NDJSON,
+    'application/ndjson': StreamFormat.NDJSON,
+    'application/jsonl': StreamFormat.NDJSON,
+}
+
+
+@router.post(
+        '/{vehicle_id}/ingest',
+        response_model=StreamIngestSchema,
+        status_code=status.HTTP_201_CREATED,
+        responses={
+               201: {"description": "Streamed rows ingested"},
+               400: {"description": "Body could not be parsed, earlier micro-batches stay committed"},
+               415: {"description": "Body is neither CSV nor NDJSON"}
+           },
+        )
+async def ingest_vehicle_data(vehicle_id: str, request: Request) -> Any:
+    """Ingest a streamed CSV or NDJSON body for a vehicle, creating the vehicle on first sight"""
+    media_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    stream_format = STREAM_MEDIA_TYPES.get(media_type)
+    if stream_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type must be one of: {', '.join(STREAM_MEDIA_TYPES)}",
+        )
+
+    try:
+        return await ingest_stream(vehicle_id, request.stream(), stream_format)
+    except StreamIngestError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{error} ({error.rows_committed} rows were committed before the error)",
+        )
 
 
 @router.get(
@@ -28,30 +191,62 @@ def populate_data() -> Any:
                404: {"description": "Vehicle record not found"}
            },
         )
-async def get_a_vehicle_data(id: int, session: SessionDep) -> Any:
+async def get_a_vehicle_data(id: int, session: AsyncSessionDep) -> Any:
     """Get a vehicle data by ID"""
-    data = get_a_vehicle(id, session)
+    data = await get_a_vehicle(id, session)
     if not data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vehicle record not found")
     return data
 
 
+def negotiate_arrow(accept: str | None) -> bool:
+    """Whether to answer with an Arrow stream, 406 when only Arrow is accepted and cannot be written"""
+    try:
+        return wants_arrow(accept)
+    except NotAcceptable as error:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(error))
+
+
 @router.get(
         '/',
         response_model=VehicleListOutputSchema, 
         status_code=status.HTTP_200_OK,
+        responses={
+               200: {
+                   "description": "A page of the vehicle's rows, as an Arrow stream when the Accept header asks for it",
+                   "content": {ARROW_STREAM: {}},
+               },
+               304: {"description": "The vehicle's data did not change since the ETag or date sent"},
+               404: {"description": "Selected Vehicle ID not found"},
+               406: {"description": "Only Arrow is accepted and the server cannot write it"}
+           },
         )
-async def get_vehicle_data_list(filter_vehicles: Annotated[FilterVehicles, Query()], session: SessionDep) -> Any:
-    """Get vehicle data list"""
+async def get_vehicle_data_list(filter_vehicles: Annotated[FilterVehicles, Query()], session: AsyncSessionDep,
+                                accept: Annotated[str | None, Header()] = None,
+                                if_none_match: Annotated[str | None, Header()] = None,
+                                if_modified_since: Annotated[str | None, Header()] = None) -> Any:
+    """Get vehicle data list, 304 while the vehicle's data version matches If-None-Match"""
+    arrow = negotiate_arrow(accept)
     
-    statement = select(VehicleList).where(VehicleList.vehicle_id == filter_vehicles.vehicle_id)
-    results = session.exec(statement).first()
-
-    if not results:
+    vehicle_record_id = await async_service.get_vehicle_record_id(filter_vehicles.vehicle_id, session)
+    if vehicle_record_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Selected Vehicle ID not found")
+
+    # Only VehicleList is read before answering 304
+    version, modified_at = await get_vehicle_data_version(vehicle_record_id, session)
+    headers = version_headers(version, modified_at, filter_vehicles.model_dump_json(), accept)
+    if not_modified(headers, if_none_match, if_modified_since):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
     
-    vehicle_record_id = results.id
-    data = get_vehicle_list(filter_vehicles, vehicle_record_id, session)
+    try:
+        if arrow:
+            data = await get_vehicle_list_arrow(
+                filter_vehicles, vehicle_record_id, session, headers=headers, data_version=version,
+            )
+        else:
+            data = await get_vehicle_list(filter_vehicles, vehicle_record_id, session, headers=headers, data_version=version)
+    except InvalidCursor as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
 
     return data
     
@@ -62,21 +257,95 @@ async def get_vehicle_data_list(filter_vehicles: Annotated[FilterVehicles, Query
         response_class=FileResponse,
            status_code=status.HTTP_200_OK,
            responses={
-               200: {"description": "Vehicle data exported successfully as file"},
-               404: {"description": "Selected Vehicle ID not found"}
+               200: {
+                   "description": "Vehicle data exported successfully as file, or as an Arrow stream when the Accept header asks for it",
+                   "content": {ARROW_STREAM: {}},
+               },
+               404: {"description": "Selected Vehicle ID not found"},
+               406: {"description": "Only Arrow is accepted and the server cannot write it"}
            }
         )
-async def export_vehicle_data(export_filter: Annotated[FilterExportTypes, Query()], session: SessionDep) -> Any:
+async def export_vehicle_data(export_filter: Annotated[FilterExportTypes, Query()], session: AsyncSessionDep,
+                              accept: Annotated[str | None, Header()] = None) -> Any:
     """Export vehicle data to different formats"""
+    arrow = negotiate_arrow(accept)
     
-    statement = select(VehicleList).where(VehicleList.vehicle_id == export_filter.vehicle_id)
-    results = session.exec(statement).first()
-
-    if not results:
+    vehicle_record_id = await async_service.get_vehicle_record_id(export_filter.vehicle_id, session)
+    if vehicle_record_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Selected Vehicle ID not found")
     
-    vehicle_record_id = results.id
-    return export_data(export_filter, vehicle_record_id, session)
+    if arrow:
+        return await export_data_arrow(export_filter, vehicle_record_id, session)
+    return await export_data(export_filter, vehicle_record_id, session)
+
+
+@router.get(
+        '/{vehicle_id}/aggregate',
+        response_model=AggregateOutputSchema,
+        response_model_exclude_unset=True,
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "One row per time bucket with the requested metrics"},
+               400: {"description": "The range spans too many buckets"},
+               404: {"description": "Selected Vehicle ID not found"}
+           },
+        )
+def get_vehicle_data_aggregate(vehicle_id: str, filter_aggregate: Annotated[FilterAggregate, Query()], session: SessionDep) -> Any:
+    """Get per bucket summaries of a vehicle's telemetry for charts"""
+    vehicle_record_id = get_vehicle_record_id(vehicle_id, session)
+    if vehicle_record_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Selected Vehicle ID not found")
+
+    try:
+        data = aggregate_vehicle_data(filter_aggregate, vehicle_record_id, session)
+    except TooManyBuckets as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
+    return {
+        'vehicle_id': vehicle_id,
+        'bucket': filter_aggregate.bucket,
+        'metrics': aggregate_metrics(filter_aggregate),
+        'data': data,
+    }
+
+
+@router.get(
+        '/{vehicle_id}/downsample',
+        response_model=DownsampleOutputSchema,
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "Metric reduced to the requested number of points"},
+               404: {"description": "Selected Vehicle ID not found"}
+           },
+        )
+def get_vehicle_data_downsample(vehicle_id: str, filter_downsample: Annotated[FilterDownsample, Query()], session: SessionDep) -> Any:
+    """Get a metric of a vehicle downsampled for plotting long time ranges"""
+    vehicle_record_id = get_vehicle_record_id(vehicle_id, session)
+    if vehicle_record_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Selected Vehicle ID not found")
+
+    return {'vehicle_id': vehicle_id, **downsample_vehicle_data(filter_downsample, vehicle_record_id, session)}
+
+
+@router.get(
+        '/{vehicle_id}/segments',
+        response_model=SegmentListSchema,
+        status_code=status.HTTP_200_OK,
+        responses={
+               200: {"description": "Trips or charging sessions of the vehicle by start time"},
+               404: {"description": "Selected Vehicle ID not found"}
+           },
+        )
+def get_vehicle_segments(vehicle_id: str, filter_segments: Annotated[FilterSegments, Query()], session: SessionDep) -> Any:
+    """Get the trips or charging sessions of a vehicle"""
+    vehicle_record_id = get_vehicle_record_id(vehicle_id, session)
+    if vehicle_record_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Selected Vehicle ID not found")
+
+    return {
+        'vehicle_id': vehicle_id,
+        'kind': filter_segments.kind,
+        'data': list_segments(filter_segments, vehicle_record_id, session),
+    }
 
 
 @router.get(
@@ -84,10 +353,18 @@ async def export_vehicle_data(export_filter: Annotated[FilterExportTypes, Query(
         response_model=List, 
         status_code=status.HTTP_200_OK,
         responses={
-               200: {"description": "Vehicle IDs retrieved successfully"}
+               200: {"description": "Vehicle IDs retrieved successfully"},
+               304: {"description": "No vehicle was added since the ETag or date sent"}
         },
         )
-async def get_vehicle_ids(session: SessionDep) -> Any:
-    """Get all vehicle IDs from the VehicleList table"""
-    vehicle_records = get_all_vehicle_ids(session)
+async def get_vehicle_ids(response: Response, session: AsyncSessionDep,
+                          if_none_match: Annotated[str | None, Header()] = None,
+                          if_modified_since: Annotated[str | None, Header()] = None) -> Any:
+    """Get all vehicle IDs from the VehicleList table, 304 while the vehicle list version matches If-None-Match"""
+    headers = version_headers(*await get_dataset_version(VEHICLE_LIST, session))
+    if not_modified(headers, if_none_match, if_modified_since):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    vehicle_records = await get_all_vehicle_ids(session)
+    response.headers.update(headers)
     return [record.vehicle_id for record in vehicle_records]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List
+from typing import Dict, List
 from pydantic import BaseModel, Field
 from enum import Enum
 
@@ -8,14 +8,29 @@ class VehicleDataSchema(BaseModel):
     id : int
     timestamp: datetime
     speed: int | None
-    odometer: float
-    soc: int 
-    elevation: int
+    odometer: float | None
+    soc: int | None
+    elevation: int | None
     shift_state: str | None
 
 class VehicleListOutputSchema(BaseModel):
     data : List[VehicleDataSchema]
     count : int
+    next_cursor : str | None = None
+    prev_cursor : str | None = None
+
+class VehicleDataField(str, Enum):
+    ID = "id"
+    TIMESTAMP = "timestamp"
+    SPEED = "speed"
+    ODOMETER = "odometer"
+    SOC = "soc"
+    ELEVATION = "elevation"
+    SHIFT_STATE = "shift_state"
+
+class CursorDirection(str, Enum):
+    NEXT = "next"
+    PREV = "prev"
 
 class FilterVehicles(BaseModel):
     vehicle_id: str = Field(min_length=1)
@@ -23,6 +38,8 @@ class FilterVehicles(BaseModel):
     final: datetime | None = None
     page: int = Field(0, ge=0)
     limit: int = Field(10, ge=0, le=20)
+    cursor: str | None = Field(None, description="next_cursor or prev_cursor of a previous page, takes precedence over page")
+    fields: List[VehicleDataField] | None = Field(None, description="Columns of each row, repeat the parameter for several, all when omitted")
 
 class ExportTypes(str, Enum):
     JSON = "JSON"
@@ -31,4 +48,203 @@ class ExportTypes(str, Enum):
 
 class FilterExportTypes(BaseModel):
     vehicle_id: str = Field(min_length=1)
-    export_type: ExportTypes = Field(description="Choose one of: JSON, CSV, EXCEL")
\ No newline at end of file
+    export_type: ExportTypes = Field(description="Choose one of: JSON, CSV, EXCEL")
+    fields: List[VehicleDataField] | None = Field(None, description="Columns to export, repeat the parameter for several, all when omitted")
+
+class PopulateJobStatus(str, Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+class PopulateJobSchema(BaseModel):
+    id: str
+    status: PopulateJobStatus
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+    files_done: int
+    rows_inserted: int
+    rows_per_sec: float
+    seconds: float
+    files_rewritten: int
+    rows_rejected: int
+    errors: List[str]
+
+class RejectReason(str, Enum):
+    NEGATIVE_SPEED = "NEGATIVE_SPEED"
+    NEGATIVE_ODOMETER = "NEGATIVE_ODOMETER"
+    SOC_OUT_OF_RANGE = "SOC_OUT_OF_RANGE"
+    DUPLICATE_TIMESTAMP = "DUPLICATE_TIMESTAMP"
+    ODOMETER_BACKWARDS = "ODOMETER_BACKWARDS"
+
+class FileQualitySchema(BaseModel):
+    file_name: str
+    rows_committed: int
+    rows_rejected: int
+    rejected_by_reason: Dict[RejectReason, int]
+
+class StreamFormat(str, Enum):
+    CSV = "CSV"
+    NDJSON = "NDJSON"
+
+class StreamIngestSchema(BaseModel):
+    vehicle_id: str
+    rows: int
+    rows_rejected: int
+    batches: int
+    seconds: float
+    rows_per_sec: float
+
+class CacheStatsSchema(BaseModel):
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+
+class CachesSchema(BaseModel):
+    vehicle_ids: CacheStatsSchema
+    row_counts: CacheStatsSchema
+
+class BucketWidth(str, Enum):
+    MINUTE = "1m"
+    HOUR = "1h"
+    DAY = "1d"
+
+class AggregateMetric(str, Enum):
+    AVG_SPEED = "avg_speed"
+    MIN_SPEED = "min_speed"
+    MAX_SPEED = "max_speed"
+    AVG_SOC = "avg_soc"
+    MIN_SOC = "min_soc"
+    MAX_SOC = "max_soc"
+    AVG_ELEVATION = "avg_elevation"
+    MIN_ELEVATION = "min_elevation"
+    MAX_ELEVATION = "max_elevation"
+    LAST_ODOMETER = "last_odometer"
+
+class FilterAggregate(BaseModel):
+    bucket: BucketWidth = Field(BucketWidth.HOUR, description="Bucket width, one of: 1m, 1h, 1d")
+    initial: datetime | None = None
+    final: datetime | None = None
+    metrics: List[AggregateMetric] = Field(
+        default=[AggregateMetric.AVG_SPEED, AggregateMetric.MIN_SOC, AggregateMetric.MAX_SOC, AggregateMetric.LAST_ODOMETER],
+        description="Metrics computed per bucket, repeat the parameter for several",
+    )
+    fields: List[VehicleDataField] | None = Field(None, description="Keep only the metrics of these columns, all when omitted")
+
+class AggregateBucketSchema(BaseModel):
+    bucket: datetime
+    rows: int
+    avg_speed: float | None = None
+    min_speed: int | None = None
+    max_speed: int | None = None
+    avg_soc: float | None = None
+    min_soc: int | None = None
+    max_soc: int | None = None
+    avg_elevation: float | None = None
+    min_elevation: int | None = None
+    max_elevation: int | None = None
+    last_odometer: float | None = None
+
+class AggregateOutputSchema(BaseModel):
+    vehicle_id: str
+    bucket: BucketWidth
+    metrics: List[AggregateMetric]
+    data: List[AggregateBucketSchema]
+
+class DownsampleMetric(str, Enum):
+    SPEED = "speed"
+    SOC = "soc"
+    ELEVATION = "elevation"
+    ODOMETER = "odometer"
+
+class DownsampleAlgorithm(str, Enum):
+    LTTB = "lttb"
+    MINMAX = "minmax"
+
+class FilterDownsample(BaseModel):
+    metric: DownsampleMetric = Field(description="Column to plot, one of: speed, soc, elevation, odometer")
+    algorithm: DownsampleAlgorithm = Field(DownsampleAlgorithm.LTTB, description="lttb (Largest-Triangle-Three-Buckets) or minmax per time bucket")
+    points: int = Field(2000, ge=3, le=20000, description="Points to return at most")
+    initial: datetime | None = None
+    final: datetime | None = None
+
+class DownsamplePointSchema(BaseModel):
+    timestamp: datetime
+    value: float
+
+class DownsampleOutputSchema(BaseModel):
+    vehicle_id: str
+    metric: DownsampleMetric
+    algorithm: DownsampleAlgorithm
+    points_requested: int
+    points: int
+    rows_scanned: int
+    data: List[DownsamplePointSchema]
+
+class FilterBatch(BaseModel):
+    vehicle_ids: List[str] = Field(min_length=1, max_length=500, description="Vehicles to fetch, at most 500")
+    initial: datetime | None = None
+    final: datetime | None = None
+    latest: int = Field(10, ge=0, le=100, description="Latest rows returned per vehicle, 0 for none")
+    summary: bool = Field(True, description="Return the row count and metrics of each vehicle over the range")
+    metrics: List[AggregateMetric] = Field(
+        default=[AggregateMetric.AVG_SPEED, AggregateMetric.MIN_SOC, AggregateMetric.MAX_SOC, AggregateMetric.LAST_ODOMETER],
+        description="Metrics of the summary",
+    )
+
+class BatchSummarySchema(BaseModel):
+    rows: int
+    avg_speed: float | None = None
+    min_speed: int | None = None
+    max_speed: int | None = None
+    avg_soc: float | None = None
+    min_soc: int | None = None
+    max_soc: int | None = None
+    avg_elevation: float | None = None
+    min_elevation: int | None = None
+    max_elevation: int | None = None
+    last_odometer: float | None = None
+
+class BatchVehicleSchema(BaseModel):
+    vehicle_id: str
+    summary: BatchSummarySchema | None = None
+    data: List[VehicleDataSchema]
+
+class BatchOutputSchema(BaseModel):
+    vehicles: List[BatchVehicleSchema]
+    missing: List[str]
+
+class SegmentKind(str, Enum):
+    TRIP = "trip"
+    CHARGE = "charge"
+
+class FilterSegments(BaseModel):
+    kind: SegmentKind = Field(SegmentKind.TRIP, description="trip or charge")
+    initial: datetime | None = Field(None, description="Segments starting at or after")
+    final: datetime | None = Field(None, description="Segments starting at or before")
+    limit: int = Field(100, ge=1, le=1000)
+
+class SegmentSchema(BaseModel):
+    id: int
+    kind: SegmentKind
+    start: datetime
+    end: datetime
+    rows: int
+    odometer_start: float | None
+    odometer_end: float | None
+    distance: float | None
+    soc_start: int | None
+    soc_end: int | None
+    soc_used: int | None
+    max_speed: int | None
+
+class SegmentListSchema(BaseModel):
+    vehicle_id: str
+    kind: SegmentKind
+    data: List[SegmentSchema]
@@ -0,0 +1,288 @@
+"""Trips and charging sessions segmented from the telemetry stream of each vehicle
+
+A row is moving when the vehicle is in drive or reverse or reports a speed. The rows of a
+vehicle in time order split into runs wherever moving changes or two rows are more than
+SEGMENT_GAP_SECONDS apart. Every moving run is a trip. Within a parked run, consecutive rows
+where SOC rises form a charging session, starting at the reading before the first rise and
+ending at the last rise, split where SOC drops or rises are a gap apart.
+
+The whole stream is segmented in one vectorised pass. Ingest re-segments a vehicle from the
+start of the first segment new rows may extend, or a gap before them, in the transaction that
+inserts them: a row more than a gap before every new row cannot share a run with them. Rows
+appended after an open trip are segmented from its last row and the trip is extended, so a long
+trip is not read again on every chunk.
+
+    python -m vehicle.segments                # rebuild the segments of every vehicle
+    python -m vehicle.segments --vehicle-id a # rebuild those of one vehicle
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import Connection, delete
+from sqlmodel import Session, select
+
+from configs import SEGMENT_GAP_SECONDS, SEGMENT_SCAN_ROWS
+from vehicle.aggregate import epoch_seconds
+from vehicle.model import VehicleData, VehicleList, VehicleSegment
+from vehicle.schema import FilterSegments, SegmentKind
+
+
+logger = logging.getLogger(__name__)
+
+DRIVING_STATES = ('D', 'R')
+
+# Rows segmented per step when rebuilding
+REBUILD_PAGE_ROWS = 200_000
+
+
+def _first_valid(valid: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Index of the first valid row of every run, -1 for runs without one"""
+    positions = np.where(valid, np.arange(len(valid)), len(valid))
+    first = np.minimum.reduceat(positions, starts)
+    return np.where(first <= ends, first, -1)
+
+
+def _last_valid(valid: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Index of the last valid row of every run, -1 for runs without one"""
+    positions = np.where(valid, np.arange(len(valid)), -1)
+    last = np.maximum.reduceat(positions, starts)
+    return np.where(last >= starts, last, -1)
+
+
+def _pick(values: np.ndarray, positions: np.ndarray) -> list:
+    """Values at positions as python numbers, None at -1 and at missing values"""
+    picked = np.where(positions >= 0, values[np.maximum(positions, 0)], np.nan)
+    return [None if value != value else value for value in picked.tolist()]
+
+
+def _finish(record: dict) -> dict:
+    """Fill the distance and SOC used of a segment, numbers as the types of the model"""
+    record['distance'] = (
+        None if record['odometer_start'] is None or record['odometer_end'] is None
+        else record['odometer_end'] - record['odometer_start']
+    )
+    for name in ('soc_start', 'soc_end', 'max_speed'):
+        if record[name] is not None:
+            record[name] = int(record[name])
+    record['soc_used'] = (
+        None if record['soc_start'] is None or record['soc_end'] is None else record['soc_start'] - record['soc_end']
+    )
+    return record
+
+
+def _continue_trip(stored: dict, continued: dict) -> dict:
+    """A stored trip extended by the trip segmented from its last row on"""
+    def first(name):
+        return stored[name] if stored[name] is not None else continued[name]
+
+    def last(name):
+        return continued[name] if continued[name] is not None else stored[name]
+
+    speeds = [speed for speed in (stored['max_speed'], continued['max_speed']) if speed is not None]
+    return _finish({
+        'kind': stored['kind'],
+        'start': stored['start'],
+        'end': continued['end'],
+        # The last row of the stored trip is the first of the continued one
+        'rows': stored['rows'] + continued['rows'] - 1,
+        'odometer_start': first('odometer_start'),
+        'odometer_end': last('odometer_end'),
+        'soc_start': first('soc_start'),
+        'soc_end': last('soc_end'),
+        'max_speed': max(speeds) if speeds else None,
+    })
+
+
+def segment_rows(timestamps: np.ndarray, speed: np.ndarray, soc: np.ndarray, odometer: np.ndarray,
+                 shift_state: np.ndarray, gap: timedelta = timedelta(seconds=SEGMENT_GAP_SECONDS)) -> List[dict]:
+    """Trips and charging sessions of rows in time order, numbers as floats with NaN where missing"""
+    n = len(timestamps)
+    if not n:
+        return []
+    times = timestamps.astype('datetime64[us]')
+    elapsed = np.diff(times.astype(np.int64))
+    gap_us = gap // timedelta(microseconds=1)
+    moving = np.isin(shift_state, DRIVING_STATES) | (np.nan_to_num(speed) > 0)
+
+    breaks = np.ones(n, dtype=bool)
+    breaks[1:] = (moving[1:] != moving[:-1]) | (elapsed > gap_us)
+    starts = np.flatnonzero(breaks)
+    ends = np.append(starts[1:], n) - 1
+    has_soc, has_odometer = ~np.isnan(soc), ~np.isnan(odometer)
+
+    # Trips, the moving runs
+    trips = moving[starts]
+    first_soc, last_soc = _first_valid(has_soc, starts, ends)[trips], _last_valid(has_soc, starts)[trips]
+    first_odometer = _first_valid(has_odometer, starts, ends)[trips]
+    last_odometer = _last_valid(has_odometer, starts)[trips]
+    max_speed = np.fmax.reduceat(speed, starts)[trips]
+    trip_starts, trip_ends = starts[trips], ends[trips]
+    segments = {
+        'kind': [SegmentKind.TRIP.value] * len(trip_starts),
+        'start': times[trip_starts].tolist(),
+        'end': times[trip_ends].tolist(),
+        'rows': (trip_ends - trip_starts + 1).tolist(),
+        'odometer_start': _pick(odometer, first_odometer),
+        'odometer_end': _pick(odometer, last_odometer),
+        'soc_start': _pick(soc, first_soc),
+        'soc_end': _pick(soc, last_soc),
+        'max_speed': [None if value != value else value for value in max_speed.tolist()],
+    }
+
+    # Charging sessions, rises of SOC over the previous reading of the same parked run
+    run_starts = np.repeat(starts, ends - starts + 1)
+    previous = np.concatenate(([-1], np.maximum.accumulate(np.where(has_soc, np.arange(n), -1))[:-1]))
+    rises = np.flatnonzero(
+        ~moving & has_soc & (previous >= run_starts) & (soc > soc[np.maximum(previous, 0)])
+    )
+    if len(rises):
+        new_session = np.ones(len(rises), dtype=bool)
+        new_session[1:] = (
+            (run_starts[rises[1:]] != run_starts[rises[:-1]])
+            | (soc[previous[rises[1:]]] < soc[rises[:-1]])
+            | (np.diff(times[rises].astype(np.int64)) > gap_us)
+        )
+        session_starts = previous[rises[new_session]]
+        session_ends = rises[np.append(np.flatnonzero(new_session)[1:], len(rises)) - 1]
+        segments['kind'] += [SegmentKind.CHARGE.value] * len(session_starts)
+        segments['start'] += times[session_starts].tolist()
+        segments['end'] += times[session_ends].tolist()
+        segments['rows'] += (session_ends - session_starts + 1).tolist()
+        segments['odometer_start'] += _pick(odometer, np.where(has_odometer[session_starts], session_starts, -1))
+        segments['odometer_end'] += _pick(odometer, np.where(has_odometer[session_ends], session_ends, -1))
+        segments['soc_start'] += _pick(soc, session_starts)
+        segments['soc_end'] += _pick(soc, session_ends)
+        segments['max_speed'] += [None] * len(session_starts)
+
+    records = [_finish(dict(zip(segments, values))) for values in zip(*segments.values())]
+    records.sort(key=lambda record: record['start'])
+    return records
+
+
+def _load_rows(connection: Connection, vehicle_list_id: int, since: Optional[datetime], until: Optional[datetime]):
+    """Timestamps, speed, SOC, odometer and shift state of a vehicle's rows in time order"""
+    data = VehicleData.__table__
+    statement = select(
+        epoch_seconds(data.c.timestamp, connection.dialect.name), data.c.speed, data.c.soc, data.c.odometer, data.c.shift_state,
+    ).where(data.c.vehicle_list_id == vehicle_list_id)
+    if since is not None:
+        statement = statement.where(data.c.timestamp >= since)
+    if until is not None:
+        statement = statement.where(data.c.timestamp <= until)
+    result = connection.execution_options(yield_per=SEGMENT_SCAN_ROWS).execute(statement.order_by(data.c.timestamp, data.c.id))
+
+    # Plain tuples, numpy reads them far faster than Row objects
+    numbers, shift_states = [np.empty((0, 4))], [np.empty(0, dtype=object)]
+    for partition in result.partitions():
+        rows = [tuple(row) for row in partition]
+        numbers.append(np.array([row[:4] for row in rows], dtype=np.float64))
+        shift_states.append(np.array([row[4] for row in rows], dtype=object))
+    numbers = np.concatenate(numbers)
+    timestamps = np.round(numbers[:, 0] * 1e6).astype(np.int64).astype('datetime64[us]')
+    return timestamps, numbers[:, 1], numbers[:, 2], numbers[:, 3], np.concatenate(shift_states)
+
+
+def update_segments(connection: Connection, vehicle_list_id: int, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None) -> int:
+    """Re-segment a vehicle after rows from since on were added, all rows when since is None
+
+    Returns the segments written. Only rows up to until are read, rebuilds use it to segment a
+    long history in steps.
+    """
+    segments = VehicleSegment.__table__
+    resume, continued_trip = None, None
+    if since is not None:
+        # Segments reaching into the gap before the new rows may continue with them
+        resume = since - timedelta(seconds=SEGMENT_GAP_SECONDS)
+        open_segments = connection.execute(
+            select(segments).where(segments.c.vehicle_list_id == vehicle_list_id, segments.c.end >= resume)
+            .order_by(segments.c.start)
+        ).mappings().all()
+        if open_segments and open_segments[0]['kind'] == SegmentKind.TRIP.value and open_segments[0]['end'] < since:
+            # Rows appended after a trip only extend it from its last row, the trip is not read again
+            continued_trip = dict(open_segments[0])
+            resume = continued_trip['end']
+        elif open_segments:
+            resume = min(resume, open_segments[0]['start'])
+
+    statement = delete(segments).where(segments.c.vehicle_list_id == vehicle_list_id)
+    if resume is not None:
+        statement = statement.where(segments.c.end >= resume)
+    connection.execute(statement)
+
+    records = segment_rows(*_load_rows(connection, vehicle_list_id, resume, until))
+    if continued_trip is not None:
+        continued_trip.pop('id')
+        if records and records[0]['kind'] == continued_trip['kind'] and records[0]['start'] == continued_trip['end']:
+            records[0] = _continue_trip(continued_trip, records[0])
+        else:
+            # The last row of the trip sorted after a parked row at the same time, the trip is kept
+            records.insert(0, continued_trip)
+    for record in records:
+        record['vehicle_list_id'] = vehicle_list_id
+    if records:
+        VehicleSegment.bulk_insert(records, connection=connection)
+    return len(records)
+
+
+def rebuild_segments(connection: Connection, vehicle_list_ids: Optional[Iterable[int]] = None,
+                     page_rows: int = REBUILD_PAGE_ROWS) -> int:
+    """Segment some or every vehicle again from all their rows, returns the segments written"""
+    data = VehicleData.__table__
+    if vehicle_list_ids is None:
+        vehicle_list_ids = connection.execute(select(VehicleList.__table__.c.id)).scalars().all()
+    written = 0
+    for vehicle_list_id in vehicle_list_ids:
+        connection.execute(delete(VehicleSegment.__table__).where(VehicleSegment.__table__.c.vehicle_list_id == vehicle_list_id))
+        # Steps of page_rows rows, each one re-segments the segments left open by the one before
+        since = None
+        while True:
+            statement = select(data.c.timestamp).where(data.c.vehicle_list_id == vehicle_list_id)
+            if since is not None:
+                statement = statement.where(data.c.timestamp > since)
+            until = connection.execute(statement.order_by(data.c.timestamp).offset(page_rows).limit(1)).scalar()
+            written += update_segments(connection, vehicle_list_id, since, until)
+            if until is None:
+                break
+            since = until + timedelta(microseconds=1)
+    return written
+
+
+def list_segments(filter_segments: FilterSegments, vehicle_record_id: int, session: Session) -> List[VehicleSegment]:
+    """Segments of one kind of a vehicle by start time, read from the (vehicle, kind, start) index"""
+    statement = select(VehicleSegment).where(
+        VehicleSegment.vehicle_list_id == vehicle_record_id, VehicleSegment.kind == filter_segments.kind.value,
+    )
+    if filter_segments.initial:
+        statement = statement.where(VehicleSegment.start >= filter_segments.initial)
+    if filter_segments.final:
+        statement = statement.where(VehicleSegment.start <= filter_segments.final)
+    statement = statement.order_by(VehicleSegment.start).limit(filter_segments.limit)
+    return session.exec(statement).all()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the trips and charging sessions from the stored rows")
+    parser.add_argument('--vehicle-id', action='append', help='vehicle to rebuild, repeat for several, every vehicle by default')
+    args = parser.parse_args()
+
+    from database import engine
+    from vehicle.ingest import ingest_lock
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    with ingest_lock(), engine.begin() as connection:
+        vehicle_list_ids = None
+        if args.vehicle_id:
+            vehicles = VehicleList.__table__
+            vehicle_list_ids = connection.execute(
+                select(vehicles.c.id).where(vehicles.c.vehicle_id.in_(args.vehicle_id))
+            ).scalars().all()
+        written = rebuild_segments(connection, vehicle_list_ids)
+    logger.info("Rebuilt %s segments", written)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,77 +1,363 @@
+import base64
 import glob
 import json
+import logging
 import os
-from typing import Annotated, List, Optional
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Annotated, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 from fastapi import Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 import pandas as pd
-from sqlmodel import Session, func, select
+from sqlalchemy import Row
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, func, or_, select
 
-from configs import DATA_PATH
+from configs import DATA_PATH, INGEST_STREAM_BATCH_ROWS, INGEST_WORKERS
 from database import SessionDep, engine
-from vehicle.model import VehicleData, VehicleList
-from vehicle.schema import ExportTypes, FilterExportTypes, FilterVehicles
+from vehicle.cache import vehicle_id_cache
+from vehicle.counts import cached_row_count, count_cache
+from vehicle.ingest import (
+    FileTask,
+    FileValidation,
+    IngestCancelled,
+    IngestStats,
+    MemoryBudget,
+    ParsedChunk,
+    StreamIngestError,
+    commit_chunk,
+    file_head_hash,
+    ingest_lock,
+    insert_chunk,
+    iter_csv_chunks,
+    iter_line_batches,
+    log_stats,
+    parse_csv_lines,
+    parse_ndjson_lines,
+    record_file_manifest,
+    run_parallel_ingest,
+    validate_frame,
+)
+from vehicle.model import IngestCheckpoint, VehicleData, VehicleDataQuarantine, VehicleList
+from vehicle.rollups import naive_utc
+from vehicle.schema import CursorDirection, ExportTypes, FilterExportTypes, FilterVehicles, StreamFormat
+from vehicle.versions import VEHICLE_LIST, bump_dataset_version
 
 
+logger = logging.getLogger(__name__)
 
 
-def load_data_from_folder() -> None:
-    """Load data from the folder"""
-
-    # Get existing vehicle IDs from database at the beginning
+def load_checkpoints() -> Dict[str, IngestCheckpoint]:
+    """Get the ingest checkpoints keyed by file name"""
     with Session(engine) as session:
-        existing_vehicle_ids = set()
-        statement = select(VehicleList.vehicle_id)
-        results = session.exec(statement).all()
-        existing_vehicle_ids = set(results)
+        checkpoints = session.exec(select(IngestCheckpoint)).all()
+        return {checkpoint.file_name: checkpoint for checkpoint in checkpoints}
+
+
+def register_new_files(file_ids: List[str]) -> Dict[str, IngestCheckpoint]:
+    """Create the VehicleList rows and empty checkpoints for new files in one transaction"""
+    if not file_ids:
+        return {}
+
+    with engine.begin() as connection:
+        vehicle_list_ids = VehicleList.bulk_insert_returning_ids(
+            [{'vehicle_id': file_id} for file_id in file_ids], connection=connection,
+        )
+        checkpoint_rows = [
+            {'file_name': file_id, 'vehicle_list_id': vehicle_list_id}
+            for file_id, vehicle_list_id in zip(file_ids, vehicle_list_ids)
+        ]
+        checkpoint_ids = IngestCheckpoint.bulk_insert_returning_ids(checkpoint_rows, connection=connection)
+        bump_dataset_version(connection, VEHICLE_LIST)
+
+    for file_id, vehicle_list_id in zip(file_ids, vehicle_list_ids):
+        vehicle_id_cache.put(file_id, vehicle_list_id)
+
+    return {
+        row['file_name']: IngestCheckpoint(id=checkpoint_id, **row)
+        for row, checkpoint_id in zip(checkpoint_rows, checkpoint_ids)
+    }
+
+
+def adopt_loaded_files(loaded_files: Dict[str, Tuple[int, int]]) -> Dict[str, IngestCheckpoint]:
+    """Create checkpoints at the current end of files loaded before the ingest manifest existed
+
+    loaded_files maps the file id to its VehicleList id and current size. Rows already in the
+    file are assumed to be loaded, rows appended from now on are picked up by later runs.
+    """
+    if not loaded_files:
+        return {}
+
+    checkpoints = IngestCheckpoint.save_all([
+        IngestCheckpoint(file_name=file_id, vehicle_list_id=vehicle_list_id, byte_offset=file_size)
+        for file_id, (vehicle_list_id, file_size) in loaded_files.items()
+    ])
+    return {checkpoint.file_name: checkpoint for checkpoint in checkpoints}
+
 
-    # Load files
-    csv_files = glob.glob(os.path.join(DATA_PATH, "*.csv"))
+def write_chunk(checkpoint_id: int, chunk: ParsedChunk, end_offset: int) -> int:
+    """Commit one parsed chunk with its file checkpoint"""
+    with engine.begin() as connection:
+        rows = commit_chunk(connection, checkpoint_id, chunk, end_offset)
+    if rows:
+        count_cache.invalidate(chunk.vehicle_list_id)
+    return rows
 
-    # Load data to data array, skip files that already exist in DB
-    data = []
-    for csv_file in csv_files:
-        file_id = os.path.splitext(os.path.basename(csv_file))[0]
 
-        # Skip if this file_id already exists in database
-        if file_id in existing_vehicle_ids:
+def get_quality_reports(session: Session, checkpoint_ids: Optional[List[int]] = None) -> List[dict]:
+    """Committed and rejected row counts of every loaded file, with the rejected rows per reason"""
+    statement = select(IngestCheckpoint).order_by(IngestCheckpoint.file_name)
+    reasons_statement = (
+        select(VehicleDataQuarantine.checkpoint_id, VehicleDataQuarantine.reason, func.count(VehicleDataQuarantine.id))
+        .where(VehicleDataQuarantine.checkpoint_id.is_not(None))
+        .group_by(VehicleDataQuarantine.checkpoint_id, VehicleDataQuarantine.reason)
+    )
+    if checkpoint_ids is not None:
+        statement = statement.where(IngestCheckpoint.id.in_(checkpoint_ids))
+        reasons_statement = reasons_statement.where(VehicleDataQuarantine.checkpoint_id.in_(checkpoint_ids))
+
+    rejected_by_reason: Dict[int, Dict[str, int]] = {}
+    for checkpoint_id, reason, rows in session.exec(reasons_statement).all():
+        rejected_by_reason.setdefault(checkpoint_id, {})[reason] = rows
+
+    return [
+        {
+            'file_name': checkpoint.file_name,
+            'rows_committed': checkpoint.rows_committed,
+            'rows_rejected': checkpoint.rows_rejected,
+            'rejected_by_reason': rejected_by_reason.get(checkpoint.id, {}),
+        }
+        for checkpoint in session.exec(statement).all()
+    ]
+
+
+def finish_file(task: FileTask, rejected: Counter) -> None:
+    """Record the manifest of a file once all of its rows are committed and log the rows it had rejected"""
+    with engine.begin() as connection:
+        record_file_manifest(connection, task.checkpoint_id, task.path)
+    if rejected:
+        logger.warning("Quarantined %d rows of %s: %s", sum(rejected.values()), task.path, dict(rejected))
+
+
+def plan_file_tasks(file_stats: Dict[str, os.stat_result], file_ids: Dict[str, str],
+                    checkpoints: Dict[str, IngestCheckpoint], stats: IngestStats) -> List[FileTask]:
+    """Pick the files with uncommitted bytes, comparing each one with its manifest entry"""
+    tasks = []
+    for csv_file, file_stat in file_stats.items():
+        checkpoint = checkpoints.get(file_ids[csv_file])
+        if checkpoint is None:
             continue
-        
-        data.append({
-            'vehicle_id': VehicleList(vehicle_id=file_id),
-            'vehicle_data': pd.read_csv(csv_file)
-        })
-    
-    # If no new data, return early
-    if not data:
-        return
-    
-    # Add data to database
-    vehicle_list = [d['vehicle_id'] for d in data]
-    saved_vehicle_list = VehicleList.save_all(vehicle_list)
 
-    all_vehicle_data = []
-    
-    for i, d in enumerate(data):
-        df = d['vehicle_data']
-        saved_vehicle = saved_vehicle_list[i]  # Get corresponding saved vehicle
-        
-        # Convert each DataFrame row to VehicleData object
-        for _, row in df.iterrows():
-            vehicle_data = VehicleData(
-                timestamp=pd.to_datetime(row['timestamp']),
-                speed=None if pd.isna(row['speed']) else int(row['speed']),
-                odometer=None if pd.isna(row['odometer']) else float(row['odometer']),
-                soc=None if pd.isna(row['soc']) else int(row['soc']),
-                elevation=None if pd.isna(row['elevation']) else int(row['elevation']),
-                shift_state=None if pd.isna(row['shift_state']) else str(row['shift_state']),
-                vehicle_list_id=saved_vehicle.id  # Foreign key link
-            )
-            all_vehicle_data.append(vehicle_data)
-    
-    # Bulk save all VehicleData objects
-    VehicleData.save_all(all_vehicle_data)
+        # Unchanged since the last run, decided from the stat call alone
+        if (checkpoint.file_size == file_stat.st_size and checkpoint.file_mtime == file_stat.st_mtime
+                and checkpoint.byte_offset >= file_stat.st_size):
+            continue
+
+        # A file that shrank or whose head changed was rewritten rather than appended to
+        rewritten = file_stat.st_size < checkpoint.byte_offset or (
+            checkpoint.content_hash is not None
+            and file_head_hash(csv_file, checkpoint.hashed_bytes) != checkpoint.content_hash
+        )
+        if rewritten:
+            logger.warning("Skipping %s, the file was rewritten since it was loaded", csv_file)
+            stats.files_rewritten += 1
+            continue
+
+        tasks.append(FileTask(
+            csv_file, checkpoint.id, checkpoint.vehicle_list_id, checkpoint.byte_offset,
+            checkpoint.max_odometer, checkpoint.last_timestamp,
+        ))
+    return tasks
+
+
+def load_data_from_folder(
+    workers: int = INGEST_WORKERS,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    paths: Optional[List[str]] = None,
+) -> IngestStats:
+    """Load data from the folder
+
+    Every CSV file is streamed in chunks sized by the ingest memory budget. Each chunk is
+    committed together with the file checkpoint, so an interrupted run resumes from the
+    last committed chunk, and rows appended to a loaded file are read from its last offset.
+    With more than one worker the files are parsed in a process pool while this process
+    writes the parsed chunks.
+
+    progress is called with the running stats after every committed chunk. Setting cancel
+    stops the run after the current chunk and raises IngestCancelled. Runs are serialised by
+    the ingest lock, so concurrent loads never race on the same files. paths restricts the run
+    to the given CSV files instead of every file in DATA_PATH.
+    """
+    started = time.perf_counter()
+    stats = IngestStats()
+
+    def report() -> None:
+        stats.seconds = time.perf_counter() - started
+        if progress is not None:
+            progress(stats)
+
+    with ingest_lock():
+        # Load files and their manifest entries
+        csv_files = glob.glob(os.path.join(DATA_PATH, "*.csv")) if paths is None else list(paths)
+        file_ids = {csv_file: os.path.splitext(os.path.basename(csv_file))[0] for csv_file in csv_files}
+        file_stats = {csv_file: os.stat(csv_file) for csv_file in csv_files}
+        checkpoints = load_checkpoints()
+
+        # Look up vehicles only for files missing from the manifest
+        unknown_files = {file_id: csv_file for csv_file, file_id in file_ids.items() if file_id not in checkpoints}
+        if unknown_files:
+            with Session(engine) as session:
+                statement = select(VehicleList.vehicle_id, VehicleList.id).where(VehicleList.vehicle_id.in_(list(unknown_files)))
+                existing_vehicle_ids = dict(session.exec(statement).all())
+
+            # Register new files, vehicles loaded before the manifest existed are adopted at their current size
+            checkpoints.update(register_new_files([
+                file_id for file_id in unknown_files if file_id not in existing_vehicle_ids
+            ]))
+            checkpoints.update(adopt_loaded_files({
+                file_id: (vehicle_list_id, file_stats[unknown_files[file_id]].st_size)
+                for file_id, vehicle_list_id in existing_vehicle_ids.items()
+            }))
+
+        tasks = plan_file_tasks(file_stats, file_ids, checkpoints, stats)
+
+        if workers > 1 and len(tasks) > 1:
+            run_parallel_ingest(tasks, write_chunk, finish_file, min(workers, len(tasks)), stats, cancel, report)
+        else:
+            budget = MemoryBudget()
+            for task in tasks:
+                validation = task.validation()
+                for df, end_offset in iter_csv_chunks(task.path, task.start_offset, budget):
+                    if cancel is not None and cancel.is_set():
+                        raise IngestCancelled()
+                    chunk = validate_frame(df, task.vehicle_list_id, validation)
+                    del df
+                    stats.rows += write_chunk(task.checkpoint_id, chunk, end_offset)
+                    stats.rows_rejected += chunk.rows_rejected
+                    report()
+                finish_file(task, validation.rejected)
+                stats.files += 1
+                report()
+            stats.peak_rss_bytes = budget.peak_rss_bytes
+
+    stats.seconds = time.perf_counter() - started
+    log_stats(stats)
+    return stats
+
+
+def get_vehicle_record_id(vehicle_id: str, session: Session) -> Optional[int]:
+    """Get the VehicleList id of a vehicle, None when it is unknown
+
+    Found ids are cached, unknown vehicles are looked up again on every call so a vehicle
+    created by another process is found right away.
+    """
+    vehicle_record_id = vehicle_id_cache.get(vehicle_id)
+    if vehicle_record_id is None:
+        vehicle_record_id = session.exec(select(VehicleList.id).where(VehicleList.vehicle_id == vehicle_id)).first()
+        if vehicle_record_id is not None:
+            vehicle_id_cache.put(vehicle_id, vehicle_record_id)
+    return vehicle_record_id
+
+
+def get_vehicle_record_ids(vehicle_ids: List[str], session: Session) -> Dict[str, int]:
+    """Get the VehicleList ids of the known vehicles among vehicle_ids, in their order
+
+    Vehicles missing from the cache are looked up together with one IN query.
+    """
+    vehicle_record_ids = {vehicle_id: vehicle_id_cache.get(vehicle_id) for vehicle_id in dict.fromkeys(vehicle_ids)}
+    uncached = [vehicle_id for vehicle_id, record_id in vehicle_record_ids.items() if record_id is None]
+    if uncached:
+        found = session.exec(select(VehicleList.vehicle_id, VehicleList.id).where(VehicleList.vehicle_id.in_(uncached))).all()
+        for vehicle_id, vehicle_record_id in found:
+            vehicle_record_ids[vehicle_id] = vehicle_record_id
+            vehicle_id_cache.put(vehicle_id, vehicle_record_id)
+    return {vehicle_id: record_id for vehicle_id, record_id in vehicle_record_ids.items() if record_id is not None}
+
+
+def get_or_create_vehicle(vehicle_id: str) -> int:
+    """Get the VehicleList id of a vehicle, creating the row on first sight"""
+    statement = select(VehicleList.id).where(VehicleList.vehicle_id == vehicle_id)
+    with Session(engine) as session:
+        vehicle_record_id = get_vehicle_record_id(vehicle_id, session)
+        if vehicle_record_id is not None:
+            return vehicle_record_id
+
+        vehicle = VehicleList(vehicle_id=vehicle_id)
+        session.add(vehicle)
+        try:
+            session.flush()
+            bump_dataset_version(session.connection(), VEHICLE_LIST)
+            session.commit()
+        except IntegrityError:
+            # Created by a concurrent upload, vehicle_id is unique
+            session.rollback()
+            vehicle_record_id = session.exec(statement).one()
+        else:
+            session.refresh(vehicle)
+            vehicle_record_id = vehicle.id
+    vehicle_id_cache.put(vehicle_id, vehicle_record_id)
+    return vehicle_record_id
+
+
+def write_stream_batch(lines: List[bytes], header: Optional[bytes], stream_format: StreamFormat,
+                       vehicle_list_id: int, validation: FileValidation) -> ParsedChunk:
+    """Parse, validate and insert one micro-batch of a streamed upload"""
+    if stream_format == StreamFormat.CSV:
+        df = parse_csv_lines(header, lines)
+    else:
+        df = parse_ndjson_lines(lines)
+    chunk = validate_frame(df, vehicle_list_id, validation)
+    with engine.begin() as connection:
+        rows = insert_chunk(connection, chunk)
+    if rows:
+        count_cache.invalidate(vehicle_list_id)
+    return chunk
+
+
+async def ingest_stream(vehicle_id: str, chunks: AsyncIterator[bytes], stream_format: StreamFormat) -> dict:
+    """Ingest a streamed CSV or NDJSON body in micro-batches as it arrives
+
+    Each micro-batch is committed on its own, so rows keep becoming queryable during a long
+    upload. Parsing and writing run in the threadpool to keep the event loop free. Rows
+    breaking a quality rule within the upload are quarantined instead of inserted.
+    """
+    started = time.perf_counter()
+    vehicle_list_id = await run_in_threadpool(get_or_create_vehicle, vehicle_id)
+
+    rows = 0
+    rows_rejected = 0
+    batches = 0
+    header = None
+    validation = FileValidation()
+    try:
+        is_csv = stream_format == StreamFormat.CSV
+        async for lines in iter_line_batches(chunks, INGEST_STREAM_BATCH_ROWS, header=is_csv):
+            if is_csv and header is None:
+                header = lines[0]
+                if b'timestamp' not in header.strip().split(b','):
+                    raise ValueError("CSV header must contain a timestamp column")
+                continue
+            chunk = await run_in_threadpool(write_stream_batch, lines, header, stream_format, vehicle_list_id, validation)
+            rows += len(chunk.columns['timestamp'])
+            rows_rejected += chunk.rows_rejected
+            batches += 1
+    except (ValueError, KeyError, pd.errors.ParserError) as error:
+        raise StreamIngestError(str(error), rows) from error
+
+    seconds = time.perf_counter() - started
+    return {
+        'vehicle_id': vehicle_id,
+        'rows': rows,
+        'rows_rejected': rows_rejected,
+        'batches': batches,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else 0.0,
+    }
 
 
 def get_all_vehicle_ids(session: SessionDep) -> List[VehicleList]:
@@ -87,68 +373,151 @@ def get_a_vehicle(id: int, session: SessionDep) -> Optional[VehicleData]:
     
     return session.get(VehicleData, id)
 
-def get_vehicle_list(filter_vehicles: Annotated[FilterVehicles, Query()], vehicle_record_id: int, session: SessionDep) -> Optional[List[VehicleData]]:
-    """Get filtered list of vehicles"""
-    
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(row: Row, direction: CursorDirection) -> str:
+    """Opaque cursor pointing before or after a row in (timestamp, id) order"""
+    payload = json.dumps([direction.value, row.timestamp.isoformat(), row.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[CursorDirection, datetime, int]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, timestamp, row_id = json.loads(payload)
+        return CursorDirection(direction), datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError) as error:
+        raise InvalidCursor("Invalid pagination cursor") from error
+
+
+# Columns of a listed row, the fields of VehicleDataSchema
+LIST_COLUMNS = ('id', 'timestamp', 'speed', 'odometer', 'soc', 'elevation', 'shift_state')
+
+
+def list_fields(filter_vehicles: FilterVehicles) -> List[str]:
+    """Columns of a listed row, the requested fields in their order or LIST_COLUMNS"""
+    if not filter_vehicles.fields:
+        return list(LIST_COLUMNS)
+    return list(dict.fromkeys(field.value for field in filter_vehicles.fields))
+
+
+def vehicle_list_statement(filter_vehicles: FilterVehicles, vehicle_record_id: int) -> Tuple[Any, CursorDirection]:
+    """Page query of get_vehicle_list with the direction it reads in, one row past the page
+
+    Plain column tuples are selected, no model instance is built for a listed row. Only the
+    list_fields columns are read, followed by id and timestamp when they were left out, the
+    cursors are made of them.
+    """
+    names = list_fields(filter_vehicles)
+    names += [name for name in ('id', 'timestamp') if name not in names]
+
     # Build the main query for VehicleData
-    statement = select(VehicleData).where(VehicleData.vehicle_list_id == vehicle_record_id)
-    count_statement = select(func.count(VehicleData.id)).where(VehicleData.vehicle_list_id == vehicle_record_id)
+    statement = select(*(getattr(VehicleData, name) for name in names)).where(
+        VehicleData.vehicle_list_id == vehicle_record_id
+    )
 
-    # Apply timestamp filters if provided
+    # Apply timestamp filters if provided, in the naive UTC the counts are taken in
     if filter_vehicles.initial:
-        statement = statement.where(VehicleData.timestamp >= filter_vehicles.initial)
-        count_statement = count_statement.where(VehicleData.timestamp >= filter_vehicles.initial)
+        statement = statement.where(VehicleData.timestamp >= naive_utc(filter_vehicles.initial))
     
     if filter_vehicles.final:
-        statement = statement.where(VehicleData.timestamp <= filter_vehicles.final)
-        count_statement = count_statement.where(VehicleData.timestamp <= filter_vehicles.final)
-    
-    # Apply ordering by timestamp for consistent pagination
-    statement = statement.order_by(VehicleData.timestamp)
-    
-    # Apply offset and limit
-    statement = statement.offset(filter_vehicles.page * filter_vehicles.limit).limit(filter_vehicles.limit)
-    
-    # Execute the query only once
-    count = session.exec(count_statement).one()
-    results = session.exec(statement).all()
+        statement = statement.where(VehicleData.timestamp <= naive_utc(filter_vehicles.final))
+
+    limit = filter_vehicles.limit
+    direction = CursorDirection.NEXT
+    if filter_vehicles.cursor:
+        direction, timestamp, row_id = decode_cursor(filter_vehicles.cursor)
+        if direction == CursorDirection.NEXT:
+            statement = statement.where(
+                VehicleData.timestamp >= timestamp,
+                or_(VehicleData.timestamp > timestamp, VehicleData.id > row_id),
+            ).order_by(VehicleData.timestamp, VehicleData.id)
+        else:
+            statement = statement.where(
+                VehicleData.timestamp <= timestamp,
+                or_(VehicleData.timestamp < timestamp, VehicleData.id < row_id),
+            ).order_by(VehicleData.timestamp.desc(), VehicleData.id.desc())
+    else:
+        # Apply ordering by timestamp for consistent pagination
+        statement = statement.order_by(VehicleData.timestamp, VehicleData.id)
+        statement = statement.offset(filter_vehicles.page * limit)
+
+    # One extra row tells whether there is a page beyond this one
+    return statement.limit(limit + 1), direction
+
+
+def vehicle_list_page(filter_vehicles: FilterVehicles, results: List[Row], direction: CursorDirection,
+                      count: int) -> dict:
+    """Response of get_vehicle_list from the rows read by vehicle_list_statement"""
+    limit = filter_vehicles.limit
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    if direction == CursorDirection.PREV:
+        results.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(filter_vehicles.cursor) or filter_vehicles.page > 0
+
+    return {
+        'count': count,
+        'data': results,
+        'next_cursor': encode_cursor(results[-1], CursorDirection.NEXT) if results and has_next else None,
+        'prev_cursor': encode_cursor(results[0], CursorDirection.PREV) if results and has_prev else None,
+    }
+
+
+def get_vehicle_list(filter_vehicles: Annotated[FilterVehicles, Query()], vehicle_record_id: int, session: SessionDep) -> dict:
+    """Get filtered list of vehicles
+
+    Rows are ordered by (timestamp, id). With a cursor the page is found by seeking past the
+    cursor row with a range predicate, so every page costs the same however deep it is. The
+    page parameter keeps paging with OFFSET when no cursor is given. Both return the cursors
+    of the neighbouring pages.
+    """
+    statement, direction = vehicle_list_statement(filter_vehicles, vehicle_record_id)
     
-    return { 'count': count,'data': list(results)}
+    # The total comes from the ingest counters instead of a COUNT over the rows
+    count = cached_row_count(session, vehicle_record_id, filter_vehicles.initial or None, filter_vehicles.final or None)
+    results = list(session.exec(statement).all())
+    return vehicle_list_page(filter_vehicles, results, direction, count)
+
+def export_statement(export_filter: FilterExportTypes, vehicle_record_id: int) -> Any:
+    """Query of a vehicle's exported rows, only the requested fields or every column of VehicleData"""
+    data = VehicleData.__table__
+    if export_filter.fields:
+        columns = [data.c[name] for name in dict.fromkeys(field.value for field in export_filter.fields)]
+    else:
+        columns = [data]
+    return select(*columns).where(data.c.vehicle_list_id == vehicle_record_id)
+
 
 def export_data(export_filter: Annotated[FilterExportTypes, Query()], vehicle_record_id: int, session: SessionDep):
     
-    # Build the main query for VehicleData
-    statement = select(VehicleData).where(VehicleData.vehicle_list_id == vehicle_record_id)
+    # Read plain rows of the selected columns, no model instance is built
+    result = session.connection().execute(export_statement(export_filter, vehicle_record_id))
+    data_list = [dict(row) for row in result.mappings()]
 
-    # Execute the query only once
-    results = session.exec(statement).all()
+    return write_export(export_filter, data_list)
+
+
+def write_export(export_filter: FilterExportTypes, data_list: List[dict]) -> FileResponse:
+    """Write the exported rows to a file of the requested type"""
     file_name = export_filter.vehicle_id
     
     # Create exports directory if it doesn't exist
     export_dir = "exports"
     os.makedirs(export_dir, exist_ok=True)
-    
-    # Convert results to data_list (common for all export types)
-    data_list = []
-    for result in results:
-        data_dict = {
-            "id": result.id,
-            "timestamp": result.timestamp,
-            "speed": result.speed,
-            "odometer": result.odometer,
-            "soc": result.soc,
-            "elevation": result.elevation,
-            "shift_state": result.shift_state,
-            "vehicle_list_id": result.vehicle_list_id
-        }
-        data_list.append(data_dict)
 
     if export_filter.export_type == ExportTypes.JSON.value:
         # Convert timestamps to ISO format for JSON serialization
         json_data = []
         for data_dict in data_list:
             json_dict = data_dict.copy()
-            json_dict["timestamp"] = data_dict["timestamp"].isoformat()
+            if "timestamp" in json_dict:
+                json_dict["timestamp"] = data_dict["timestamp"].isoformat()
             json_data.append(json_dict)
         
         file_path = os.path.join(export_dir, f"{file_name}.json")
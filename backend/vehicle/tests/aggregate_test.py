@@ -0,0 +1,143 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+
+from database import get_session
+from vehicle import aggregate
+from vehicle.cache import vehicle_id_cache
+from vehicle.model import VehicleData, VehicleList
+from vehicle.rollups import rebuild_rollups
+from vehicle.router import router
+
+
+START = datetime(2022, 7, 12, 16, 0, 0)
+
+
+class TestAggregateEndpoint(unittest.TestCase):
+    """Test cases for the time bucket aggregation endpoint against an in-memory SQLite database."""
+
+    def setUp(self):
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        SQLModel.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        vehicle_id_cache.clear()
+        self.addCleanup(vehicle_id_cache.clear)
+
+        # One row every 20 seconds for two hours, speed counts up and SOC down
+        with engine.begin() as connection:
+            VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'a'}], connection=connection)
+            VehicleData.bulk_insert([
+                {
+                    'timestamp': START + timedelta(seconds=20 * index),
+                    'speed': index % 180,
+                    'soc': 100 - index // 4,
+                    'odometer': 1000.0 + index,
+                    'vehicle_list_id': 1,
+                }
+                for index in range(360)
+            ], connection=connection)
+            rebuild_rollups(connection)
+
+        def session_override():
+            with Session(engine) as session:
+                yield session
+
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.app.dependency_overrides[get_session] = session_override
+        self.client = TestClient(self.app)
+
+    def test_hourly_buckets(self):
+        """Test that each hour gets its row count and only the requested metrics."""
+        response = self.client.get('/vehicle_data/a/aggregate', params={
+            'bucket': '1h', 'metrics': ['avg_speed', 'min_soc', 'max_soc', 'last_odometer'],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], [
+            {'bucket': '2022-07-12T16:00:00', 'rows': 180, 'avg_speed': 89.5, 'min_soc': 56, 'max_soc': 100, 'last_odometer': 1179.0},
+            {'bucket': '2022-07-12T17:00:00', 'rows': 180, 'avg_speed': 89.5, 'min_soc': 11, 'max_soc': 55, 'last_odometer': 1359.0},
+        ])
+
+    def test_range_and_minute_buckets(self):
+        """Test that the time range bounds the rows and minute buckets are returned in order."""
+        response = self.client.get('/vehicle_data/a/aggregate', params={
+            'bucket': '1m', 'initial': '2022-07-12T16:10:00', 'final': '2022-07-12T16:12:59', 'metrics': 'max_speed',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['metrics'], ['max_speed'])
+        self.assertEqual(
+            [(row['bucket'], row['rows'], row['max_speed']) for row in body['data']],
+            [('2022-07-12T16:10:00', 3, 32), ('2022-07-12T16:11:00', 3, 35), ('2022-07-12T16:12:00', 3, 38)],
+        )
+
+    def test_fields_keep_their_metrics(self):
+        """Test that fields drop the metrics over other columns."""
+        response = self.client.get('/vehicle_data/a/aggregate', params={
+            'bucket': '1d', 'metrics': ['avg_speed', 'min_soc', 'last_odometer'], 'fields': ['soc', 'timestamp'],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['metrics'], ['min_soc'])
+        self.assertEqual(body['data'], [{'bucket': '2022-07-12T00:00:00', 'rows': 360, 'min_soc': 11}])
+
+    def test_partial_edge_buckets(self):
+        """Test that buckets cut by the range are computed from the rows and whole ones from the rollups."""
+        response = self.client.get('/vehicle_data/a/aggregate', params={
+            'bucket': '1h', 'initial': '2022-07-12T16:30:00', 'final': '2022-07-12T17:29:59', 'metrics': ['avg_soc', 'max_speed'],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], [
+            {'bucket': '2022-07-12T16:00:00', 'rows': 90, 'avg_soc': 6008 / 90, 'max_speed': 179},
+            {'bucket': '2022-07-12T17:00:00', 'rows': 90, 'avg_soc': 3982 / 90, 'max_speed': 89},
+        ])
+
+        # The same range with whole minute buckets in the middle
+        with mock.patch('vehicle.aggregate._raw_buckets', wraps=aggregate._raw_buckets) as raw:
+            response = self.client.get('/vehicle_data/a/aggregate', params={
+                'bucket': '1m', 'initial': '2022-07-12T16:30:00', 'final': '2022-07-12T17:29:59', 'metrics': 'avg_soc',
+            })
+        self.assertEqual(response.json()['data'][-1], {'bucket': '2022-07-12T17:29:00', 'rows': 3, 'avg_soc': 100 / 3})
+        self.assertEqual(len(response.json()['data']), 60)
+        self.assertEqual(raw.call_count, 1)
+
+    def test_timezone_aware_range(self):
+        """Test that a range with a UTC designator or offset is split into buckets in UTC."""
+        for initial, final in (('2022-07-12T16:30:00Z', '2022-07-12T17:29:59Z'),
+                               ('2022-07-12T18:30:00+02:00', '2022-07-12T19:29:59+02:00')):
+            response = self.client.get('/vehicle_data/a/aggregate', params={
+                'bucket': '1h', 'initial': initial, 'final': final, 'metrics': 'max_speed',
+            })
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['data'], [
+                {'bucket': '2022-07-12T16:00:00', 'rows': 90, 'max_speed': 179},
+                {'bucket': '2022-07-12T17:00:00', 'rows': 90, 'max_speed': 89},
+            ])
+
+    def test_too_many_buckets(self):
+        """Test that a request over the bucket limit is rejected instead of returning a huge body."""
+        with mock.patch('vehicle.aggregate.AGGREGATE_MAX_BUCKETS', 10):
+            response = self.client.get('/vehicle_data/a/aggregate', params={'bucket': '1m'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_vehicle(self):
+        """Test that an unknown vehicle is a 404."""
+        response = self.client.get('/vehicle_data/b/aggregate')
+
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from vehicle.arrow import ARROW_STREAM, NotAcceptable, accepted_ranges, arrow_partition_stream, pa, wants_arrow
+
+
+class TestArrowNegotiation(unittest.TestCase):
+    """Test cases for choosing between Arrow and JSON from the Accept header."""
+
+    def test_accepted_ranges(self):
+        """Test that media ranges are parsed with their quality, 1 when not given."""
+        self.assertEqual(
+            accepted_ranges(f'{ARROW_STREAM};q=0.9, Application/JSON, text/*;q=bad'),
+            {ARROW_STREAM: 0.9, 'application/json': 1.0, 'text/*': 0.0},
+        )
+
+    @mock.patch('vehicle.arrow.pa', object())
+    def test_arrow_when_preferred(self):
+        """Test that Arrow is sent only when listed explicitly and not ranked below JSON."""
+        self.assertTrue(wants_arrow(ARROW_STREAM))
+        self.assertTrue(wants_arrow(f'{ARROW_STREAM}, application/json;q=0.5'))
+        self.assertFalse(wants_arrow(f'application/json, {ARROW_STREAM};q=0.5'))
+        self.assertFalse(wants_arrow(f'{ARROW_STREAM};q=0, */*'))
+        self.assertFalse(wants_arrow('*/*'))
+        self.assertFalse(wants_arrow(None))
+
+    @mock.patch('vehicle.arrow.pa', None)
+    def test_without_pyarrow(self):
+        """Test that JSON is sent when also accepted and Arrow alone is not acceptable."""
+        self.assertFalse(wants_arrow(f'{ARROW_STREAM}, */*;q=0.1'))
+        with self.assertRaises(NotAcceptable):
+            wants_arrow(ARROW_STREAM)
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class TestArrowPartitionStream(unittest.TestCase):
+    """Test cases for the Arrow stream written from partitions of fetched rows."""
+
+    def test_one_batch_per_partition(self):
+        """Test that every partition is fetched only after the previous one was written, as its own record batch."""
+        rows = [(datetime(2022, 7, 12, 16, 0, second), second) for second in range(5)]
+        fetched = []
+
+        async def partitions():
+            for start, end in ((0, 3), (3, 5)):
+                fetched.append(start)
+                yield rows[start:end]
+
+        async def read():
+            chunks = []
+            async for chunk in arrow_partition_stream(['timestamp', 'speed'], partitions()):
+                chunks.append((chunk, list(fetched)))
+            return chunks
+
+        chunks = asyncio.run(read())
+
+        self.assertEqual([seen for _, seen in chunks], [[], [0], [0, 3], [0, 3]])
+        batches = list(pa.ipc.open_stream(b''.join(chunk for chunk, _ in chunks)))
+        self.assertEqual([batch.num_rows for batch in batches], [3, 2])
+        self.assertEqual(pa.Table.from_batches(batches).column('speed').to_pylist(), [0, 1, 2, 3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
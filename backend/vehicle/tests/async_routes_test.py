@@ -0,0 +1,240 @@
+import asyncio
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_async_session
+from vehicle.arrow import ARROW_STREAM, pa
+from vehicle.cache import vehicle_id_cache
+from vehicle.counts import count_cache, rebuild_row_counts, record_row_counts
+from vehicle.model import VehicleData, VehicleList
+from vehicle.rollups import rebuild_rollups
+from vehicle.router import router
+from vehicle.schema import VehicleListOutputSchema
+from vehicle.versions import VEHICLE_LIST, bump_dataset_version
+
+
+START = datetime(2022, 7, 12, 16, 0, 0)
+
+
+class TestAsyncRoutes(unittest.TestCase):
+    """Test cases for the routes on the async engine against a SQLite file read through aiosqlite."""
+
+    def setUp(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir)
+        # Exports are written relative to the working directory
+        previous_dir = os.getcwd()
+        os.chdir(work_dir)
+        self.addCleanup(os.chdir, previous_dir)
+
+        path = self.path = os.path.join(work_dir, 'vehicle.db')
+        engine = create_engine(f'sqlite:///{path}')
+        SQLModel.metadata.create_all(engine)
+        with engine.begin() as connection:
+            VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'a'}, {'id': 2, 'vehicle_id': 'b'}], connection=connection)
+            VehicleData.bulk_insert([
+                {
+                    'id': index + 1, 'timestamp': START + timedelta(seconds=index), 'speed': index,
+                    'odometer': 1000.0 + index, 'soc': 80, 'elevation': 0, 'shift_state': 'D', 'vehicle_list_id': 1,
+                }
+                for index in range(25)
+            ], connection=connection)
+            rebuild_row_counts(connection)
+            rebuild_rollups(connection)
+        engine.dispose()
+
+        async_engine = self.async_engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+        self.addCleanup(asyncio.run, async_engine.dispose())
+        count_cache.clear()
+        self.addCleanup(count_cache.clear)
+        vehicle_id_cache.clear()
+        self.addCleanup(vehicle_id_cache.clear)
+
+        async def session_override():
+            async with AsyncSession(async_engine) as session:
+                yield session
+
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.app.dependency_overrides[get_async_session] = session_override
+
+    def test_list_pages(self):
+        """Test that pages, counts and cursors come back through the async session."""
+        with TestClient(self.app) as client:
+            first = client.get('/vehicle_data/', params={'vehicle_id': 'a', 'limit': 10}).json()
+            second = client.get('/vehicle_data/', params={'vehicle_id': 'a', 'limit': 10, 'cursor': first['next_cursor']}).json()
+
+        self.assertEqual(first['count'], 25)
+        self.assertEqual([row['speed'] for row in first['data'] + second['data']], list(range(20)))
+
+    def test_list_timezone_aware_range(self):
+        """Test that initial and final with a UTC designator or offset filter and count in UTC."""
+        with TestClient(self.app) as client:
+            utc = client.get('/vehicle_data/', params={'vehicle_id': 'a', 'initial': '2022-07-12T16:00:20Z'})
+            offset = client.get('/vehicle_data/', params={
+                'vehicle_id': 'a', 'initial': '2022-07-12T18:00:10+02:00', 'final': '2022-07-12T18:00:14+02:00',
+            })
+
+        self.assertEqual(utc.status_code, 200)
+        self.assertEqual(utc.json()['count'], 5)
+        self.assertEqual([row['speed'] for row in utc.json()['data']], list(range(20, 25)))
+        self.assertEqual(offset.json()['count'], 5)
+        self.assertEqual([row['speed'] for row in offset.json()['data']], list(range(10, 15)))
+
+    def test_list_encoded_as_the_schema(self):
+        """Test that the pages encoded from column tuples read back as VehicleListOutputSchema unchanged."""
+        with TestClient(self.app) as client:
+            response = client.get('/vehicle_data/', params={'vehicle_id': 'a', 'limit': 10, 'page': 1})
+
+        self.assertEqual(response.headers['content-type'], 'application/json')
+        body = response.json()
+        self.assertEqual(VehicleListOutputSchema.model_validate(body).model_dump(mode='json'), body)
+        self.assertEqual(body['data'][0], {
+            'id': 11, 'timestamp': '2022-07-12T16:00:10', 'speed': 10, 'odometer': 1010.0, 'soc': 80,
+            'elevation': 0, 'shift_state': 'D',
+        })
+
+    def test_list_fields(self):
+        """Test that rows keep only the requested fields and the cursors still page."""
+        with TestClient(self.app) as client:
+            params = {'vehicle_id': 'a', 'limit': 10, 'fields': ['speed', 'soc', 'speed']}
+            first = client.get('/vehicle_data/', params=params).json()
+            second = client.get('/vehicle_data/', params={**params, 'cursor': first['next_cursor']}).json()
+            unknown = client.get('/vehicle_data/', params={'vehicle_id': 'a', 'fields': 'vehicle_list_id'})
+
+        self.assertEqual(first['data'][0], {'speed': 0, 'soc': 80})
+        self.assertEqual([row['speed'] for row in second['data']], list(range(10, 20)))
+        self.assertEqual(unknown.status_code, 422)
+
+    def test_export_fields(self):
+        """Test that an export holds only the requested columns."""
+        with TestClient(self.app) as client:
+            csv_export = client.get('/vehicle_data/export', params={'vehicle_id': 'a', 'export_type': 'CSV', 'fields': ['timestamp', 'speed']})
+            json_export = client.get('/vehicle_data/export', params={'vehicle_id': 'a', 'export_type': 'JSON', 'fields': 'soc'})
+
+        rows = list(csv.DictReader(csv_export.text.splitlines()))
+        self.assertEqual(rows[1], {'timestamp': '2022-07-12 16:00:01', 'speed': '1'})
+        self.assertEqual(json_export.json()[:2], [{'soc': 80}, {'soc': 80}])
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_list_arrow(self):
+        """Test that a page asked for as Arrow holds the requested columns with the count and cursors in headers."""
+        with TestClient(self.app) as client:
+            response = client.get(
+                '/vehicle_data/', params={'vehicle_id': 'a', 'limit': 10, 'page': 1, 'fields': ['timestamp', 'soc']},
+                headers={'Accept': ARROW_STREAM},
+            )
+
+        self.assertEqual(response.headers['content-type'], ARROW_STREAM)
+        self.assertEqual((response.headers['x-count'], 'x-next-cursor' in response.headers), ('25', True))
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.schema.names, ['timestamp', 'soc'])
+        self.assertEqual(table.column('timestamp')[0].as_py(), START + timedelta(seconds=10))
+        self.assertEqual(table.column('soc').to_pylist(), [80] * 10)
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_export_arrow(self):
+        """Test that an export asked for as Arrow streams every row in record batches."""
+        with TestClient(self.app) as client, mock.patch('vehicle.arrow.ARROW_BATCH_ROWS', 10):
+            response = client.get(
+                '/vehicle_data/export', params={'vehicle_id': 'a', 'export_type': 'CSV'},
+                headers={'Accept': f'{ARROW_STREAM}, application/json;q=0.5'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        batches = list(pa.ipc.open_stream(response.content))
+        self.assertEqual([batch.num_rows for batch in batches], [10, 10, 5])
+        table = pa.Table.from_batches(batches)
+        self.assertEqual(table.schema.field('odometer').type, pa.float64())
+        self.assertEqual(table.column('speed').to_pylist(), list(range(25)))
+
+    def test_vehicle_ids_row_and_export(self):
+        """Test the vehicle ids, a single row and a CSV export."""
+        with TestClient(self.app) as client:
+            self.assertEqual(client.get('/vehicle_data/vehicle_ids').json(), ['a', 'b'])
+            self.assertEqual(client.get('/vehicle_data/3/').json()['speed'], 2)
+            self.assertEqual(client.get('/vehicle_data/99/').status_code, 404)
+            response = client.get('/vehicle_data/export', params={'vehicle_id': 'a', 'export_type': 'CSV'})
+            self.assertEqual(client.get('/vehicle_data/export', params={'vehicle_id': 'c', 'export_type': 'CSV'}).status_code, 404)
+
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(response.text.splitlines()))
+        self.assertEqual([int(row['speed']) for row in rows], list(range(25)))
+
+    def test_list_not_modified(self):
+        """Test that a page is answered with 304 from the vehicle's version alone until ingest bumps it."""
+        statements = []
+        event.listen(self.async_engine.sync_engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        params = {'vehicle_id': 'a', 'limit': 10}
+        with TestClient(self.app) as client:
+            first = client.get('/vehicle_data/', params=params)
+            statements.clear()
+            cached = client.get('/vehicle_data/', params=params, headers={'If-None-Match': first.headers['etag']})
+            not_modified_statements = list(statements)
+            other_page = client.get('/vehicle_data/', params={**params, 'page': 1}, headers={'If-None-Match': first.headers['etag']})
+
+            engine = create_engine(f'sqlite:///{self.path}')
+            with engine.begin() as connection:
+                record_row_counts(connection, 1, 1)
+            engine.dispose()
+            changed = client.get('/vehicle_data/', params=params, headers={'If-None-Match': first.headers['etag']})
+
+        self.assertTrue(first.headers['etag'].startswith('W/"1-'))
+        self.assertIn('last-modified', first.headers)
+        self.assertEqual((cached.status_code, cached.content), (304, b''))
+        self.assertEqual(cached.headers['etag'], first.headers['etag'])
+        self.assertFalse([statement for statement in not_modified_statements if 'vehicledata' in statement])
+        self.assertEqual(other_page.status_code, 200)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['etag'], first.headers['etag'])
+
+    def test_vehicle_ids_not_modified(self):
+        """Test that the vehicle ids are answered with 304 until a vehicle is added."""
+        with TestClient(self.app) as client:
+            first = client.get('/vehicle_data/vehicle_ids')
+            cached = client.get('/vehicle_data/vehicle_ids', headers={'If-None-Match': first.headers['etag']})
+
+            engine = create_engine(f'sqlite:///{self.path}')
+            with engine.begin() as connection:
+                VehicleList.bulk_insert([{'id': 3, 'vehicle_id': 'c'}], connection=connection)
+                bump_dataset_version(connection, VEHICLE_LIST)
+            engine.dispose()
+            changed = client.get('/vehicle_data/vehicle_ids', headers={'If-None-Match': first.headers['etag']})
+
+        self.assertEqual(first.headers['etag'], 'W/"0"')
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual((changed.status_code, changed.json()), (200, ['a', 'b', 'c']))
+        self.assertEqual(changed.headers['etag'], 'W/"1"')
+
+    def test_concurrent_requests(self):
+        """Test that many requests in flight on one event loop each get their own page."""
+        async def fetch_all():
+            transport = httpx.ASGITransport(app=self.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                return await asyncio.gather(*(
+                    client.get('/vehicle_data/', params={'vehicle_id': 'a', 'limit': 5, 'page': index % 5})
+                    for index in range(50)
+                ))
+
+        responses = asyncio.run(fetch_all())
+
+        for index, response in enumerate(responses):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['data'][0]['speed'], index % 5 * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
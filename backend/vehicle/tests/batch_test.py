@@ -0,0 +1,136 @@
+import unittest
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+
+from database import get_session
+from vehicle.cache import vehicle_id_cache
+from vehicle.model import VehicleData, VehicleList
+from vehicle.rollups import rebuild_rollups
+from vehicle.router import router
+
+
+START = datetime(2022, 7, 12, 22, 0, 0)
+VEHICLES = 12
+
+
+class TestBatchEndpoint(unittest.TestCase):
+    """Test cases for the fleet batch endpoint against an in-memory SQLite database."""
+
+    def setUp(self):
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        SQLModel.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        vehicle_id_cache.clear()
+        self.addCleanup(vehicle_id_cache.clear)
+
+        # One row every 50 seconds over four hours across midnight, each vehicle offset by its id
+        self.rows = [
+            {
+                'id': vehicle * 1000 + index,
+                'timestamp': START + timedelta(seconds=50 * index + vehicle),
+                'speed': (index * vehicle) % 130,
+                'odometer': 1000.0 * vehicle + index,
+                'soc': 100 - index // 5,
+                'elevation': 0,
+                'shift_state': 'D',
+                'vehicle_list_id': vehicle,
+            }
+            for vehicle in range(1, VEHICLES + 1)
+            for index in range(288)
+        ]
+        with engine.begin() as connection:
+            VehicleList.bulk_insert(
+                [{'id': vehicle, 'vehicle_id': f'v{vehicle}'} for vehicle in range(1, VEHICLES + 1)], connection=connection,
+            )
+            VehicleData.bulk_insert(self.rows, connection=connection)
+            rebuild_rollups(connection)
+
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', lambda *args: self.statements.append(args[2]))
+
+        def session_override():
+            with Session(engine) as session:
+                yield session
+
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.app.dependency_overrides[get_session] = session_override
+        self.client = TestClient(self.app)
+
+    def expected_summary(self, vehicle, initial, final):
+        rows = [row for row in self.rows if row['vehicle_list_id'] == vehicle and initial <= row['timestamp'] <= final]
+        return {
+            'rows': len(rows),
+            'avg_speed': sum(row['speed'] for row in rows) / len(rows),
+            'min_soc': min(row['soc'] for row in rows),
+            'max_soc': max(row['soc'] for row in rows),
+            'last_odometer': max(row['odometer'] for row in rows),
+        }
+
+    def test_summaries_and_latest_rows_of_the_fleet(self):
+        """Test that every vehicle gets its summary over the range and its latest rows, with few statements."""
+        initial, final = START + timedelta(minutes=17, seconds=3), START + timedelta(hours=3, minutes=2, seconds=30)
+        vehicle_ids = [f'v{vehicle}' for vehicle in range(VEHICLES, 0, -1)] + ['unknown']
+
+        response = self.client.post('/vehicle_data/batch', json={
+            'vehicle_ids': vehicle_ids, 'initial': initial.isoformat(), 'final': final.isoformat(), 'latest': 3,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['missing'], ['unknown'])
+        self.assertEqual([vehicle['vehicle_id'] for vehicle in body['vehicles']], vehicle_ids[:-1])
+        for vehicle in body['vehicles']:
+            vehicle_record_id = int(vehicle['vehicle_id'][1:])
+            with self.subTest(vehicle=vehicle['vehicle_id']):
+                expected = self.expected_summary(vehicle_record_id, initial, final)
+                self.assertAlmostEqual(vehicle['summary'].pop('avg_speed'), expected.pop('avg_speed'))
+                self.assertEqual(vehicle['summary'], expected)
+                latest = sorted(
+                    (row for row in self.rows if row['vehicle_list_id'] == vehicle_record_id and row['timestamp'] <= final),
+                    key=lambda row: row['timestamp'], reverse=True,
+                )[:3]
+                self.assertEqual([row['id'] for row in vehicle['data']], [row['id'] for row in latest])
+        # Id lookup, latest rows and one statement per part of the range
+        self.assertLessEqual(len(self.statements), 9)
+
+    def test_timezone_aware_range(self):
+        """Test that a range with a UTC designator or offset is summarised in UTC."""
+        initial, final = START + timedelta(minutes=17, seconds=3), START + timedelta(hours=3, minutes=2, seconds=30)
+        expected = self.expected_summary(1, initial, final)
+        for offset in ('Z', '+02:00'):
+            hours = 2 if offset == '+02:00' else 0
+            response = self.client.post('/vehicle_data/batch', json={
+                'vehicle_ids': ['v1'], 'latest': 1,
+                'initial': (initial + timedelta(hours=hours)).isoformat() + offset,
+                'final': (final + timedelta(hours=hours)).isoformat() + offset,
+            })
+
+            with self.subTest(offset=offset):
+                self.assertEqual(response.status_code, 200)
+                vehicle = response.json()['vehicles'][0]
+                self.assertAlmostEqual(vehicle['summary'].pop('avg_speed'), expected['avg_speed'])
+                self.assertEqual(vehicle['summary'], {name: value for name, value in expected.items() if name != 'avg_speed'})
+                self.assertLessEqual(vehicle['data'][0]['timestamp'], final.isoformat())
+
+    def test_without_summary_or_rows(self):
+        """Test that the summary and the latest rows can each be left out."""
+        response = self.client.post('/vehicle_data/batch', json={'vehicle_ids': ['v1', 'v1'], 'latest': 0, 'summary': False})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'vehicles': [{'vehicle_id': 'v1', 'summary': None, 'data': []}], 'missing': []})
+
+    def test_too_many_vehicles(self):
+        """Test that a batch over the vehicle limit is rejected."""
+        response = self.client.post('/vehicle_data/batch', json={'vehicle_ids': [f'v{index}' for index in range(501)]})
+
+        self.assertEqual(response.status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
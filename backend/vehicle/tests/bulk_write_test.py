@@ -0,0 +1,91 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+from vehicle.model import VehicleData, VehicleList
+
+
+class TestBulkWrites(unittest.TestCase):
+    """Test cases for the BaseDataModel bulk write primitives against an in-memory SQLite database."""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        SQLModel.metadata.create_all(self.engine)
+        self.connection = self.engine.connect()
+        self.addCleanup(self.engine.dispose)
+        self.addCleanup(self.connection.close)
+
+    def test_bulk_insert_from_tuples(self):
+        """Test that tuples follow the table column order without the id."""
+        rows = [
+            (datetime(2022, 7, 12, 16, 0, second), second, 100.0 + second, 80, 5, 'D', 1)
+            for second in range(3)
+        ]
+        inserted = VehicleData.bulk_insert(rows, connection=self.connection)
+
+        self.assertEqual(inserted, 3)
+        stored = self.connection.execute(select(VehicleData.speed, VehicleData.odometer).order_by(VehicleData.id)).all()
+        self.assertEqual(stored, [(0, 100.0), (1, 101.0), (2, 102.0)])
+
+    def test_bulk_insert_returning_ids_in_input_order(self):
+        """Test that generated primary keys are returned without re-selecting rows."""
+        ids = VehicleList.bulk_insert_returning_ids(
+            [{'vehicle_id': 'a'}, {'vehicle_id': 'b'}, {'vehicle_id': 'c'}], connection=self.connection, chunk_size=2,
+        )
+
+        self.assertEqual(ids, [1, 2, 3])
+        stored = dict(self.connection.execute(select(VehicleList.id, VehicleList.vehicle_id)).all())
+        self.assertEqual(stored, {1: 'a', 2: 'b', 3: 'c'})
+
+    def test_bulk_insert_returning_ids_without_returning_support(self):
+        """Test that ids are derived from the first id of each multi-row insert on MySQL."""
+        connection = mock.Mock()
+        connection.dialect.insert_executemany_returning_sort_by_parameter_order = False
+        connection.execute.side_effect = [mock.Mock(lastrowid=10), mock.Mock(lastrowid=20)]
+
+        ids = VehicleList.bulk_insert_returning_ids(
+            [('a',), ('b',), ('c',)], connection=connection, chunk_size=2,
+        )
+
+        self.assertEqual(ids, [10, 11, 20])
+
+    def test_bulk_upsert_updates_existing_rows(self):
+        """Test that rows with an existing key are updated and new ones inserted."""
+        VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'old'}], connection=self.connection)
+
+        VehicleList.bulk_upsert(
+            [{'id': 1, 'vehicle_id': 'renamed'}, {'id': 2, 'vehicle_id': 'new'}], connection=self.connection,
+        )
+
+        stored = dict(self.connection.execute(select(VehicleList.id, VehicleList.vehicle_id)).all())
+        self.assertEqual(stored, {1: 'renamed', 2: 'new'})
+
+    def test_bulk_upsert_on_mysql_uses_on_duplicate_key(self):
+        """Test the statement built for MySQL."""
+        connection = mock.Mock()
+        connection.dialect.name = 'mysql'
+
+        VehicleList.bulk_upsert([{'id': 1, 'vehicle_id': 'a'}], connection=connection)
+
+        statement = connection.execute.call_args[0][0]
+        sql = str(statement.compile(dialect=mysql.dialect()))
+        self.assertIn('ON DUPLICATE KEY UPDATE vehicle_id = VALUES(vehicle_id)', sql)
+
+    def test_chunks_respect_packet_limit(self):
+        """Test that chunks shrink when rows would exceed the packet limit."""
+        connection = mock.Mock()
+        rows = [{'vehicle_id': 'x' * 100} for _ in range(10)]
+
+        with mock.patch('database.DB_MAX_PACKET_BYTES', 350):
+            VehicleList.bulk_insert(rows, connection=connection, chunk_size=1000)
+
+        self.assertEqual([len(call.args[1]) for call in connection.execute.call_args_list], [3, 3, 3, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,255 +1,311 @@
+import hashlib
 import os
-import pandas as pd
+import tempfile
 import unittest
 from unittest import mock
 
+from vehicle.model import IngestCheckpoint
 from vehicle.service import load_data_from_folder
 
 
+CSV_HEADER = 'timestamp,speed,odometer,soc,elevation,shift_state\n'
+
+
 class TestLoadDataFromFolder(unittest.TestCase):
     """Test cases for load_data_from_folder function with all database calls mocked."""
 
-    @mock.patch('vehicle.service.glob.glob')
-    @mock.patch('vehicle.model.VehicleList.save_all')
-    @mock.patch('vehicle.model.VehicleData.save_all')
-    def test_no_csv_files_found(self, mock_data_save_all, mock_list_save_all, mock_glob):
+    def setUp(self):
+        """Create a temporary data folder and mock every database call made by the ingest."""
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        self.data_path = data_dir.name
+
+        patchers = {
+            'data_path': mock.patch('vehicle.service.DATA_PATH', self.data_path),
+            'session': mock.patch('vehicle.service.Session'),
+            'engine': mock.patch('vehicle.service.engine'),
+            'load_checkpoints': mock.patch('vehicle.service.load_checkpoints', return_value={}),
+            'register_new_files': mock.patch('vehicle.service.register_new_files', side_effect=self.register_new_files),
+            'adopt_loaded_files': mock.patch('vehicle.service.adopt_loaded_files', side_effect=self.adopt_loaded_files),
+            'commit_chunk': mock.patch('vehicle.service.commit_chunk', side_effect=self.commit_chunk),
+        }
+        self.mocks = {name: patcher.start() for name, patcher in patchers.items()}
+        for patcher in patchers.values():
+            self.addCleanup(patcher.stop)
+
+        # No vehicles in the database yet
+        mock_session = self.mocks['session'].return_value.__enter__.return_value
+        mock_session.exec.return_value.all.return_value = []
+
+        self.committed = []
+
+    def register_new_files(self, file_ids):
+        """Fake registration that assigns sequential VehicleList ids."""
+        return {
+            file_id: IngestCheckpoint(id=index, file_name=file_id, vehicle_list_id=index)
+            for index, file_id in enumerate(file_ids, start=1)
+        }
+
+    def adopt_loaded_files(self, loaded_files):
+        """Fake adoption that checkpoints loaded files at their current size."""
+        return {
+            file_id: IngestCheckpoint(id=100 + vehicle_list_id, file_name=file_id, vehicle_list_id=vehicle_list_id, byte_offset=file_size)
+            for file_id, (vehicle_list_id, file_size) in loaded_files.items()
+        }
+
+    def commit_chunk(self, connection, checkpoint_id, chunk, end_offset):
+        """Fake chunk commit that records what would have been written."""
+        self.committed.append({
+            'checkpoint_id': checkpoint_id, 'columns': chunk.columns, 'rejected': chunk.rejected,
+            'end_offset': end_offset, 'max_odometer': chunk.max_odometer,
+        })
+        return len(chunk.columns['timestamp'])
+
+    def write_csv(self, name, rows):
+        """Write a telemetry CSV file into the temporary data folder."""
+        path = os.path.join(self.data_path, name)
+        with open(path, 'w') as csv_file:
+            csv_file.write(CSV_HEADER)
+            csv_file.writelines(row + '\n' for row in rows)
+        return path
+
+    def test_no_csv_files_found(self):
         """Test that function handles empty directory gracefully."""
-        # Setup: No CSV files found
-        mock_glob.return_value = []
-        
         # Execute
-        load_data_from_folder()
-        
+        stats = load_data_from_folder()
+
         # Assertions
-        mock_list_save_all.assert_not_called()
-        mock_data_save_all.assert_not_called()
-
-    @mock.patch('vehicle.service.glob.glob')
-    @mock.patch('vehicle.service.pd.read_csv')
-    @mock.patch('vehicle.model.VehicleList.save_all')
-    @mock.patch('vehicle.model.VehicleData.save_all')
-    def test_single_valid_csv_file(self, mock_data_save_all, mock_list_save_all, mock_read_csv, mock_glob):
+        self.mocks['register_new_files'].assert_not_called()
+        self.mocks['commit_chunk'].assert_not_called()
+        self.assertEqual(stats.rows, 0)
+
+    def test_single_valid_csv_file(self):
         """Test successful processing of one valid CSV file."""
         # Setup: Single CSV file with valid data
-        mock_glob.return_value = ['/fake/path/vehicle1.csv']
-        mock_df = pd.DataFrame({
-            'timestamp': ['2025-08-23T12:00:00Z', '2025-08-23T12:01:00Z'],
-            'speed': [50, 60],
-            'odometer': [1000.5, 1001.0],
-            'soc': [80, 79],
-            'elevation': [200, 210],
-            'shift_state': ['D', 'D']
-        })
-        mock_read_csv.return_value = mock_df
-        mock_saved_vehicle = mock.Mock(id=1)
-        mock_list_save_all.return_value = [mock_saved_vehicle]
-        
+        path = self.write_csv('vehicle1.csv', [
+            '2025-08-23T12:00:00Z,50,1000.5,80,200,D',
+            '2025-08-23T12:01:00Z,60,1001.0,79,210,D',
+        ])
+
         # Execute
-        load_data_from_folder()
-        
+        stats = load_data_from_folder()
+
         # Assertions
-        mock_list_save_all.assert_called_once()
-        mock_data_save_all.assert_called_once()
-        
-        # Verify VehicleList.save_all was called with correct data
-        vehicle_list_arg = mock_list_save_all.call_args[0][0]
-        self.assertEqual(len(vehicle_list_arg), 1)
-        self.assertEqual(vehicle_list_arg[0].vehicle_id, 'vehicle1')
-        
-        # Verify VehicleData.save_all was called with correct data
-        vehicle_data_arg = mock_data_save_all.call_args[0][0]
-        self.assertEqual(len(vehicle_data_arg), 2)  # 2 rows in DataFrame
-        self.assertEqual(vehicle_data_arg[0].vehicle_list_id, 1)
-        self.assertEqual(vehicle_data_arg[1].vehicle_list_id, 1)
-
-    @mock.patch('vehicle.service.glob.glob')
-    @mock.patch('vehicle.service.pd.read_csv')
-    @mock.patch('vehicle.model.VehicleList.save_all')
-    @mock.patch('vehicle.model.VehicleData.save_all')
-    def test_multiple_csv_files(self, mock_data_save_all, mock_list_save_all, mock_read_csv, mock_glob):
+        self.mocks['register_new_files'].assert_called_once_with(['vehicle1'])
+        self.assertEqual(len(self.committed), 1)
+        self.assertEqual(stats.rows, 2)
+        self.assertEqual(stats.files, 1)
+
+        # Verify the chunk was written for the registered vehicle and checkpointed at the end of the file
+        chunk = self.committed[0]
+        self.assertEqual(chunk['columns']['vehicle_list_id'], [1, 1])
+        self.assertEqual(chunk['end_offset'], os.path.getsize(path))
+
+    def test_multiple_csv_files(self):
         """Test processing multiple CSV files."""
         # Setup: Multiple CSV files
-        mock_glob.return_value = ['/fake/path/vehicle1.csv', '/fake/path/vehicle2.csv']
-        mock_df1 = pd.DataFrame({
-            'timestamp': ['2025-08-23T12:00:00Z'],
-            'speed': [50],
-            'odometer': [1000.5],
-            'soc': [80],
-            'elevation': [200],
-            'shift_state': ['D']
-        })
-        mock_df2 = pd.DataFrame({
-            'timestamp': ['2025-08-23T13:00:00Z'],
-            'speed': [40],
-            'odometer': [2000.0],
-            'soc': [70],
-            'elevation': [150],
-            'shift_state': ['P']
-        })
-        mock_read_csv.side_effect = [mock_df1, mock_df2]
-        mock_saved_vehicle1 = mock.Mock(id=1)
-        mock_saved_vehicle2 = mock.Mock(id=2)
-        mock_list_save_all.return_value = [mock_saved_vehicle1, mock_saved_vehicle2]
-        
+        self.write_csv('vehicle1.csv', ['2025-08-23T12:00:00Z,50,1000.5,80,200,D'])
+        self.write_csv('vehicle2.csv', ['2025-08-23T13:00:00Z,40,2000.0,70,150,P'])
+
         # Execute
-        load_data_from_folder()
-        
+        stats = load_data_from_folder()
+
         # Assertions
-        mock_list_save_all.assert_called_once()
-        mock_data_save_all.assert_called_once()
-        
-        # Verify correct number of VehicleList objects
-        vehicle_list_arg = mock_list_save_all.call_args[0][0]
-        self.assertEqual(len(vehicle_list_arg), 2)
-        self.assertEqual(vehicle_list_arg[0].vehicle_id, 'vehicle1')
-        self.assertEqual(vehicle_list_arg[1].vehicle_id, 'vehicle2')
-        
-        # Verify all VehicleData objects have proper vehicle_list_id assignments
-        vehicle_data_arg = mock_data_save_all.call_args[0][0]
-        self.assertEqual(len(vehicle_data_arg), 2)  # 1 row from each file
-        self.assertEqual(vehicle_data_arg[0].vehicle_list_id, 1)  # First vehicle
-        self.assertEqual(vehicle_data_arg[1].vehicle_list_id, 2)  # Second vehicle
-
-    @mock.patch('vehicle.service.glob.glob')
-    @mock.patch('vehicle.service.pd.read_csv')
-    @mock.patch('vehicle.model.VehicleList.save_all')
-    @mock.patch('vehicle.model.VehicleData.save_all')
-    def test_csv_with_missing_values(self, mock_data_save_all, mock_list_save_all, mock_read_csv, mock_glob):
-        """Test handling of NaN/None values in CSV."""
-        # Setup: CSV with NaN values
-        mock_glob.return_value = ['/fake/path/vehicle_with_nans.csv']
-        mock_df = pd.DataFrame({
-            'timestamp': ['2025-08-23T12:00:00Z', '2025-08-23T12:01:00Z'],
-            'speed': [50, pd.NA],
-            'odometer': [1000.5, pd.NA],
-            'soc': [pd.NA, 70],
-            'elevation': [200, pd.NA],
-            'shift_state': ['D', pd.NA]
-        })
-        mock_read_csv.return_value = mock_df
-        mock_saved_vehicle = mock.Mock(id=1)
-        mock_list_save_all.return_value = [mock_saved_vehicle]
-        
+        registered = self.mocks['register_new_files'].call_args[0][0]
+        self.assertEqual(sorted(registered), ['vehicle1', 'vehicle2'])
+        self.assertEqual(stats.files, 2)
+
+        # Verify every file was written against its own vehicle
+        written = {chunk['checkpoint_id']: chunk['columns'] for chunk in self.committed}
+        self.assertEqual(len(written), 2)
+        for checkpoint_id, columns in written.items():
+            self.assertEqual(columns['vehicle_list_id'], [checkpoint_id])
+
+    def test_csv_with_missing_values(self):
+        """Test handling of NULL values in CSV."""
+        # Setup: CSV with NULL sentinels and empty cells
+        self.write_csv('vehicle_with_nans.csv', [
+            '2025-08-23T12:00:00Z,50,1000.5,NULL,200,D',
+            '2025-08-23T12:01:00Z,,NULL,70,,NULL',
+        ])
+
         # Execute
         load_data_from_folder()
-        
-        # Assertions
-        mock_list_save_all.assert_called_once()
-        mock_data_save_all.assert_called_once()
-        
-        # Verify NaN values converted to None in VehicleData objects
-        vehicle_data_arg = mock_data_save_all.call_args[0][0]
-        self.assertEqual(len(vehicle_data_arg), 2)
-        
-        # First row: speed=50, others have values
-        self.assertEqual(vehicle_data_arg[0].speed, 50)
-        self.assertEqual(vehicle_data_arg[0].odometer, 1000.5)
-        self.assertIsNone(vehicle_data_arg[0].soc)  # NaN -> None
-        self.assertEqual(vehicle_data_arg[0].elevation, 200)
-        self.assertEqual(vehicle_data_arg[0].shift_state, 'D')
-        
+
+        # Verify missing values converted to None in the written columns
+        columns = self.committed[0]['columns']
+        self.assertEqual(len(columns['timestamp']), 2)
+
+        # First row: speed=50, soc missing
+        self.assertEqual(columns['speed'][0], 50)
+        self.assertEqual(columns['odometer'][0], 1000.5)
+        self.assertIsNone(columns['soc'][0])  # NULL -> None
+        self.assertEqual(columns['elevation'][0], 200)
+        self.assertEqual(columns['shift_state'][0], 'D')
+
         # Second row: speed=None, soc=70, others are None
-        self.assertIsNone(vehicle_data_arg[1].speed)  # NaN -> None
-        self.assertIsNone(vehicle_data_arg[1].odometer)  # NaN -> None
-        self.assertEqual(vehicle_data_arg[1].soc, 70)
-        self.assertIsNone(vehicle_data_arg[1].elevation)  # NaN -> None
-        self.assertIsNone(vehicle_data_arg[1].shift_state)  # NaN -> None
-
-    @mock.patch('vehicle.service.glob.glob')
-    @mock.patch('vehicle.service.pd.read_csv')
-    @mock.patch('vehicle.model.VehicleList.save_all')
-    @mock.patch('vehicle.model.VehicleData.save_all')
-    def test_csv_with_mixed_data_types(self, mock_data_save_all, mock_list_save_all, mock_read_csv, mock_glob):
+        self.assertIsNone(columns['speed'][1])  # Empty -> None
+        self.assertIsNone(columns['odometer'][1])  # NULL -> None
+        self.assertEqual(columns['soc'][1], 70)
+        self.assertIsNone(columns['elevation'][1])  # Empty -> None
+        self.assertIsNone(columns['shift_state'][1])  # NULL -> None
+
+    def test_csv_with_mixed_data_types(self):
         """Test type conversion handling."""
-        # Setup: CSV with mixed data types
-        mock_glob.return_value = ['/fake/path/mixed_types.csv']
-        mock_df = pd.DataFrame({
-            'timestamp': ['2025-08-23T12:00:00Z'],
-            'speed': ['50'],  # String number
-            'odometer': [1000],  # Integer instead of float
-            'soc': [80.5],  # Float instead of int
-            'elevation': ['200'],  # String number
-            'shift_state': ['D']
-        })
-        mock_read_csv.return_value = mock_df
-        mock_saved_vehicle = mock.Mock(id=1)
-        mock_list_save_all.return_value = [mock_saved_vehicle]
-        
+        # Setup: CSV with an integer odometer and a fractional soc
+        self.write_csv('mixed_types.csv', ['2025-08-23T12:00:00Z,50,1000,80.5,200,D'])
+
         # Execute
         load_data_from_folder()
-        
-        # Assertions
-        vehicle_data_arg = mock_data_save_all.call_args[0][0]
-        self.assertEqual(len(vehicle_data_arg), 1)
-        
-        # Verify correct data types in VehicleData objects
-        vehicle_data = vehicle_data_arg[0]
-        self.assertEqual(vehicle_data.speed, 50)  # int conversion
-        self.assertEqual(vehicle_data.odometer, 1000.0)  # float conversion
-        self.assertEqual(vehicle_data.soc, 80)  # int conversion from float
-        self.assertEqual(vehicle_data.elevation, 200)  # int conversion
-        self.assertEqual(vehicle_data.shift_state, 'D')  # string
-
-    @mock.patch('vehicle.service.glob.glob')
-    @mock.patch('vehicle.service.pd.read_csv')
-    @mock.patch('vehicle.model.VehicleList.save_all')
-    @mock.patch('vehicle.model.VehicleData.save_all')
-    def test_invalid_timestamp_format(self, mock_data_save_all, mock_list_save_all, mock_read_csv, mock_glob):
+
+        # Verify correct data types in the written columns
+        columns = self.committed[0]['columns']
+        self.assertEqual(columns['speed'][0], 50)  # int conversion
+        self.assertEqual(columns['odometer'][0], 1000.0)  # float conversion
+        self.assertIsInstance(columns['odometer'][0], float)
+        self.assertEqual(columns['soc'][0], 80)  # int conversion from float
+        self.assertEqual(columns['elevation'][0], 200)  # int conversion
+        self.assertEqual(columns['shift_state'][0], 'D')  # string
+
+    def test_invalid_timestamp_format(self):
         """Test handling of malformed timestamp data."""
         # Setup: CSV with invalid timestamp
-        mock_glob.return_value = ['/fake/path/invalid_timestamp.csv']
-        mock_df = pd.DataFrame({
-            'timestamp': ['invalid-timestamp'],
-            'speed': [50],
-            'odometer': [1000.5],
-            'soc': [80],
-            'elevation': [200],
-            'shift_state': ['D']
-        })
-        mock_read_csv.return_value = mock_df
-        mock_saved_vehicle = mock.Mock(id=1)
-        mock_list_save_all.return_value = [mock_saved_vehicle]
-        
-        # Execute and expect pandas to handle the invalid timestamp
-        # (pd.to_datetime will either parse it or raise an exception)
+        self.write_csv('invalid_timestamp.csv', ['invalid-timestamp,50,1000.5,80,200,D'])
+
+        # Execute and expect pandas to reject the invalid timestamp before anything is written
         with self.assertRaises(Exception):  # Could be ValueError or other pandas exception
             load_data_from_folder()
+        self.mocks['commit_chunk'].assert_not_called()
 
-    @mock.patch('vehicle.service.glob.glob')
-    @mock.patch('vehicle.service.pd.read_csv')
-    @mock.patch('vehicle.model.VehicleList.save_all')
-    @mock.patch('vehicle.model.VehicleData.save_all')
-    def test_vehicle_id_extraction(self, mock_data_save_all, mock_list_save_all, mock_read_csv, mock_glob):
+    def test_vehicle_id_extraction(self):
         """Test correct vehicle ID extraction from filename."""
         # Setup: Various filename patterns
-        mock_glob.return_value = [
-            '/path/to/vehicle_123.csv',
-            '/another/path/abc-def-456.csv',
-            '/simple/test.csv'
-        ]
-        mock_df = pd.DataFrame({
-            'timestamp': ['2025-08-23T12:00:00Z'],
-            'speed': [50],
-            'odometer': [1000.5],
-            'soc': [80],
-            'elevation': [200],
-            'shift_state': ['D']
-        })
-        mock_read_csv.return_value = mock_df
-        mock_saved_vehicles = [mock.Mock(id=1), mock.Mock(id=2), mock.Mock(id=3)]
-        mock_list_save_all.return_value = mock_saved_vehicles
-        
+        for name in ['vehicle_123.csv', 'abc-def-456.csv', 'test.csv']:
+            self.write_csv(name, ['2025-08-23T12:00:00Z,50,1000.5,80,200,D'])
+
         # Execute
         load_data_from_folder()
-        
-        # Assertions - verify correct vehicle IDs extracted
-        vehicle_list_arg = mock_list_save_all.call_args[0][0]
-        self.assertEqual(len(vehicle_list_arg), 3)
-        
-        # Check vehicle IDs (filename without .csv extension)
-        self.assertEqual(vehicle_list_arg[0].vehicle_id, 'vehicle_123')
-        self.assertEqual(vehicle_list_arg[1].vehicle_id, 'abc-def-456')
-        self.assertEqual(vehicle_list_arg[2].vehicle_id, 'test')
+
+        # Assertions - verify correct vehicle IDs extracted (filename without .csv extension)
+        registered = self.mocks['register_new_files'].call_args[0][0]
+        self.assertEqual(sorted(registered), ['abc-def-456', 'test', 'vehicle_123'])
+
+    def test_existing_vehicle_without_checkpoint_is_adopted(self):
+        """Test that vehicles loaded before the manifest existed are checkpointed at their current size."""
+        path = self.write_csv('vehicle1.csv', ['2025-08-23T12:00:00Z,50,1000.5,80,200,D'])
+        mock_session = self.mocks['session'].return_value.__enter__.return_value
+        mock_session.exec.return_value.all.return_value = [('vehicle1', 4)]
+
+        stats = load_data_from_folder()
+
+        self.mocks['register_new_files'].assert_called_once_with([])
+        self.mocks['adopt_loaded_files'].assert_called_once_with({'vehicle1': (4, os.path.getsize(path))})
+        self.assertEqual(stats.rows, 0)
+
+    def test_resume_from_checkpoint(self):
+        """Test that an interrupted file resumes after the last committed chunk."""
+        first_row = '2025-08-23T12:00:00Z,50,1000.5,80,200,D'
+        path = self.write_csv('vehicle1.csv', [first_row, '2025-08-23T12:01:00Z,60,1001.0,79,210,D'])
+        committed_offset = len(CSV_HEADER) + len(first_row) + 1
+        self.mocks['load_checkpoints'].return_value = {
+            'vehicle1': IngestCheckpoint(id=5, file_name='vehicle1', vehicle_list_id=3, byte_offset=committed_offset, rows_committed=1),
+        }
+
+        stats = load_data_from_folder()
+
+        self.assertEqual(stats.rows, 1)
+        chunk = self.committed[0]
+        self.assertEqual(chunk['checkpoint_id'], 5)
+        self.assertEqual(chunk['columns']['speed'], [60])
+        self.assertEqual(chunk['end_offset'], os.path.getsize(path))
+
+    def test_invalid_rows_are_quarantined(self):
+        """Test that rows breaking a quality rule are split off and counted."""
+        self.write_csv('vehicle1.csv', [
+            '2025-08-23T12:00:00Z,50,1000.5,80,200,D',
+            '2025-08-23T12:01:00Z,-3,1001.0,79,210,D',
+            '2025-08-23T12:02:00Z,40,1001.5,140,210,D',
+        ])
+
+        stats = load_data_from_folder()
+
+        self.assertEqual(stats.rows, 1)
+        self.assertEqual(stats.rows_rejected, 2)
+        self.assertEqual(self.committed[0]['rejected']['reason'], ['NEGATIVE_SPEED', 'SOC_OUT_OF_RANGE'])
+
+    def test_resume_carries_validation_state(self):
+        """Test that a resumed file is validated against the odometer of the committed rows."""
+        first_row = '2025-08-23T12:00:00Z,50,1000.5,80,200,D'
+        self.write_csv('vehicle1.csv', [first_row, '2025-08-23T12:01:00Z,60,999.0,79,210,D'])
+        self.mocks['load_checkpoints'].return_value = {
+            'vehicle1': IngestCheckpoint(
+                id=5, file_name='vehicle1', vehicle_list_id=3, byte_offset=len(CSV_HEADER) + len(first_row) + 1,
+                rows_committed=1, max_odometer=1000.5,
+            ),
+        }
+
+        stats = load_data_from_folder()
+
+        self.assertEqual(stats.rows, 0)
+        self.assertEqual(self.committed[0]['rejected']['reason'], ['ODOMETER_BACKWARDS'])
+        self.assertEqual(self.committed[0]['max_odometer'], 1000.5)
+
+    def manifest_entry(self, path, **overrides):
+        """Build the manifest entry recorded after a file was fully committed."""
+        file_stat = os.stat(path)
+        with open(path, 'rb') as csv_file:
+            head = csv_file.read()
+        entry = {
+            'id': 1, 'file_name': 'vehicle1', 'vehicle_list_id': 1,
+            'byte_offset': file_stat.st_size, 'rows_committed': 1,
+            'file_size': file_stat.st_size, 'file_mtime': file_stat.st_mtime,
+            'content_hash': hashlib.sha256(head).hexdigest(), 'hashed_bytes': len(head),
+        }
+        entry.update(overrides)
+        return IngestCheckpoint(**entry)
+
+    def test_completed_file_is_skipped(self):
+        """Test that a fully committed file is not read again."""
+        path = self.write_csv('vehicle1.csv', ['2025-08-23T12:00:00Z,50,1000.5,80,200,D'])
+        self.mocks['load_checkpoints'].return_value = {'vehicle1': self.manifest_entry(path)}
+
+        with mock.patch('vehicle.service.file_head_hash') as mock_hash:
+            stats = load_data_from_folder()
+
+        # Unchanged files are decided from their stat alone
+        mock_hash.assert_not_called()
+        self.mocks['commit_chunk'].assert_not_called()
+        self.mocks['session'].assert_not_called()
+        self.assertEqual(stats.files, 0)
+
+    def test_appended_rows_are_loaded(self):
+        """Test that only the rows appended after the last run are read."""
+        path = self.write_csv('vehicle1.csv', ['2025-08-23T12:00:00Z,50,1000.5,80,200,D'])
+        entry = self.manifest_entry(path)
+        with open(path, 'a') as csv_file:
+            csv_file.write('2025-08-23T12:01:00Z,61,1001.0,79,210,D\n')
+        self.mocks['load_checkpoints'].return_value = {'vehicle1': entry}
+
+        stats = load_data_from_folder()
+
+        self.assertEqual(stats.rows, 1)
+        self.assertEqual(self.committed[0]['columns']['speed'], [61])
+        self.assertEqual(self.committed[0]['end_offset'], os.path.getsize(path))
+
+    def test_rewritten_file_is_skipped(self):
+        """Test that a file whose loaded head changed is reported instead of appended."""
+        path = self.write_csv('vehicle1.csv', ['2025-08-23T12:00:00Z,50,1000.5,80,200,D'])
+        entry = self.manifest_entry(path)
+        self.write_csv('vehicle1.csv', [
+            '2025-09-01T08:00:00Z,10,2000.5,80,200,D',
+            '2025-09-01T08:01:00Z,11,2000.6,80,200,D',
+        ])
+        self.mocks['load_checkpoints'].return_value = {'vehicle1': entry}
+
+        stats = load_data_from_folder()
+
+        self.mocks['commit_chunk'].assert_not_called()
+        self.assertEqual(stats.files_rewritten, 1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from database import PoolMetrics
+from metrics import router
+
+
+class TestPoolMetrics(unittest.TestCase):
+    """Test cases for the pool metrics of an engine against a SQLite file."""
+
+    def setUp(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir)
+        self.metrics = PoolMetrics()
+        self.engine = create_engine(
+            f"sqlite:///{os.path.join(work_dir, 'metrics.db')}", poolclass=self.metrics.pool_class(QueuePool),
+            pool_size=1, max_overflow=1, pool_timeout=0.05,
+        )
+        self.addCleanup(self.engine.dispose)
+        self.metrics.listen(self.engine.pool)
+
+    def test_occupancy_waits_and_churn(self):
+        """Test that checked out, idle and overflow connections, timeouts and churn are reported."""
+        first, second = self.engine.connect(), self.engine.connect()
+        stats = self.metrics.stats(self.engine.pool)
+        self.assertEqual((stats['checked_out'], stats['idle'], stats['overflow']), (2, 0, 1))
+
+        with self.assertRaises(PoolTimeout):
+            self.engine.connect()
+        second.close()
+        first.execute(text('SELECT 1'))
+        first.invalidate()
+        first.close()
+
+        stats = self.metrics.stats(self.engine.pool)
+        self.assertEqual((stats['checked_out'], stats['idle'], stats['waiting']), (0, 1, 0))
+        self.assertEqual((stats['checkouts'], stats['timeouts']), (3, 1))
+        self.assertGreaterEqual(stats['wait_seconds_max'], 0.05)
+        # The invalidated connection is closed, the other one stays idle in the pool
+        self.assertEqual(
+            (stats['connections_opened'], stats['connections_closed'], stats['connections_invalidated']), (2, 1, 1),
+        )
+
+    def test_pool_kept_across_dispose(self):
+        """Test that a recreated pool is still timed."""
+        self.engine.dispose()
+        self.engine.connect().close()
+
+        self.assertEqual(self.metrics.stats(self.engine.pool)['checkouts'], 1)
+
+
+class TestDatabaseMetricsEndpoint(unittest.TestCase):
+    """Test cases for the /metrics/db endpoint."""
+
+    def test_reports_both_engines(self):
+        """Test that the sync and the async pools are reported without connecting."""
+        app = FastAPI()
+        app.include_router(router)
+
+        response = TestClient(app).get('/metrics/db')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(set(body), {'sync', 'async'})
+        self.assertIn('wait_seconds_mean', body['async'])
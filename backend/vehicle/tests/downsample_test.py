@@ -0,0 +1,119 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+
+from database import get_session
+from vehicle.cache import vehicle_id_cache
+from vehicle.downsample import lttb, minmax
+from vehicle.model import VehicleData, VehicleList
+from vehicle.router import router
+
+
+START = datetime(2022, 7, 12, 16, 0, 0)
+
+
+class TestDownsamplers(unittest.TestCase):
+    """Test cases for the LTTB and min/max downsampling of arrays."""
+
+    def setUp(self):
+        self.x = np.arange(1000, dtype=np.float64)
+        self.y = np.sin(self.x / 50)
+        self.y[437] = 10.0
+        self.y[712] = -10.0
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        """Test that LTTB returns the requested count in order, with the ends and the outliers."""
+        selected = lttb(self.x, self.y, 50)
+
+        self.assertEqual(len(selected), 50)
+        self.assertEqual((selected[0], selected[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(selected) > 0))
+        self.assertIn(437, selected)
+        self.assertIn(712, selected)
+
+    def test_minmax_keeps_the_extremes_of_each_bucket(self):
+        """Test that min/max keeps the lowest and highest point of every time bucket."""
+        selected = minmax(self.x, self.y, 20)
+
+        self.assertLessEqual(len(selected), 20)
+        self.assertTrue(np.all(np.diff(selected) > 0))
+        for bucket in range(10):
+            values = self.y[bucket * 100:(bucket + 1) * 100]
+            kept = self.y[selected[(selected >= bucket * 100) & (selected < (bucket + 1) * 100)]]
+            self.assertEqual((kept.min(), kept.max()), (values.min(), values.max()))
+
+    def test_short_series_is_returned_whole(self):
+        """Test that a series shorter than the requested points is not reduced."""
+        np.testing.assert_array_equal(lttb(self.x[:10], self.y[:10], 50), np.arange(10))
+        np.testing.assert_array_equal(minmax(self.x[:10], self.y[:10], 50), np.arange(10))
+
+
+class TestDownsampleEndpoint(unittest.TestCase):
+    """Test cases for the downsampling endpoint against an in-memory SQLite database."""
+
+    def setUp(self):
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        SQLModel.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        vehicle_id_cache.clear()
+        self.addCleanup(vehicle_id_cache.clear)
+
+        # Every tenth row is parked without a speed
+        with engine.begin() as connection:
+            VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'a'}], connection=connection)
+            VehicleData.bulk_insert([
+                {
+                    'timestamp': START + timedelta(seconds=index, microseconds=250000),
+                    'speed': None if index % 10 == 0 else index % 97,
+                    'vehicle_list_id': 1,
+                }
+                for index in range(500)
+            ], connection=connection)
+
+        def session_override():
+            with Session(engine) as session:
+                yield session
+
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.app.dependency_overrides[get_session] = session_override
+        self.client = TestClient(self.app)
+
+    def test_lttb_response(self):
+        """Test that the response reports the algorithm, the points kept and the rows scanned."""
+        response = self.client.get('/vehicle_data/a/downsample', params={'metric': 'speed', 'points': 40})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['algorithm'], body['points'], body['rows_scanned']), ('lttb', 40, 450))
+        self.assertEqual(body['data'][0], {'timestamp': '2022-07-12T16:00:01.250000', 'value': 1.0})
+        self.assertEqual(len(body['data']), 40)
+
+    def test_minmax_response_within_range(self):
+        """Test min/max downsampling of a time range."""
+        response = self.client.get('/vehicle_data/a/downsample', params={
+            'metric': 'speed', 'algorithm': 'minmax', 'points': 10,
+            'initial': '2022-07-12T16:01:00', 'final': '2022-07-12T16:02:00',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['rows_scanned'], 54)
+        self.assertLessEqual(body['points'], 10)
+        self.assertEqual(body['points'], len(body['data']))
+
+    def test_unknown_vehicle(self):
+        """Test that an unknown vehicle is a 404."""
+        response = self.client.get('/vehicle_data/b/downsample', params={'metric': 'speed'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
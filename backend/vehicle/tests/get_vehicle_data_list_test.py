@@ -1,9 +1,10 @@
 import unittest
 import asyncio
-from unittest.mock import Mock, patch
+from unittest.mock import ANY, AsyncMock, Mock, patch
 from datetime import datetime
 from fastapi import HTTPException, status
 
+from vehicle.cache import vehicle_id_cache
 from vehicle.router import get_vehicle_data_list
 from vehicle.schema import FilterVehicles
 from vehicle.model import VehicleList
@@ -12,20 +13,28 @@ from vehicle.model import VehicleList
 class TestGetVehicleDataList(unittest.TestCase):
     """Test cases for get_vehicle_data_list endpoint with all database calls mocked."""
 
+    def setUp(self):
+        vehicle_id_cache.clear()
+        self.addCleanup(vehicle_id_cache.clear)
+        # The data version is read before the page
+        version_patch = patch('vehicle.router.get_vehicle_data_version', AsyncMock(return_value=(0, None)))
+        version_patch.start()
+        self.addCleanup(version_patch.stop)
+
     def test_get_vehicle_data_list_success_basic(self):
         """Test successful data retrieval with basic filters"""
         async def async_test():
             # Arrange
-            mock_session = Mock()
+            mock_session = AsyncMock()
             filter_vehicles = FilterVehicles(vehicle_id="test-vehicle-123")
             
             # Mock VehicleList found in database
             mock_vehicle_list = VehicleList(id=1, vehicle_id="test-vehicle-123")
             
             # Mock the database query execution
-            with patch('vehicle.router.select') as mock_select:
+            with patch('vehicle.async_service.select') as mock_select:
                 mock_result = Mock()
-                mock_result.first.return_value = mock_vehicle_list
+                mock_result.first.return_value = mock_vehicle_list.id
                 mock_session.exec.return_value = mock_result
                 
                 # Mock the service function response
@@ -48,7 +57,7 @@ class TestGetVehicleDataList(unittest.TestCase):
                     self.assertEqual(len(result['data']), 3)
                     
                     # Verify service function was called with correct parameters
-                    mock_get_vehicle_list.assert_called_once_with(filter_vehicles, 1, mock_session)
+                    mock_get_vehicle_list.assert_called_once_with(filter_vehicles, 1, mock_session, headers=ANY, data_version=0)
                     
                     # Verify database query was executed
                     mock_session.exec.assert_called_once()
@@ -60,11 +69,11 @@ class TestGetVehicleDataList(unittest.TestCase):
         """Test 404 when vehicle ID doesn't exist"""
         async def async_test():
             # Arrange
-            mock_session = Mock()
+            mock_session = AsyncMock()
             filter_vehicles = FilterVehicles(vehicle_id="non-existent-vehicle")
             
             # Mock VehicleList NOT found in database (returns None)
-            with patch('vehicle.router.select') as mock_select:
+            with patch('vehicle.async_service.select') as mock_select:
                 mock_result = Mock()
                 mock_result.first.return_value = None
                 mock_session.exec.return_value = mock_result
@@ -87,7 +96,7 @@ class TestGetVehicleDataList(unittest.TestCase):
         """Test with initial and final datetime filters"""
         async def async_test():
             # Arrange
-            mock_session = Mock()
+            mock_session = AsyncMock()
             initial_time = datetime(2022, 7, 12, 16, 0, 0)
             final_time = datetime(2022, 7, 12, 17, 0, 0)
             
@@ -101,9 +110,9 @@ class TestGetVehicleDataList(unittest.TestCase):
             mock_vehicle_list = VehicleList(id=2, vehicle_id="time-filter-vehicle")
             
             # Mock the database query execution
-            with patch('vehicle.router.select') as mock_select:
+            with patch('vehicle.async_service.select') as mock_select:
                 mock_result = Mock()
-                mock_result.first.return_value = mock_vehicle_list
+                mock_result.first.return_value = mock_vehicle_list.id
                 mock_session.exec.return_value = mock_result
                 
                 # Mock the service function response for time-filtered data
@@ -124,7 +133,7 @@ class TestGetVehicleDataList(unittest.TestCase):
                     self.assertEqual(result['count'], 5)
                     
                     # Verify service function was called with correct parameters including time filters
-                    mock_get_vehicle_list.assert_called_once_with(filter_vehicles, 2, mock_session)
+                    mock_get_vehicle_list.assert_called_once_with(filter_vehicles, 2, mock_session, headers=ANY, data_version=0)
                     
                     # Verify the filter_vehicles object has the time filters
                     call_args = mock_get_vehicle_list.call_args[0]
@@ -140,7 +149,7 @@ class TestGetVehicleDataList(unittest.TestCase):
         """Test pagination parameters (page, limit)"""
         async def async_test():
             # Arrange
-            mock_session = Mock()
+            mock_session = AsyncMock()
             filter_vehicles = FilterVehicles(
                 vehicle_id="pagination-vehicle",
                 page=1,
@@ -151,9 +160,9 @@ class TestGetVehicleDataList(unittest.TestCase):
             mock_vehicle_list = VehicleList(id=3, vehicle_id="pagination-vehicle")
             
             # Mock the database query execution
-            with patch('vehicle.router.select') as mock_select:
+            with patch('vehicle.async_service.select') as mock_select:
                 mock_result = Mock()
-                mock_result.first.return_value = mock_vehicle_list
+                mock_result.first.return_value = mock_vehicle_list.id
                 mock_session.exec.return_value = mock_result
                 
                 # Mock the service function response for paginated data
@@ -175,7 +184,7 @@ class TestGetVehicleDataList(unittest.TestCase):
                     self.assertEqual(len(result['data']), 10)  # Items in this page
                     
                     # Verify service function was called with correct parameters including pagination
-                    mock_get_vehicle_list.assert_called_once_with(filter_vehicles, 3, mock_session)
+                    mock_get_vehicle_list.assert_called_once_with(filter_vehicles, 3, mock_session, headers=ANY, data_version=0)
                     
                     # Verify the filter_vehicles object has the pagination parameters
                     call_args = mock_get_vehicle_list.call_args[0]
@@ -191,16 +200,16 @@ class TestGetVehicleDataList(unittest.TestCase):
         """Test when vehicle exists but no data found"""
         async def async_test():
             # Arrange
-            mock_session = Mock()
+            mock_session = AsyncMock()
             filter_vehicles = FilterVehicles(vehicle_id="empty-data-vehicle")
             
             # Mock VehicleList found in database
             mock_vehicle_list = VehicleList(id=4, vehicle_id="empty-data-vehicle")
             
             # Mock the database query execution
-            with patch('vehicle.router.select') as mock_select:
+            with patch('vehicle.async_service.select') as mock_select:
                 mock_result = Mock()
-                mock_result.first.return_value = mock_vehicle_list
+                mock_result.first.return_value = mock_vehicle_list.id
                 mock_session.exec.return_value = mock_result
                 
                 # Mock the service function response with empty data
@@ -220,7 +229,7 @@ class TestGetVehicleDataList(unittest.TestCase):
                     self.assertEqual(result['data'], [])
                     
                     # Verify service function was still called even though result is empty
-                    mock_get_vehicle_list.assert_called_once_with(filter_vehicles, 4, mock_session)
+                    mock_get_vehicle_list.assert_called_once_with(filter_vehicles, 4, mock_session, headers=ANY, data_version=0)
                     
                     # Verify database query was executed
                     mock_session.exec.assert_called_once()
@@ -14,6 +14,10 @@ class TestGetVehicleIds(unittest.TestCase):
         self.app = FastAPI()
         self.app.include_router(router)
         self.client = TestClient(self.app)
+        # The vehicle list version is read before the vehicles
+        version_patch = mock.patch('vehicle.router.get_dataset_version', mock.AsyncMock(return_value=(0, None)))
+        version_patch.start()
+        self.addCleanup(version_patch.stop)
 
     @mock.patch('vehicle.router.get_all_vehicle_ids')
     def test_get_vehicle_ids_success_with_data(self, mock_get_all_vehicle_ids):
@@ -0,0 +1,292 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import pandas as pd
+from sqlalchemy import create_engine, select
+from sqlmodel import SQLModel
+
+from vehicle.ingest import (
+    FileTask,
+    FileValidation,
+    IngestStats,
+    MemoryBudget,
+    insert_chunk,
+    insert_vehicle_data,
+    iter_csv_chunks,
+    normalise_frame,
+    run_parallel_ingest,
+    validate_frame,
+)
+from vehicle.model import IngestCheckpoint, VehicleDataQuarantine, VehicleDataRollupHour, VehicleList
+
+
+class TestNormaliseFrame(unittest.TestCase):
+    """Test cases for the column-wise normalisation used by the ingest engine."""
+
+    def test_null_sentinels_become_none(self):
+        """Test that the NULL strings written by the loggers are stored as None."""
+        df = pd.DataFrame({
+            'timestamp': ['2022-07-12 16:42:25.435', '2022-07-12 16:42:38.5'],
+            'speed': ['NULL', '37'],
+            'odometer': [40800.6, 'NULL'],
+            'soc': [58, 57],
+            'elevation': [92, 'NULL'],
+            'shift_state': ['NULL', 'D'],
+        })
+
+        columns = normalise_frame(df, vehicle_list_id=7)
+
+        self.assertEqual(columns['speed'], [None, 37])
+        self.assertEqual(columns['odometer'], [40800.6, None])
+        self.assertEqual(columns['elevation'], [92, None])
+        self.assertEqual(columns['shift_state'], [None, 'D'])
+        self.assertEqual(columns['vehicle_list_id'], [7, 7])
+        self.assertEqual(columns['timestamp'][1], datetime(2022, 7, 12, 16, 42, 38, 500000))
+
+    def test_timezone_aware_timestamps_are_stored_as_utc(self):
+        """Test that offsets are converted to naive UTC datetimes."""
+        df = pd.DataFrame({
+            'timestamp': ['2025-08-23T14:00:00+02:00'],
+            'speed': [50],
+            'odometer': [1000.5],
+            'soc': [80],
+            'elevation': [200],
+            'shift_state': ['D'],
+        })
+
+        columns = normalise_frame(df, vehicle_list_id=1)
+
+        self.assertEqual(columns['timestamp'], [datetime(2025, 8, 23, 12, 0, 0)])
+        self.assertIsInstance(columns['speed'][0], int)
+        self.assertIsInstance(columns['odometer'][0], float)
+
+
+def telemetry_frame(rows):
+    """Build a raw telemetry DataFrame from (timestamp, speed, odometer, soc) tuples."""
+    return pd.DataFrame({
+        'timestamp': [row[0] for row in rows],
+        'speed': [row[1] for row in rows],
+        'odometer': [row[2] for row in rows],
+        'soc': [row[3] for row in rows],
+        'elevation': [1] * len(rows),
+        'shift_state': ['D'] * len(rows),
+    })
+
+
+class TestValidateFrame(unittest.TestCase):
+    """Test cases for the vectorised quality rules applied at ingest."""
+
+    def test_rows_breaking_a_rule_are_rejected_with_a_reason(self):
+        """Test every rule and that a row is rejected with the first rule it breaks."""
+        df = telemetry_frame([
+            ('2022-07-12 16:00:00', 10, 100.0, 80),
+            ('2022-07-12 16:00:01', -5, 100.1, 80),
+            ('2022-07-12 16:00:02', 10, -1.0, 80),
+            ('2022-07-12 16:00:03', 10, 100.2, 101),
+            ('2022-07-12 16:00:03', 10, 100.3, 79),
+            ('2022-07-12 16:00:04', 10, 99.0, 79),
+            ('2022-07-12 16:00:05', -1, 98.0, 120),
+            ('2022-07-12 16:00:06', 'NULL', 'NULL', 'NULL'),
+        ])
+
+        chunk = validate_frame(df, 3, FileValidation())
+
+        self.assertEqual(chunk.columns['speed'], [10, 10, None])
+        self.assertEqual(chunk.columns['odometer'], [100.0, 100.3, None])
+        self.assertEqual(chunk.rejected['reason'], [
+            'NEGATIVE_SPEED', 'NEGATIVE_ODOMETER', 'SOC_OUT_OF_RANGE', 'ODOMETER_BACKWARDS', 'NEGATIVE_SPEED',
+        ])
+        self.assertEqual(chunk.rejected['vehicle_list_id'], [3] * 5)
+        self.assertEqual(chunk.rows_rejected, 5)
+
+    def test_duplicate_timestamps_keep_the_first_row(self):
+        """Test that repeated readings are rejected after the first one."""
+        df = telemetry_frame([
+            ('2022-07-12 16:00:00', 10, 100.0, 80),
+            ('2022-07-12 16:00:00', 10, 100.0, 80),
+            ('2022-07-12 16:00:01', 11, 100.1, 80),
+        ])
+
+        chunk = validate_frame(df, 1, FileValidation())
+
+        self.assertEqual(chunk.columns['speed'], [10, 11])
+        self.assertEqual(chunk.rejected['reason'], ['DUPLICATE_TIMESTAMP'])
+
+    def test_late_rows_are_checked_in_timestamp_order(self):
+        """Test that a row arriving out of order is not mistaken for the odometer going backwards."""
+        df = telemetry_frame([
+            ('2022-07-12 16:00:00', 10, 100.0, 80),
+            ('2022-07-12 16:00:02', 10, 100.2, 80),
+            ('2022-07-12 16:00:01', 10, 100.1, 80),
+        ])
+
+        chunk = validate_frame(df, 1, FileValidation())
+
+        self.assertEqual(chunk.rows_rejected, 0)
+        self.assertEqual(chunk.max_odometer, 100.2)
+        self.assertEqual(chunk.last_timestamp, datetime(2022, 7, 12, 16, 0, 2))
+
+    def test_state_carries_across_chunks(self):
+        """Test that the odometer and duplicate rules hold across chunk boundaries."""
+        validation = FileValidation()
+        validate_frame(telemetry_frame([('2022-07-12 16:00:00', 10, 100.0, 80)]), 1, validation)
+
+        chunk = validate_frame(telemetry_frame([
+            ('2022-07-12 16:00:00', 10, 100.0, 80),
+            ('2022-07-12 16:00:01', 10, 99.5, 80),
+            ('2022-07-12 16:00:02', 10, 100.5, 80),
+        ]), 1, validation)
+
+        self.assertEqual(chunk.rejected['reason'], ['DUPLICATE_TIMESTAMP', 'ODOMETER_BACKWARDS'])
+        self.assertEqual(validation.rejected, {'DUPLICATE_TIMESTAMP': 1, 'ODOMETER_BACKWARDS': 1})
+        self.assertEqual(validation.max_odometer, 100.5)
+
+    def test_rejected_rows_are_quarantined(self):
+        """Test that rejected rows go to the quarantine table with their file checkpoint and are not counted."""
+        engine = create_engine('sqlite://')
+        SQLModel.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        chunk = validate_frame(telemetry_frame([
+            ('2022-07-12 16:00:00', 10, 100.0, 80),
+            ('2022-07-12 16:00:01', -1, 100.0, 80),
+            ('2022-07-12 17:30:00', 12, 101.0, 79),
+        ]), 1, FileValidation())
+
+        with engine.begin() as connection:
+            VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'a'}], connection=connection)
+            IngestCheckpoint.bulk_insert([{'id': 9, 'file_name': 'a', 'vehicle_list_id': 1}], connection=connection)
+            inserted = insert_chunk(connection, chunk, checkpoint_id=9)
+
+        with engine.connect() as connection:
+            quarantined = connection.execute(select(VehicleDataQuarantine.reason, VehicleDataQuarantine.checkpoint_id)).all()
+            row_count = connection.execute(select(VehicleList.row_count)).scalar_one()
+            hourly = connection.execute(
+                select(VehicleDataRollupHour.bucket, VehicleDataRollupHour.rows, VehicleDataRollupHour.speed_min)
+                .order_by(VehicleDataRollupHour.bucket)
+            ).all()
+        self.assertEqual(inserted, 2)
+        self.assertEqual(quarantined, [('NEGATIVE_SPEED', 9)])
+        self.assertEqual(row_count, 2)
+        self.assertEqual(hourly, [(datetime(2022, 7, 12, 16), 1, 10), (datetime(2022, 7, 12, 17), 1, 12)])
+
+
+class TestInsertVehicleData(unittest.TestCase):
+    """Test cases for the batched Core insert path."""
+
+    def test_rows_are_written_in_batches(self):
+        """Test that rows are split into executemany batches of the requested size."""
+        connection = mock.Mock()
+        columns = {
+            'timestamp': [datetime(2022, 7, 12, 16, 0, i) for i in range(5)],
+            'speed': [1, 2, 3, 4, 5],
+            'vehicle_list_id': [1] * 5,
+        }
+
+        inserted = insert_vehicle_data(connection, columns, batch_size=2)
+
+        self.assertEqual(inserted, 5)
+        self.assertEqual(connection.execute.call_count, 3)
+        batches = [call.args[1] for call in connection.execute.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(batches[2][0], {'timestamp': datetime(2022, 7, 12, 16, 0, 4), 'speed': 5, 'vehicle_list_id': 1})
+
+    def test_rows_per_sec(self):
+        """Test throughput reporting."""
+        stats = IngestStats(files=2, rows=1000, seconds=0.5)
+        self.assertEqual(stats.rows_per_sec, 2000.0)
+        self.assertEqual(IngestStats().rows_per_sec, 0.0)
+
+
+class TestMemoryBudget(unittest.TestCase):
+    """Test cases for sizing chunks against the memory budget."""
+
+    @mock.patch('vehicle.ingest.gc.collect')
+    @mock.patch('vehicle.ingest.current_rss_bytes', side_effect=[2 * 1024 * 1024, None])
+    def test_rss_unavailable_after_collect(self, _rss, _collect):
+        """Test that an RSS reading lost after the collection falls back to half of the budget."""
+        budget = MemoryBudget(budget_mb=1, max_rows=10000)
+        budget.bytes_per_row = 100.0
+
+        self.assertEqual(budget.next_chunk_rows(), 5242)
+
+
+class TestIterCsvChunks(unittest.TestCase):
+    """Test cases for the chunked CSV reader used by the streaming ingest."""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as csv_file:
+            csv_file.write('timestamp,speed,odometer,soc,elevation,shift_state\n')
+            for second in range(5):
+                csv_file.write(f'2022-07-12 16:00:0{second},{second},100.0,80,1,D\n')
+        self.addCleanup(os.remove, self.path)
+
+    def test_chunks_follow_the_row_limit(self):
+        """Test that every chunk keeps the header and ends on a line boundary."""
+        chunks = list(iter_csv_chunks(self.path, 0, MemoryBudget(max_rows=2)))
+
+        self.assertEqual([len(df) for df, _ in chunks], [2, 2, 1])
+        self.assertEqual(list(chunks[1][0]['speed']), [2, 3])
+        self.assertEqual(chunks[-1][1], os.path.getsize(self.path))
+
+    def test_resume_from_offset(self):
+        """Test that reading resumes from the offset of a committed chunk."""
+        first_chunk_end = next(iter_csv_chunks(self.path, 0, MemoryBudget(max_rows=2)))[1]
+
+        chunks = list(iter_csv_chunks(self.path, first_chunk_end, MemoryBudget(max_rows=10)))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(list(chunks[0][0]['speed']), [2, 3, 4])
+
+    def test_partial_last_line_is_left_for_the_next_run(self):
+        """Test that a line still being written is not read until its newline arrives."""
+        complete_size = os.path.getsize(self.path)
+        with open(self.path, 'a') as csv_file:
+            csv_file.write('2022-07-12 16:00:05,5,10')
+
+        chunks = list(iter_csv_chunks(self.path, 0, MemoryBudget(max_rows=10)))
+
+        self.assertEqual(len(chunks[0][0]), 5)
+        self.assertEqual(chunks[0][1], complete_size)
+
+
+class TestRunParallelIngest(unittest.TestCase):
+    """Test cases for the process pool parser feeding a single writer."""
+
+    def test_every_file_reaches_the_writer(self):
+        """Test that chunks parsed by the workers are all written by the calling process."""
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        tasks = []
+        for index in range(3):
+            path = os.path.join(data_dir.name, f'vehicle{index}.csv')
+            with open(path, 'w') as csv_file:
+                csv_file.write('timestamp,speed,odometer,soc,elevation,shift_state\n')
+                csv_file.write(f'2022-07-12 16:00:00,{index},100.0,80,1,D\n')
+                csv_file.write(f'2022-07-12 16:00:01,{index},100.1,80,1,D\n')
+            tasks.append(FileTask(path, checkpoint_id=index + 10, vehicle_list_id=index + 1))
+
+        written = []
+
+        def write_chunk(checkpoint_id, chunk, end_offset):
+            written.append((checkpoint_id, chunk.columns['vehicle_list_id'], end_offset))
+            return len(chunk.columns['timestamp'])
+
+        finished = []
+        stats = IngestStats()
+        run_parallel_ingest(tasks, write_chunk, lambda task, rejected: finished.append(task), workers=2, stats=stats)
+
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(sorted(task.checkpoint_id for task in finished), [10, 11, 12])
+        self.assertEqual(stats.rows, 6)
+        self.assertEqual(
+            sorted(written),
+            [(task.checkpoint_id, [task.vehicle_list_id] * 2, os.path.getsize(task.path)) for task in tasks],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.schema import CreateTable
+
+from migrations import MIGRATIONS, alter_column_types, migrate
+from vehicle.model import IngestCheckpoint
+
+
+# Schema created by create_all before migrations existed
+LEGACY_SCHEMA = [
+    "CREATE TABLE vehiclelist (id INTEGER NOT NULL PRIMARY KEY, vehicle_id VARCHAR NOT NULL)",
+    "CREATE TABLE vehicledata (id INTEGER NOT NULL PRIMARY KEY, timestamp DATETIME NOT NULL, speed INTEGER,"
+    " odometer FLOAT, soc INTEGER, elevation INTEGER, shift_state VARCHAR,"
+    " vehicle_list_id INTEGER NOT NULL REFERENCES vehiclelist (id))",
+    "CREATE INDEX ix_vehicledata_timestamp ON vehicledata (timestamp)",
+    "CREATE TABLE ingestcheckpoint (id INTEGER NOT NULL PRIMARY KEY, file_name VARCHAR NOT NULL,"
+    " byte_offset INTEGER NOT NULL, rows_committed INTEGER NOT NULL,"
+    " vehicle_list_id INTEGER NOT NULL REFERENCES vehiclelist (id))",
+]
+
+
+class TestMigrations(unittest.TestCase):
+    """Test cases for the schema migrations against SQLite databases."""
+
+    def setUp(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        self.engine = create_engine(f"sqlite:///{os.path.join(data_dir.name, 'vehicle.db')}")
+        self.addCleanup(self.engine.dispose)
+
+    def indexes(self, table):
+        return {index['name']: index for index in inspect(self.engine).get_indexes(table)}
+
+    def test_fresh_database_gets_the_full_schema(self):
+        """Test that every migration is recorded and the indexes exist on a new database."""
+        applied = migrate(self.engine)
+
+        self.assertEqual(applied, [migration.version for migration in MIGRATIONS])
+        self.assertIn('ix_vehicledata_vehicle_list_id_timestamp_id', self.indexes('vehicledata'))
+        self.assertTrue(self.indexes('vehiclelist')['ix_vehiclelist_vehicle_id']['unique'])
+        self.assertEqual(migrate(self.engine), [])
+
+    def test_legacy_database_is_upgraded(self):
+        """Test that a database created before migrations gets new columns and indexes, merging duplicate vehicles and rolling up their rows."""
+        with self.engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO vehiclelist (id, vehicle_id) VALUES (1, 'a'), (2, 'b'), (3, 'a')"))
+            connection.execute(text(
+                "INSERT INTO vehicledata (id, timestamp, vehicle_list_id) VALUES (1, :ts, 1), (2, :ts, 2), (3, :ts, 3)"
+            ), {'ts': datetime(2022, 7, 12, 16, 0)})
+            connection.execute(text(
+                "INSERT INTO ingestcheckpoint (id, file_name, byte_offset, rows_committed, vehicle_list_id)"
+                " VALUES (1, 'a', 10, 1, 3)"
+            ))
+
+        migrate(self.engine)
+
+        with self.engine.connect() as connection:
+            vehicles = connection.execute(text("SELECT id, vehicle_id, row_count FROM vehiclelist ORDER BY id")).all()
+            hourly = connection.execute(text("SELECT vehicle_list_id, rows FROM vehicledatarolluphour ORDER BY vehicle_list_id")).all()
+            data_vehicles = connection.execute(text("SELECT vehicle_list_id FROM vehicledata ORDER BY id")).scalars().all()
+            checkpoint = connection.execute(text("SELECT vehicle_list_id, hashed_bytes, rows_rejected FROM ingestcheckpoint")).one()
+            versions = connection.execute(text("SELECT version FROM schemamigration ORDER BY version")).scalars().all()
+
+        self.assertEqual(vehicles, [(1, 'a', 2), (2, 'b', 1)])
+        self.assertEqual(hourly, [(1, 2), (2, 1)])
+        self.assertEqual(data_vehicles, [1, 2, 1])
+        self.assertEqual(tuple(checkpoint), (1, 0, 0))
+        self.assertEqual(versions, [migration.version for migration in MIGRATIONS])
+        self.assertIn('ix_vehicledata_vehicle_list_id_timestamp_id', self.indexes('vehicledata'))
+        self.assertTrue(self.indexes('vehiclelist')['ix_vehiclelist_vehicle_id']['unique'])
+        self.assertIn('vehicledataquarantine', inspect(self.engine).get_table_names())
+        self.assertNotIn('vehicledatahourlycount', inspect(self.engine).get_table_names())
+
+    def test_hourly_counts_until_the_rollups(self):
+        """Test that migration 0005 still fills the hourly counts of databases stopping there, and 0006 drops them."""
+        with self.engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO vehiclelist (id, vehicle_id) VALUES (1, 'a')"))
+            connection.execute(text(
+                "INSERT INTO vehicledata (id, timestamp, vehicle_list_id) VALUES (1, :first, 1), (2, :first, 1), (3, :later, 1)"
+            ), {'first': datetime(2022, 7, 12, 16, 0), 'later': datetime(2022, 7, 12, 17, 30)})
+
+        migrate(self.engine, MIGRATIONS[:5])
+        with self.engine.connect() as connection:
+            hourly = connection.execute(text("SELECT rows FROM vehicledatahourlycount ORDER BY bucket")).scalars().all()
+        self.assertEqual(hourly, [2, 1])
+
+        migrate(self.engine)
+        self.assertNotIn('vehicledatahourlycount', inspect(self.engine).get_table_names())
+
+
+class TestColumnTypes(unittest.TestCase):
+    """Test cases for the column types of the MySQL and PostgreSQL schema."""
+
+    def executed(self, dialect, columns):
+        connection = mock.Mock(dialect=dialect)
+        alter_column_types(connection, columns)
+        return [str(call.args[0]) for call in connection.execute.call_args_list]
+
+    def test_checkpoint_offsets_are_64_bit(self):
+        """Test that checkpoint offsets and sizes are created and altered to BIGINT."""
+        checkpoints = IngestCheckpoint.__table__
+        ddl = str(CreateTable(checkpoints).compile(dialect=mysql.dialect()))
+
+        self.assertIn('byte_offset BIGINT NOT NULL', ddl)
+        self.assertIn('file_size BIGINT', ddl)
+        self.assertEqual(self.executed(mysql.dialect(), [checkpoints.c.byte_offset, checkpoints.c.file_size]), [
+            'ALTER TABLE ingestcheckpoint MODIFY COLUMN byte_offset BIGINT NOT NULL DEFAULT 0',
+            'ALTER TABLE ingestcheckpoint MODIFY COLUMN file_size BIGINT',
+        ])
+        self.assertEqual(self.executed(postgresql.dialect(), [checkpoints.c.file_size]), [
+            'ALTER TABLE ingestcheckpoint ALTER COLUMN file_size TYPE BIGINT',
+        ])
+
+    def test_checkpoint_mtime_is_double(self):
+        """Test that the checkpoint mtime is a double, a single precision FLOAT never equals st_mtime."""
+        checkpoints = IngestCheckpoint.__table__
+        ddl = str(CreateTable(checkpoints).compile(dialect=mysql.dialect()))
+
+        self.assertIn('file_mtime DOUBLE,', ddl)
+        self.assertEqual(self.executed(mysql.dialect(), [checkpoints.c.file_mtime]), [
+            'ALTER TABLE ingestcheckpoint MODIFY COLUMN file_mtime DOUBLE',
+        ])
+        self.assertEqual(self.executed(postgresql.dialect(), [checkpoints.c.file_mtime]), [
+            'ALTER TABLE ingestcheckpoint ALTER COLUMN file_mtime TYPE DOUBLE PRECISION',
+        ])
+
+    def test_checkpoint_validation_state_keeps_its_precision(self):
+        """Test that the carried odometer is a double and the carried timestamp keeps microseconds on MySQL."""
+        checkpoints = IngestCheckpoint.__table__
+        ddl = str(CreateTable(checkpoints).compile(dialect=mysql.dialect()))
+
+        self.assertIn('max_odometer DOUBLE,', ddl)
+        self.assertIn('last_timestamp DATETIME(6),', ddl)
+        self.assertEqual(self.executed(mysql.dialect(), [checkpoints.c.max_odometer, checkpoints.c.last_timestamp]), [
+            'ALTER TABLE ingestcheckpoint MODIFY COLUMN max_odometer DOUBLE',
+            'ALTER TABLE ingestcheckpoint MODIFY COLUMN last_timestamp DATETIME(6)',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import threading
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from vehicle.ingest import IngestCancelled, IngestStats
+from vehicle.jobs import PopulateJobManager
+from vehicle.router import router
+from vehicle.schema import PopulateJobStatus
+
+
+class TestPopulateJobManager(unittest.TestCase):
+    """Test cases for background populate jobs with the ingest mocked."""
+
+    def setUp(self):
+        self.manager = PopulateJobManager()
+        self.release = threading.Event()
+
+    def wait_for(self, job):
+        """Wait until the background thread has finished the job."""
+        self.manager._executor.submit(lambda: None).result(timeout=5)
+        return job
+
+    def blocking_load(self, progress, cancel):
+        """Fake ingest that reports progress and waits to be released or cancelled."""
+        stats = IngestStats(files=1, rows=100, seconds=0.5)
+        progress(stats)
+        while not self.release.wait(0.01):
+            if cancel.is_set():
+                raise IngestCancelled()
+        return stats
+
+    def test_job_reports_progress_and_completes(self):
+        """Test that the job exposes the ingest stats once it completes."""
+        with mock.patch('vehicle.jobs.load_data_from_folder', side_effect=self.blocking_load):
+            job, created = self.manager.submit()
+            self.release.set()
+            self.wait_for(job)
+
+        self.assertTrue(created)
+        result = job.as_dict()
+        self.assertEqual(result['status'], PopulateJobStatus.COMPLETED)
+        self.assertEqual(result['files_done'], 1)
+        self.assertEqual(result['rows_inserted'], 100)
+        self.assertEqual(result['rows_per_sec'], 200.0)
+        self.assertIsNotNone(result['finished_at'])
+
+    def test_concurrent_submit_returns_running_job(self):
+        """Test that a second populate request is deduplicated onto the running job."""
+        with mock.patch('vehicle.jobs.load_data_from_folder', side_effect=self.blocking_load) as mock_load:
+            first, _ = self.manager.submit()
+            second, created = self.manager.submit()
+            self.release.set()
+            self.wait_for(first)
+
+        self.assertFalse(created)
+        self.assertIs(first, second)
+        mock_load.assert_called_once()
+
+    def test_cancel_running_job(self):
+        """Test that cancelling a running job stops the ingest."""
+        with mock.patch('vehicle.jobs.load_data_from_folder', side_effect=self.blocking_load):
+            job, _ = self.manager.submit()
+            self.manager.cancel(job.id)
+            self.wait_for(job)
+
+        self.assertEqual(job.status, PopulateJobStatus.CANCELLED)
+        # A new job can start once the previous one is finished
+        with mock.patch('vehicle.jobs.load_data_from_folder', return_value=IngestStats()):
+            next_job, created = self.manager.submit()
+            self.wait_for(next_job)
+        self.assertTrue(created)
+
+    def test_failed_job_records_error(self):
+        """Test that ingest errors are reported on the job."""
+        with mock.patch('vehicle.jobs.load_data_from_folder', side_effect=ValueError("bad timestamp")):
+            job, _ = self.manager.submit()
+            self.wait_for(job)
+
+        self.assertEqual(job.status, PopulateJobStatus.FAILED)
+        self.assertEqual(job.errors, ["ValueError: bad timestamp"])
+
+    def test_unknown_job(self):
+        """Test lookups of job ids that do not exist."""
+        self.assertIsNone(self.manager.get('missing'))
+        self.assertIsNone(self.manager.cancel('missing'))
+
+
+class TestPopulateEndpoints(unittest.TestCase):
+    """Test cases for the populate job endpoints."""
+
+    def setUp(self):
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.client = TestClient(self.app)
+        self.manager = PopulateJobManager()
+        patcher = mock.patch('vehicle.router.populate_jobs', self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_populate_returns_job_id_immediately(self):
+        """Test that populate answers with a job that can be polled."""
+        with mock.patch('vehicle.jobs.load_data_from_folder', return_value=IngestStats(files=3, rows=450, seconds=1.0)):
+            response = self.client.post("/vehicle_data/populate")
+            self.assertEqual(response.status_code, 202)
+            job_id = response.json()['id']
+            self.manager._executor.submit(lambda: None).result(timeout=5)
+
+        response = self.client.get(f"/vehicle_data/populate/{job_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'COMPLETED')
+        self.assertEqual(response.json()['rows_inserted'], 450)
+
+    def test_unknown_job_returns_404(self):
+        """Test status and cancel for a job id that does not exist."""
+        self.assertEqual(self.client.get("/vehicle_data/populate/missing").status_code, 404)
+        self.assertEqual(self.client.delete("/vehicle_data/populate/missing").status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine, select
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+from vehicle.ingest import FileValidation, insert_chunk, validate_frame
+from vehicle.model import VehicleDataRollupDay, VehicleDataRollupHour, VehicleDataRollupMinute, VehicleList
+from vehicle.rollups import rebuild_rollups, rollup_for
+from vehicle.schema import BucketWidth
+
+
+START = datetime(2022, 7, 12, 23, 0, 0)
+
+
+def telemetry_frame(rows):
+    return pd.DataFrame(rows, columns=['timestamp', 'speed', 'odometer', 'soc', 'elevation', 'shift_state'])
+
+
+class TestRollups(unittest.TestCase):
+    """Test cases for the rollups maintained at ingest against an in-memory SQLite database."""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        SQLModel.metadata.create_all(self.engine)
+        self.addCleanup(self.engine.dispose)
+        with self.engine.begin() as connection:
+            VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'a'}], connection=connection)
+
+    def ingest(self, *frames):
+        with self.engine.begin() as connection:
+            for frame in frames:
+                insert_chunk(connection, validate_frame(telemetry_frame(frame), 1, FileValidation()))
+
+    def rollups(self, model):
+        table = model.__table__
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(table).order_by(table.c.bucket)).mappings().all()
+        return [{name: value for name, value in row.items() if name != 'id'} for row in rows]
+
+    def test_rebuild_matches_incremental_rollups(self):
+        """Test that rebuilding from the rows gives the rollups ingest maintained over several chunks."""
+        rows = [
+            (
+                (START + timedelta(seconds=37 * index)).isoformat(),
+                None if index % 5 == 0 else index % 120,
+                1000.0 + index,
+                None if index % 7 == 0 else 90 - index // 10,
+                index % 13,
+                'D',
+            )
+            for index in range(300)
+        ]
+        # Interleaved chunks so every bucket is merged more than once
+        self.ingest(rows[::3], rows[1::3], rows[2::3])
+        incremental = {model: self.rollups(model) for model in (VehicleDataRollupMinute, VehicleDataRollupHour, VehicleDataRollupDay)}
+
+        with self.engine.begin() as connection:
+            rebuild_rollups(connection, page_rows=64)
+
+        for model, expected in incremental.items():
+            with self.subTest(model=model.__name__):
+                self.assertEqual(self.rollups(model), expected)
+        self.assertEqual([row['bucket'] for row in incremental[VehicleDataRollupDay]], [datetime(2022, 7, 12), datetime(2022, 7, 13)])
+        self.assertEqual(sum(row['rows'] for row in incremental[VehicleDataRollupHour]), 300)
+
+    def test_merged_bucket_keeps_extremes_and_latest_values(self):
+        """Test that a late chunk merges its extremes and only replaces last values read after the stored ones."""
+        self.ingest(
+            [(START.isoformat(), 10, 1000.0, 80, None, 'D'), ((START + timedelta(seconds=40)).isoformat(), 30, 1001.0, None, None, 'D')],
+            [((START + timedelta(seconds=20)).isoformat(), 50, None, 70, 5, 'D')],
+        )
+
+        minute, = self.rollups(VehicleDataRollupMinute)
+        self.assertEqual((minute['rows'], minute['speed_count'], minute['speed_sum']), (3, 3, 90))
+        self.assertEqual((minute['speed_min'], minute['speed_max'], minute['speed_last']), (10, 50, 30))
+        self.assertEqual((minute['soc_min'], minute['soc_last'], minute['soc_last_at']), (70, 70, START + timedelta(seconds=20)))
+        self.assertEqual((minute['elevation_count'], minute['elevation_last']), (1, 5))
+        self.assertEqual((minute['odometer_last'], minute['odometer_last_at']), (1001.0, START + timedelta(seconds=40)))
+
+    def test_coarsest_rollup_is_picked(self):
+        """Test that each bucket width reads the rollup of its own width."""
+        self.assertEqual([rollup_for(width) for width in BucketWidth], list(BucketWidth))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine, func
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, select
+
+from vehicle.counts import CountCache, cached_row_count, count_rows, rebuild_row_counts
+from vehicle.ingest import FileValidation, insert_chunk, validate_frame
+from vehicle.model import VehicleData, VehicleDataRollupHour, VehicleList
+from vehicle.rollups import rebuild_rollups
+
+
+START = datetime(2022, 7, 12, 16, 0, 0)
+
+
+def telemetry_frame(timestamps):
+    return pd.DataFrame({
+        'timestamp': [timestamp.isoformat() for timestamp in timestamps],
+        'speed': [10] * len(timestamps),
+        'odometer': [None] * len(timestamps),
+        'soc': [80] * len(timestamps),
+        'elevation': [0] * len(timestamps),
+        'shift_state': ['D'] * len(timestamps),
+    })
+
+
+class TestRowCounts(unittest.TestCase):
+    """Test cases for the row counters maintained at ingest against an in-memory SQLite database."""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        SQLModel.metadata.create_all(self.engine)
+        self.addCleanup(self.engine.dispose)
+        self.session = Session(self.engine)
+        self.addCleanup(self.session.close)
+
+        # Two chunks of one row every 7 minutes over five hours, the second one lands in hours of the first
+        timestamps = [START + timedelta(minutes=7 * index) for index in range(43)]
+        with self.engine.begin() as connection:
+            VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'a'}], connection=connection)
+            for part in (timestamps[::2], timestamps[1::2]):
+                insert_chunk(connection, validate_frame(telemetry_frame(sorted(part)), 1, FileValidation()))
+
+    def direct_count(self, initial, final):
+        statement = select(func.count(VehicleData.id)).where(VehicleData.vehicle_list_id == 1)
+        if initial is not None:
+            statement = statement.where(VehicleData.timestamp >= initial)
+        if final is not None:
+            statement = statement.where(VehicleData.timestamp <= final)
+        return self.session.exec(statement).one()
+
+    def test_counts_match_count_queries(self):
+        """Test that counts from the counters equal COUNT(*) for aligned, partial and open windows."""
+        windows = [
+            (None, None),
+            (START, None),
+            (None, START + timedelta(hours=2)),
+            (START + timedelta(minutes=14), START + timedelta(hours=3, minutes=30)),
+            (START + timedelta(hours=1), START + timedelta(hours=3)),
+            (START + timedelta(minutes=5), START + timedelta(minutes=50)),
+            (START + timedelta(hours=1, minutes=10), START + timedelta(hours=2, minutes=5)),
+            (START + timedelta(hours=9), None),
+        ]
+        for initial, final in windows:
+            with self.subTest(initial=initial, final=final):
+                self.assertEqual(count_rows(self.session, 1, initial, final), self.direct_count(initial, final))
+
+    def test_rebuild_matches_incremental_counts(self):
+        """Test that the backfill computes the same counters ingest maintained."""
+        def counters():
+            with self.engine.connect() as connection:
+                total = connection.execute(select(VehicleList.row_count)).scalar_one()
+                hourly = connection.execute(
+                    select(VehicleDataRollupHour.bucket, VehicleDataRollupHour.rows).order_by(VehicleDataRollupHour.bucket)
+                ).all()
+            return total, hourly
+
+        incremental = counters()
+        with self.engine.begin() as connection:
+            rebuild_row_counts(connection)
+            rebuild_rollups(connection)
+
+        self.assertEqual(counters(), incremental)
+        self.assertEqual(incremental[0], 43)
+        self.assertEqual(len(incremental[1]), 5)
+
+    def test_cached_count_is_invalidated(self):
+        """Test that a cached count is served until the vehicle is invalidated."""
+        cache = CountCache()
+        self.assertEqual(cached_row_count(self.session, 1, cache=cache), 43)
+
+        with self.engine.begin() as connection:
+            insert_chunk(connection, validate_frame(telemetry_frame([START + timedelta(hours=6)]), 1, FileValidation()))
+        self.assertEqual(cached_row_count(self.session, 1, cache=cache), 43)
+
+        cache.invalidate(1)
+        self.assertEqual(cached_row_count(self.session, 1, cache=cache), 44)
+
+    def test_cached_count_is_kept_per_data_version(self):
+        """Test that a count cached at one data version is not served for the next one, even without an invalidation."""
+        cache = CountCache()
+        self.assertEqual(cached_row_count(self.session, 1, data_version=1, cache=cache), 43)
+
+        with self.engine.begin() as connection:
+            insert_chunk(connection, validate_frame(telemetry_frame([START + timedelta(hours=6)]), 1, FileValidation()))
+        self.assertEqual(cached_row_count(self.session, 1, data_version=1, cache=cache), 43)
+        self.assertEqual(cached_row_count(self.session, 1, data_version=2, cache=cache), 44)
+
+
+class TestCountCache(unittest.TestCase):
+    """Test cases for the expiry, eviction and invalidation of the count cache."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = CountCache(max_entries=2, ttl_seconds=10, clock=lambda: self.now)
+
+    def test_entries_expire(self):
+        """Test that entries are dropped once their TTL has passed."""
+        self.cache.put((1, None, None, None), 5, self.cache.generation(1))
+        self.now = 9.0
+        self.assertEqual(self.cache.get((1, None, None, None)), 5)
+        self.now = 10.0
+        self.assertIsNone(self.cache.get((1, None, None, None)))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that the entry read least recently goes first when the cache is full."""
+        for vehicle_list_id in (1, 2):
+            self.cache.put((vehicle_list_id, None, None, None), vehicle_list_id, 0)
+        self.cache.get((1, None, None, None))
+        self.cache.put((3, None, None, None), 3, 0)
+
+        self.assertIsNone(self.cache.get((2, None, None, None)))
+        self.assertEqual(self.cache.get((1, None, None, None)), 1)
+
+    def test_count_computed_before_invalidation_is_not_stored(self):
+        """Test that a reader racing an ingest cannot cache the count from before it."""
+        generation = self.cache.generation(1)
+        self.cache.invalidate(1)
+        self.cache.put((1, None, None, None), 5, generation)
+
+        self.assertIsNone(self.cache.get((1, None, None, None)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+
+from database import get_session
+from vehicle.cache import vehicle_id_cache
+from vehicle.ingest import FileValidation, insert_chunk, validate_frame
+from vehicle.model import VehicleList, VehicleSegment
+from vehicle.router import router
+from vehicle.segments import rebuild_segments, segment_rows
+
+
+START = datetime(2022, 7, 12, 16, 0, 0)
+
+
+def day_of_driving():
+    """Rows of a parked start, two trips split by a long stop and a charge interrupted by a drop, in time order"""
+    rows, odometer = [], 1000.0
+    # Parked, then 20 minutes of driving every 30 seconds
+    rows += [(START + timedelta(seconds=30 * index), None, odometer, 80, None) for index in range(5)]
+    for index in range(40):
+        odometer += 0.5
+        rows.append((START + timedelta(minutes=3, seconds=30 * index), 20 + index % 50, odometer, 80 - index // 4, 'D'))
+    # The car is off for an hour, then drives 10 minutes
+    for index in range(20):
+        odometer += 0.25
+        rows.append((START + timedelta(hours=1, minutes=30, seconds=30 * index), 30, odometer, 70 - index // 10, 'D'))
+    # Parked and charging, SOC drops once while plugged in, then charges again
+    charge_start = START + timedelta(hours=2)
+    socs = [68, 68, 70, 72, 74, 73, 73, 75, 77, 77]
+    rows += [(charge_start + timedelta(minutes=5 * index), None, odometer, soc, 'P') for index, soc in enumerate(socs)]
+    return rows
+
+
+def telemetry_frame(rows):
+    return pd.DataFrame({
+        'timestamp': [row[0].isoformat() for row in rows],
+        'speed': [row[1] for row in rows],
+        'odometer': [row[2] for row in rows],
+        'soc': [row[3] for row in rows],
+        'elevation': [0] * len(rows),
+        'shift_state': [row[4] for row in rows],
+    })
+
+
+class TestSegmentRows(unittest.TestCase):
+    """Test cases for the vectorised segmentation of a row stream."""
+
+    def test_trips_and_charging_sessions(self):
+        """Test that trips split at long gaps and charging sessions split where SOC drops."""
+        rows = day_of_driving()
+        timestamps = np.array([row[0] for row in rows], dtype='datetime64[us]')
+        numbers = np.array([row[1:4] for row in rows], dtype=np.float64)
+        segments = segment_rows(timestamps, numbers[:, 0], numbers[:, 2], numbers[:, 1], np.array([row[4] for row in rows], dtype=object))
+
+        self.assertEqual(
+            [(segment['kind'], segment['start'], segment['end'], segment['rows']) for segment in segments],
+            [
+                ('trip', START + timedelta(minutes=3), START + timedelta(minutes=22, seconds=30), 40),
+                ('trip', START + timedelta(hours=1, minutes=30), START + timedelta(hours=1, minutes=39, seconds=30), 20),
+                ('charge', START + timedelta(hours=2, minutes=5), START + timedelta(hours=2, minutes=20), 4),
+                ('charge', START + timedelta(hours=2, minutes=30), START + timedelta(hours=2, minutes=40), 3),
+            ],
+        )
+        first_trip, second_trip, first_charge, second_charge = segments
+        self.assertEqual((first_trip['distance'], first_trip['soc_used'], first_trip['max_speed']), (19.5, 9, 59))
+        self.assertEqual((second_trip['soc_start'], second_trip['soc_end']), (70, 69))
+        self.assertEqual((first_charge['soc_start'], first_charge['soc_end'], first_charge['soc_used']), (68, 74, -6))
+        self.assertEqual((second_charge['soc_used'], second_charge['distance']), (-4, 0.0))
+
+    def test_empty_stream(self):
+        """Test that no rows give no segments."""
+        empty = np.empty(0)
+        self.assertEqual(segment_rows(empty.astype('datetime64[us]'), empty, empty, empty, empty.astype(object)), [])
+
+
+class TestSegmentsMaintainedAtIngest(unittest.TestCase):
+    """Test cases for the segments kept by ingest against an in-memory SQLite database."""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        SQLModel.metadata.create_all(self.engine)
+        self.addCleanup(self.engine.dispose)
+        vehicle_id_cache.clear()
+        self.addCleanup(vehicle_id_cache.clear)
+
+        # Chunks cut inside the first trip and the charge, the last one arrives out of order
+        rows = day_of_driving()
+        with self.engine.begin() as connection:
+            VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'a'}], connection=connection)
+            for part in (rows[:20], rows[20:68], rows[70:], rows[68:70]):
+                insert_chunk(connection, validate_frame(telemetry_frame(part), 1, FileValidation()))
+
+        def session_override():
+            with Session(self.engine) as session:
+                yield session
+
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.app.dependency_overrides[get_session] = session_override
+        self.client = TestClient(self.app)
+
+    def segments(self):
+        table = VehicleSegment.__table__
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(table).order_by(table.c.start)).mappings().all()
+        return [{name: value for name, value in row.items() if name != 'id'} for row in rows]
+
+    def test_incremental_segments_match_a_rebuild(self):
+        """Test that segments maintained chunk by chunk equal segmenting all rows at once, in steps or not."""
+        incremental = self.segments()
+        self.assertEqual([segment['kind'] for segment in incremental], ['trip', 'trip', 'charge', 'charge'])
+
+        for page_rows in (1000, 7):
+            with self.subTest(page_rows=page_rows):
+                with self.engine.begin() as connection:
+                    rebuild_segments(connection, page_rows=page_rows)
+                self.assertEqual(self.segments(), incremental)
+
+    def test_trip_listing(self):
+        """Test that trips are listed by start time within the range."""
+        response = self.client.get('/vehicle_data/a/segments', params={'kind': 'trip', 'initial': '2022-07-12T16:10:00'})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['kind'], 'trip')
+        self.assertEqual([(trip['start'], trip['rows']) for trip in body['data']], [('2022-07-12T17:30:00', 20)])
+
+    def test_unknown_vehicle(self):
+        """Test that an unknown vehicle is a 404."""
+        response = self.client.get('/vehicle_data/b/segments')
+
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from vehicle.ingest import iter_line_batches
+from vehicle.router import router
+
+
+async def collect_batches(pieces, batch_lines):
+    async def chunks():
+        for piece in pieces:
+            yield piece
+    return [batch async for batch in iter_line_batches(chunks(), batch_lines)]
+
+
+class TestIterLineBatches(unittest.TestCase):
+    """Test cases for splitting a streamed body into line batches."""
+
+    def test_lines_split_across_chunks(self):
+        """Test that lines broken across network chunks are reassembled."""
+        pieces = [b'a,b\n1,', b'2\n3,4\n\n5', b',6']
+
+        batches = asyncio.run(collect_batches(pieces, batch_lines=2))
+
+        self.assertEqual(batches, [[b'a,b', b'1,2'], [b'3,4', b'5,6']])
+
+
+class TestIngestVehicleDataEndpoint(unittest.TestCase):
+    """Test cases for the streaming ingest endpoint with all database calls mocked."""
+
+    def setUp(self):
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.client = TestClient(self.app)
+
+        patchers = [
+            mock.patch('vehicle.service.get_or_create_vehicle', return_value=42),
+            mock.patch('vehicle.service.engine'),
+            mock.patch('vehicle.service.INGEST_STREAM_BATCH_ROWS', 2),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        insert_patcher = mock.patch('vehicle.service.insert_chunk', side_effect=self.insert)
+        self.mock_insert = insert_patcher.start()
+        self.addCleanup(insert_patcher.stop)
+        self.inserted = []
+
+    def insert(self, connection, chunk):
+        self.inserted.append(chunk.columns)
+        return len(chunk.columns['timestamp'])
+
+    def test_csv_stream_is_inserted_in_micro_batches(self):
+        """Test that a CSV body is written in batches for the resolved vehicle."""
+        body = (
+            b'timestamp,speed,odometer,soc,elevation,shift_state\n'
+            b'2022-07-12 16:41:00.966,37,47676.2,73,4,D\n'
+            b'2022-07-12 16:41:05.967,NULL,47676.3,73,4,NULL\n'
+            b'2022-07-12 16:41:37.217,32,47676.6,73,4,D\n'
+        )
+
+        response = self.client.post(
+            "/vehicle_data/new-vehicle/ingest", content=body, headers={'Content-Type': 'text/csv'},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['rows'], 3)
+        self.assertEqual(response.json()['batches'], 2)
+        self.assertEqual([len(columns['timestamp']) for columns in self.inserted], [2, 1])
+        self.assertEqual(self.inserted[0]['speed'], [37, None])
+        self.assertEqual(self.inserted[0]['vehicle_list_id'], [42, 42])
+
+    def test_ndjson_stream_with_missing_keys(self):
+        """Test that NDJSON objects may omit columns."""
+        body = (
+            b'{"timestamp": "2022-07-12T16:41:00Z", "speed": 37, "soc": 73}\n'
+            b'{"timestamp": "2022-07-12T16:41:05Z", "shift_state": "D"}\n'
+        )
+
+        response = self.client.post(
+            "/vehicle_data/new-vehicle/ingest", content=body, headers={'Content-Type': 'application/x-ndjson'},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        columns = self.inserted[0]
+        self.assertEqual(columns['speed'], [37, None])
+        self.assertEqual(columns['odometer'], [None, None])
+        self.assertEqual(columns['shift_state'], [None, 'D'])
+
+    def test_unsupported_media_type(self):
+        """Test that other bodies are rejected with 415."""
+        response = self.client.post(
+            "/vehicle_data/new-vehicle/ingest", content=b'{}', headers={'Content-Type': 'application/json'},
+        )
+
+        self.assertEqual(response.status_code, 415)
+        self.mock_insert.assert_not_called()
+
+    def test_parse_error_reports_committed_rows(self):
+        """Test that a bad line fails the request after the earlier batches were committed."""
+        body = (
+            b'timestamp,speed,odometer,soc,elevation,shift_state\n'
+            b'2022-07-12 16:41:00.966,37,47676.2,73,4,D\n'
+            b'2022-07-12 16:41:05.967,35,47676.3,73,4,D\n'
+            b'not-a-timestamp,32,47676.6,73,4,D\n'
+        )
+
+        response = self.client.post(
+            "/vehicle_data/new-vehicle/ingest", content=body, headers={'Content-Type': 'text/csv'},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("2 rows were committed", response.json()['detail'])
+
+
+if __name__ == '__main__':
+    unittest.main()
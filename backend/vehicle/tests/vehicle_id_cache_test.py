@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import Mock
+
+from vehicle.cache import TTLCache, vehicle_id_cache
+from vehicle.router import get_cache_stats
+from vehicle.service import get_vehicle_record_id
+
+
+class TestVehicleIdCache(unittest.TestCase):
+    """Test cases for resolving vehicle ids through the in-process cache with the session mocked."""
+
+    def setUp(self):
+        vehicle_id_cache.clear()
+        self.addCleanup(vehicle_id_cache.clear)
+
+    def test_known_vehicle_is_looked_up_once(self):
+        """Test that a found id is served from the cache on the next request."""
+        mock_session = Mock()
+        mock_session.exec.return_value.first.return_value = 7
+
+        self.assertEqual(get_vehicle_record_id('a', mock_session), 7)
+        self.assertEqual(get_vehicle_record_id('a', mock_session), 7)
+
+        mock_session.exec.assert_called_once()
+        stats = get_cache_stats()['vehicle_ids']
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+    def test_unknown_vehicle_is_not_cached(self):
+        """Test that a vehicle created after a miss is found on the next request."""
+        mock_session = Mock()
+        mock_session.exec.return_value.first.side_effect = [None, 8]
+
+        self.assertIsNone(get_vehicle_record_id('b', mock_session))
+        self.assertEqual(get_vehicle_record_id('b', mock_session), 8)
+        self.assertEqual(mock_session.exec.call_count, 2)
+
+
+class TestTTLCache(unittest.TestCase):
+    """Test cases for the expiry, eviction and stats of the TTL LRU."""
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = TTLCache(max_entries=2, ttl_seconds=10, clock=lambda: self.now)
+
+    def test_entries_expire(self):
+        """Test that an entry is a miss once its TTL has passed."""
+        self.cache.put('a', 1)
+        self.now = 10.0
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_eviction_and_invalidation(self):
+        """Test that the least recently used entry is evicted and invalidated entries are dropped."""
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a')
+        self.cache.put('c', 3)
+        self.cache.invalidate('a')
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_disabled_cache_stores_nothing(self):
+        """Test that max_entries 0 turns the cache off."""
+        cache = TTLCache(max_entries=0, ttl_seconds=10)
+        cache.put('a', 1)
+
+        self.assertIsNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, Mock, patch
+
+from fastapi import HTTPException, status
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+
+from vehicle.cache import vehicle_id_cache
+from vehicle.counts import count_cache, rebuild_row_counts
+from vehicle.model import VehicleData, VehicleList
+from vehicle.rollups import rebuild_rollups
+from vehicle.router import get_vehicle_data_list
+from vehicle.schema import FilterVehicles
+from vehicle.service import InvalidCursor, get_vehicle_list
+
+
+class TestKeysetPagination(unittest.TestCase):
+    """Test cases for cursor pagination of get_vehicle_list against an in-memory SQLite database."""
+
+    def setUp(self):
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        SQLModel.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        self.session = Session(engine)
+        self.addCleanup(self.session.close)
+
+        start = datetime(2022, 7, 12, 16, 0, 0)
+        with engine.begin() as connection:
+            VehicleList.bulk_insert([{'id': 1, 'vehicle_id': 'a'}, {'id': 2, 'vehicle_id': 'b'}], connection=connection)
+            # Pairs of rows share a timestamp, ids are inserted out of timestamp order
+            VehicleData.bulk_insert([
+                {'id': 100 - index, 'timestamp': start + timedelta(seconds=index // 2), 'speed': index, 'vehicle_list_id': 1}
+                for index in range(11)
+            ] + [
+                {'id': 200, 'timestamp': start, 'speed': 99, 'vehicle_list_id': 2},
+            ], connection=connection)
+            rebuild_row_counts(connection)
+            rebuild_rollups(connection)
+        count_cache.clear()
+        self.addCleanup(count_cache.clear)
+        vehicle_id_cache.clear()
+        self.addCleanup(vehicle_id_cache.clear)
+
+    def page(self, **params):
+        return get_vehicle_list(FilterVehicles(vehicle_id='a', limit=4, **params), 1, self.session)
+
+    def test_cursor_walk_matches_offset_pages(self):
+        """Test that following next_cursor visits the same rows as page numbers, ordered by (timestamp, id)."""
+        by_offset = [row.speed for page in range(3) for row in self.page(page=page)['data']]
+
+        by_cursor = []
+        result = self.page()
+        while True:
+            by_cursor.extend(row.speed for row in result['data'])
+            if result['next_cursor'] is None:
+                break
+            result = self.page(cursor=result['next_cursor'])
+
+        self.assertEqual(by_cursor, by_offset)
+        self.assertEqual(by_cursor, [1, 0, 3, 2, 5, 4, 7, 6, 9, 8, 10])
+        self.assertEqual(result['count'], 11)
+
+    def test_prev_cursor_returns_the_previous_page(self):
+        """Test paging backwards from the second page."""
+        first = self.page()
+        second = self.page(cursor=first['next_cursor'])
+
+        back = self.page(cursor=second['prev_cursor'])
+
+        self.assertEqual([row.id for row in back['data']], [row.id for row in first['data']])
+        self.assertIsNone(back['prev_cursor'])
+        self.assertEqual(back['next_cursor'], first['next_cursor'])
+
+    def test_page_parameter_returns_cursors(self):
+        """Test that offset pages still work and point at their neighbours."""
+        first = self.page(page=0)
+        last = self.page(page=2)
+
+        self.assertIsNone(first['prev_cursor'])
+        self.assertIsNotNone(first['next_cursor'])
+        self.assertEqual([row.speed for row in last['data']], [9, 8, 10])
+        self.assertIsNone(last['next_cursor'])
+        self.assertIsNotNone(last['prev_cursor'])
+
+    def test_cursor_respects_time_filters(self):
+        """Test that the seek predicate is combined with the initial and final filters."""
+        final = datetime(2022, 7, 12, 16, 0, 3)
+        first = self.page(final=final)
+        second = self.page(final=final, cursor=first['next_cursor'])
+
+        self.assertEqual([row.speed for row in second['data']], [5, 4, 7, 6])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_invalid_cursor(self):
+        """Test that a cursor that cannot be decoded is rejected."""
+        with self.assertRaises(InvalidCursor):
+            self.page(cursor='not-a-cursor')
+
+    def test_invalid_cursor_returns_400(self):
+        """Test that the endpoint reports a bad cursor as a client error."""
+        mock_session = AsyncMock()
+        mock_session.exec.return_value = Mock(first=Mock(return_value=1))
+
+        with patch('vehicle.router.get_vehicle_list', side_effect=InvalidCursor("Invalid pagination cursor")), \
+                patch('vehicle.router.get_vehicle_data_version', AsyncMock(return_value=(0, None))):
+            with self.assertRaises(HTTPException) as context:
+                asyncio.run(get_vehicle_data_list(FilterVehicles(vehicle_id='a', cursor='x'), mock_session))
+
+        self.assertEqual(context.exception.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from datetime import datetime
+
+from sqlalchemy import create_engine, select
+from sqlmodel import SQLModel
+
+from vehicle.model import DatasetVersion
+from vehicle.versions import VEHICLE_LIST, bump_dataset_version, not_modified, version_headers
+
+
+class TestVersionHeaders(unittest.TestCase):
+    """Test cases for the validators of a data version and the conditional request headers."""
+
+    def setUp(self):
+        self.headers = version_headers(7, datetime(2022, 7, 12, 16, 0, 30, 500), 'vehicle_id=a')
+
+    def test_headers(self):
+        """Test that the ETag is weak, varies with the request and Last-Modified drops the microseconds."""
+        self.assertRegex(self.headers['ETag'], r'^W/"7-[0-9a-f]{16}"$')
+        self.assertNotEqual(version_headers(7, None, 'vehicle_id=b')['ETag'], self.headers['ETag'])
+        self.assertEqual(self.headers['Last-Modified'], 'Tue, 12 Jul 2022 16:00:30 GMT')
+        self.assertNotIn('Last-Modified', version_headers(0, None))
+
+    def test_if_none_match(self):
+        """Test weak comparison against any of the tags sent, and that it takes precedence over the date."""
+        etag = self.headers['ETag']
+        self.assertTrue(not_modified(self.headers, f'"other", {etag.removeprefix("W/")}', None))
+        self.assertTrue(not_modified(self.headers, '*', None))
+        self.assertFalse(not_modified(self.headers, 'W/"6-0"', 'Tue, 12 Jul 2022 17:00:00 GMT'))
+
+    def test_if_modified_since(self):
+        """Test that a date at or after Last-Modified is current and an unparsable one is not."""
+        self.assertTrue(not_modified(self.headers, None, 'Tue, 12 Jul 2022 16:00:30 GMT'))
+        self.assertFalse(not_modified(self.headers, None, 'Tue, 12 Jul 2022 16:00:29 GMT'))
+        self.assertFalse(not_modified(self.headers, None, 'yesterday'))
+        self.assertFalse(not_modified(self.headers, None, None))
+
+
+class TestBumpDatasetVersion(unittest.TestCase):
+    """Test cases for bumping a dataset version in a SQLite database."""
+
+    def test_bump_creates_then_increments(self):
+        """Test that the first bump creates the version at 1 and later ones add to it."""
+        engine = create_engine('sqlite://')
+        self.addCleanup(engine.dispose)
+        SQLModel.metadata.create_all(engine)
+
+        with engine.begin() as connection:
+            bump_dataset_version(connection, VEHICLE_LIST)
+            bump_dataset_version(connection, VEHICLE_LIST)
+            bump_dataset_version(connection, 'other')
+            versions = dict(connection.execute(select(DatasetVersion.name, DatasetVersion.version)).all())
+
+        self.assertEqual(versions, {VEHICLE_LIST: 2, 'other': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from vehicle.ingest import IngestStats
+from vehicle.watcher import FolderWatcher, Observer
+
+
+class TestFolderWatcher(unittest.TestCase):
+    """Test cases for the watch folder daemon with the ingest mocked."""
+
+    def setUp(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        self.data_path = data_dir.name
+        self.load = mock.Mock(return_value=IngestStats(files=1, rows=10, seconds=0.1))
+        self.watcher = FolderWatcher(
+            self.data_path, poll_seconds=0.05, settle_seconds=2, batch_files=2, use_polling=True, load=self.load,
+        )
+
+    def write(self, name, text, mode='a'):
+        path = os.path.join(self.data_path, name)
+        with open(path, mode) as csv_file:
+            csv_file.write(text)
+        return path
+
+    def test_new_file_is_loaded_once_settled(self):
+        """Test that a file is only loaded after its size stopped changing for the settle time."""
+        path = self.write('vehicle.csv', 'timestamp,speed\n')
+        self.watcher.scan(now=0)
+        self.assertIsNone(self.watcher.flush(now=1))
+
+        # Still being written, the settle time restarts
+        self.write('vehicle.csv', '2022-07-12 16:00:00,5\n')
+        self.assertIsNone(self.watcher.flush(now=3))
+        self.assertIsNone(self.watcher.flush(now=4))
+        self.load.assert_not_called()
+
+        stats = self.watcher.flush(now=5)
+        self.load.assert_called_once_with(paths=[path])
+        self.assertEqual(stats.rows, 10)
+
+    def test_unchanged_file_is_not_loaded_again(self):
+        """Test that polling only picks up files that grew since they were loaded."""
+        path = self.write('vehicle.csv', 'timestamp,speed\n')
+        self.watcher.scan(now=0)
+        self.watcher.flush(now=2)
+
+        self.watcher.scan(now=3)
+        self.assertIsNone(self.watcher.flush(now=10))
+
+        self.write('vehicle.csv', '2022-07-12 16:00:00,5\n')
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        self.watcher.scan(now=11)
+        self.watcher.flush(now=13)
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_settled_files_are_loaded_in_batches(self):
+        """Test that at most batch_files files are passed to one ingest run."""
+        for index in range(5):
+            self.write(f'vehicle{index}.csv', 'timestamp,speed\n')
+        self.write('notes.txt', 'ignored')
+        self.watcher.scan(now=0)
+
+        self.watcher.flush(now=2)
+
+        batches = [call.kwargs['paths'] for call in self.load.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertTrue(all(path.endswith('.csv') for batch in batches for path in batch))
+
+    def test_failed_load_is_retried_with_backoff(self):
+        """Test that files of a failed batch are not known as loaded and are retried after a growing wait."""
+        self.load.side_effect = [OSError("database unavailable"), OSError("database unavailable"), self.load.return_value]
+        path = self.write('vehicle.csv', 'timestamp,speed\n')
+        self.watcher.scan(now=0)
+
+        self.watcher.flush(now=2)
+        self.watcher.scan(now=3)
+        self.assertIsNone(self.watcher.flush(now=5))
+        self.watcher.flush(now=6)
+        self.assertEqual(self.load.call_count, 2)
+
+        # The second failure doubles the wait to 8 seconds
+        self.assertIsNone(self.watcher.flush(now=13))
+        stats = self.watcher.flush(now=14)
+        self.assertEqual(stats.rows, 10)
+        self.load.assert_called_with(paths=[path])
+
+        self.watcher.scan(now=15)
+        self.assertIsNone(self.watcher.flush(now=30))
+        self.assertEqual(self.load.call_count, 3)
+
+    def test_file_removed_after_settling_is_left_out_of_the_batch(self):
+        """Test that a file gone by the time its batch loads does not fail the files loaded with it."""
+        kept = self.write('kept.csv', 'timestamp,speed\n')
+        removed = self.write('removed.csv', 'timestamp,speed\n')
+        self.watcher.scan(now=0)
+        settled_files = self.watcher.settled_files
+
+        def remove_once_settled(now=None):
+            settled = settled_files(now)
+            os.remove(removed)
+            return settled
+
+        with mock.patch.object(self.watcher, 'settled_files', side_effect=remove_once_settled):
+            self.watcher.flush(now=2)
+
+        self.load.assert_called_once_with(paths=[kept])
+
+    def test_deleted_file_is_forgotten(self):
+        """Test that a pending file removed before it settled is never loaded."""
+        path = self.write('vehicle.csv', 'timestamp,speed\n')
+        self.watcher.scan(now=0)
+        os.remove(path)
+
+        self.assertIsNone(self.watcher.flush(now=5))
+        self.load.assert_not_called()
+
+    @unittest.skipIf(Observer is None, "watchdog is not installed")
+    def test_notifications_trigger_a_load(self):
+        """Test the inotify backend end to end with a short settle time."""
+        watcher = FolderWatcher(self.data_path, poll_seconds=0.05, settle_seconds=0.1, use_polling=False, load=self.load)
+        watcher.start()
+        self.addCleanup(watcher.stop, 5)
+
+        path = self.write('vehicle.csv', 'timestamp,speed\n')
+        deadline = time.monotonic() + 5
+        while not self.load.called and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.load.assert_called_with(paths=[path])
+
+
+class TestLifespanWatcher(unittest.TestCase):
+    """Test cases for starting the watcher with the API."""
+
+    def run_lifespan(self, workers):
+        import main
+
+        async def serve():
+            async with main.lifespan(main.app):
+                pass
+
+        with mock.patch('main.WATCH_ENABLED', True), mock.patch('main.WEB_CONCURRENCY', workers), \
+                mock.patch('main.create_db_and_tables'), mock.patch('vehicle.watcher.FolderWatcher') as watcher:
+            asyncio.run(serve())
+        return watcher
+
+    def test_single_worker_watches(self):
+        """Test that a single API worker starts and stops the watcher."""
+        watcher = self.run_lifespan(1)
+        watcher.return_value.start.assert_called_once()
+        watcher.return_value.stop.assert_called_once()
+
+    def test_several_workers_do_not_watch(self):
+        """Test that no worker watches when the API runs several of them."""
+        with self.assertLogs('main', 'WARNING'):
+            watcher = self.run_lifespan(4)
+        watcher.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Data versions answering conditional GETs of polled endpoints
+
+Ingest bumps the data_version of a vehicle in the transaction committing its rows, and every
+change to the set of vehicles bumps the VEHICLE_LIST DatasetVersion. Responses carry the
+version as a weak ETag and its time as Last-Modified. A request whose If-None-Match, or
+If-Modified-Since, still matches the current version gets 304 Not Modified after reading only
+the version, without running the queries of the response.
+
+The version is read before the data, a change committed in between is served under the older
+version and the next poll fetches the response again.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from sqlalchemy import Connection
+
+from vehicle.model import DatasetVersion
+
+
+VEHICLE_LIST = 'vehicle_list'
+
+
+def utc_now() -> datetime:
+    """Naive UTC time stored with the versions"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def bump_dataset_version(connection: Connection, name: str = VEHICLE_LIST) -> None:
+    """Advance the version of a dataset, in the transaction changing it"""
+    DatasetVersion.bulk_upsert(
+        [{'name': name, 'version': 1, 'modified_at': utc_now()}],
+        conflict_columns=['name'], connection=connection,
+        merge={'version': lambda current, new: current.version + 1},
+    )
+
+
+def version_headers(version: int, modified_at: Optional[datetime], *variant: Optional[str]) -> Dict[str, str]:
+    """ETag, Last-Modified and caching headers of a response at a data version
+
+    variant holds what else selects the response, such as the query string and Accept header,
+    so the pages of one version get different tags.
+    """
+    tag = str(version)
+    if variant:
+        digest = hashlib.blake2b('\n'.join(value or '' for value in variant).encode(), digest_size=8).hexdigest()
+        tag = f'{tag}-{digest}'
+    headers = {'ETag': f'W/"{tag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept'}
+    if modified_at is not None:
+        headers['Last-Modified'] = format_datetime(modified_at.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+    return headers
+
+
+def not_modified(headers: Dict[str, str], if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """Whether the client's copy is current, If-None-Match takes precedence over If-Modified-Since"""
+    if if_none_match is not None:
+        if if_none_match.strip() == '*':
+            return True
+        # Weak comparison, W/ prefixes are ignored
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return headers['ETag'].removeprefix('W/') in tags
+    if if_modified_since is not None and 'Last-Modified' in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since.tzinfo is not None and parsedate_to_datetime(headers['Last-Modified']) <= since
+    return False
@@ -0,0 +1,236 @@
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional, the watcher polls the folder instead
+    FileSystemEventHandler = object
+    Observer = None
+
+from configs import (
+    DATA_PATH, WATCH_BATCH_FILES, WATCH_POLL_SECONDS, WATCH_POLLING, WATCH_RETRY_MAX_SECONDS, WATCH_SETTLE_SECONDS,
+)
+from vehicle.ingest import IngestStats
+from vehicle.service import load_data_from_folder
+
+
+logger = logging.getLogger(__name__)
+
+
+FileState = Tuple[int, float]
+
+
+@dataclass
+class PendingFile:
+    """A CSV file that changed and is waiting for its writes to settle, or for a retry after failed loads"""
+    state: Optional[FileState]
+    changed_at: float
+    failures: int = 0
+    retry_at: float = 0.0
+
+
+def file_state(path: str) -> Optional[FileState]:
+    """Size and mtime of a file, None once it is gone"""
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return file_stat.st_size, file_stat.st_mtime
+
+
+class _CsvEventHandler(FileSystemEventHandler):
+    """Forwards file system events on CSV files to the watcher"""
+
+    def __init__(self, watcher: "FolderWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event) -> None:
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, 'dest_path', '')):
+            if path and path.endswith('.csv'):
+                self.watcher.touch(path)
+
+
+class FolderWatcher:
+    """Loads CSV files into the database as they land in a folder
+
+    File system notifications (inotify through watchdog) mark changed files as pending.
+    Without watchdog, or with polling forced, the folder is scanned every poll interval
+    and files whose size or mtime changed are marked instead. A pending file is loaded
+    once its size and mtime have not changed for the settle time, so files that are still
+    being written are not read half way. Settled files are loaded in batches through the
+    regular ingest, which appends new rows from each file's committed offset. The files of a
+    batch that failed to load stay pending and are retried with an exponential backoff.
+    """
+
+    def __init__(
+        self,
+        path: str = DATA_PATH,
+        poll_seconds: float = WATCH_POLL_SECONDS,
+        settle_seconds: float = WATCH_SETTLE_SECONDS,
+        batch_files: int = WATCH_BATCH_FILES,
+        use_polling: bool = WATCH_POLLING,
+        load: Callable[..., IngestStats] = load_data_from_folder,
+        max_retry_seconds: float = WATCH_RETRY_MAX_SECONDS,
+    ):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.batch_files = batch_files
+        self.use_polling = use_polling or Observer is None
+        self.load = load
+        self.max_retry_seconds = max_retry_seconds
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, PendingFile] = {}
+        # Last state of every file seen, polling compares against it
+        self._known: Dict[str, FileState] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    @property
+    def backend(self) -> str:
+        return 'polling' if self.use_polling else 'inotify'
+
+    def start(self) -> None:
+        """Watch the folder from a background thread, files already present are checked first"""
+        os.makedirs(self.path, exist_ok=True)
+        self.scan()
+        if not self.use_polling:
+            self._observer = Observer()
+            self._observer.schedule(_CsvEventHandler(self), self.path, recursive=False)
+            self._observer.start()
+        self._thread = threading.Thread(target=self._run, name='folder-watcher', daemon=True)
+        self._thread.start()
+        logger.info("Watching %s for CSV files (%s)", self.path, self.backend)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def touch(self, path: str, now: Optional[float] = None) -> None:
+        """Mark a file as changed"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is None:
+                self._pending[path] = PendingFile(file_state(path), now)
+            else:
+                pending.changed_at = now
+
+    def scan(self, now: Optional[float] = None) -> None:
+        """Mark CSV files whose size or mtime differ from the last time they were seen"""
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.csv') or not entry.is_file():
+                    continue
+                file_stat = entry.stat()
+                if self._known.get(entry.path) != (file_stat.st_size, file_stat.st_mtime):
+                    with self._lock:
+                        known = entry.path in self._pending
+                    if not known:
+                        self.touch(entry.path, now)
+
+    def settled_files(self, now: Optional[float] = None) -> List[str]:
+        """Pending files that stopped changing for the settle time and are not waiting for a retry"""
+        now = time.monotonic() if now is None else now
+        settled = []
+        with self._lock:
+            for path, pending in list(self._pending.items()):
+                state = file_state(path)
+                if state is None:
+                    del self._pending[path]
+                    self._known.pop(path, None)
+                elif state != pending.state:
+                    pending.state = state
+                    pending.changed_at = now
+                elif now - pending.changed_at >= self.settle_seconds and now >= pending.retry_at:
+                    settled.append(path)
+        return settled
+
+    def _retry_later(self, failed: Dict[str, PendingFile], now: float) -> None:
+        """Put the files of a failed load back in pending, to be retried after a backoff"""
+        with self._lock:
+            for path, failed_file in failed.items():
+                # A change seen while loading keeps its newer state
+                pending = self._pending.setdefault(path, failed_file)
+                pending.failures = failed_file.failures + 1
+                pending.retry_at = now + min(self.settle_seconds * 2 ** pending.failures, self.max_retry_seconds)
+
+    def flush(self, now: Optional[float] = None) -> Optional[IngestStats]:
+        """Load the settled files, at most batch_files per ingest run
+
+        Only the files of batches that loaded are recorded as known, the others are retried.
+        """
+        now = time.monotonic() if now is None else now
+        settled = self.settled_files(now)
+        if not settled:
+            return None
+
+        stats = IngestStats()
+        for start in range(0, len(settled), self.batch_files):
+            with self._lock:
+                batch = {path: self._pending.pop(path) for path in settled[start:start + self.batch_files]}
+            # A file removed since it settled would fail the whole batch
+            for path in [path for path in batch if file_state(path) is None]:
+                del batch[path]
+                self._known.pop(path, None)
+            if not batch:
+                continue
+            try:
+                batch_stats = self.load(paths=list(batch))
+            except Exception:
+                logger.exception("Loading %d watched files failed, retrying them later", len(batch))
+                self._retry_later(batch, now)
+                continue
+            stats.files += batch_stats.files
+            stats.rows += batch_stats.rows
+            stats.seconds += batch_stats.seconds
+            stats.files_rewritten += batch_stats.files_rewritten
+            self._known.update({path: pending.state for path, pending in batch.items()})
+        return stats
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                if self.use_polling:
+                    self.scan()
+                self.flush()
+            except Exception:
+                logger.exception("Folder watcher iteration failed")
+
+
+def main() -> None:
+    argparse.ArgumentParser(description="Load CSV files into the database as they land in the data folder").parse_args()
+
+    from database import create_db_and_tables
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    create_db_and_tables()
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    watcher = FolderWatcher()
+    watcher.start()
+    try:
+        stopping.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop(timeout=10)
+
+
+if __name__ == '__main__':
+    main()